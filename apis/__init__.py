@@ -3,6 +3,8 @@ from flask_restx import Api
 from .auth_namespace import api as auth_namespace
 from .plan_namespace import api as plan_namespace
 from .subscription_namespace import api as subscription_namespace
+from .metrics_namespace import api as metrics_namespace
+from .analytics_namespace import api as analytics_namespace
 
 api = Api(
     title='Subscription Management API',
@@ -17,4 +19,6 @@ api = Api(
 api.add_namespace(auth_namespace)
 api.add_namespace(plan_namespace)
 api.add_namespace(subscription_namespace)
+api.add_namespace(metrics_namespace)
+api.add_namespace(analytics_namespace)
 
@@ -0,0 +1,108 @@
+from datetime import datetime
+from flask import request, current_app
+from flask_restx import Namespace, Resource
+from sqlalchemy import Integer, bindparam, select
+from marshmallow import ValidationError
+from core.extensions import db, plan_catalog, read_router
+from core.auth import admin_required
+from core.error_handler import validation_error
+from core.rollups import COUNTERS, empty_rollup, month_of, month_range, shift_month
+from core.schema.rollup_schema import PlanMonthlyRollupSchema, RollupMonthSchema, RollupRangeSchema
+from models import PlanMonthlyRollup
+
+api = Namespace('analytics')
+
+rollups_table = PlanMonthlyRollup.__table__
+
+# Every plan of one month, read from idx_plan_monthly_rollups_month
+month_rollups_query = select(rollups_table).where(rollups_table.c.month == bindparam('month'))
+
+# One plan over a month range, a primary key range read
+plan_rollups_query = select(rollups_table).where(
+    rollups_table.c.plan_id == bindparam('plan_id', type_=Integer),
+    rollups_table.c.month.between(bindparam('first'), bindparam('last')),
+)
+
+
+def current_month():
+    return month_of(int(datetime.now().timestamp()))
+
+
+@api.route('/rollups')
+class analyticsRollups(Resource):
+    @api.doc('month-rollups')
+    @admin_required()
+    def get(self):
+        '''Retrieve new subscriptions, upgrades, cancellations and MRR of every plan in a month (admin only)'''
+
+        try:
+            schema = RollupMonthSchema()
+            # Validate rollup query -> throw ValidationError exception if not valid
+            valid_month_request = schema.load(request.args)
+        except ValidationError as err:
+            return validation_error(err)
+
+        month = valid_month_request['month'] or current_month()
+        # Not tied to one user, served by the replica when there is one
+        found = {
+            row.plan_id: row._asdict()
+            for row in db.session.execute(month_rollups_query, { 'month': month }, bind_arguments=read_router.bind_arguments(None))
+        }
+
+        # Every plan of the catalog, plans without activity get zeros
+        rows = []
+        totals = empty_rollup()
+        for plan in plan_catalog.snapshot().plans.values():
+            row = found.get(plan.id) or { 'plan_id': plan.id, 'month': month, **empty_rollup() }
+            rows.append({ **row, 'plan_name': plan.name })
+            for metric in totals:
+                totals[metric] += row[metric]
+
+        return {
+            'month': month,
+            'data': PlanMonthlyRollupSchema(many=True).dump(rows),
+            'totals': PlanMonthlyRollupSchema(only=(*COUNTERS, 'mrr')).dump(totals),
+        }
+
+
+@api.route('/plans/<int:plan_id>/rollups')
+class analyticsPlanRollups(Resource):
+    @api.doc('plan-rollups')
+    @admin_required()
+    def get(self, plan_id):
+        '''Retrieve the monthly rollups of one plan over a month range (admin only)'''
+
+        try:
+            schema = RollupRangeSchema()
+            # Validate rollup range query -> throw ValidationError exception if not valid
+            valid_range_request = schema.load(request.args)
+        except ValidationError as err:
+            return validation_error(err)
+
+        plan = plan_catalog.get(plan_id)
+        if plan is None:
+            return { 'error': f"Plan with id '{plan_id}' does not exists." }, 404
+
+        last = valid_range_request['to'] or current_month()
+        first = valid_range_request['from_'] or shift_month(last, -11)
+        if first > last:
+            return { 'errors': { 'from': ["Must not be after 'to'."] } }, 422
+        max_months = current_app.config['ROLLUP_MAX_MONTHS']
+        if shift_month(first, max_months - 1) < last:
+            return { 'errors': { 'from': [f"Range longer than {max_months} months."] } }, 422
+        months = month_range(first, last)
+
+        found = {
+            row.month: row._asdict()
+            for row in db.session.execute(
+                plan_rollups_query, { 'plan_id': plan_id, 'first': first, 'last': last }, bind_arguments=read_router.bind_arguments(None)
+            )
+        }
+
+        # One entry per month of the range, months without activity get zeros
+        rows = [found.get(month) or { 'plan_id': plan_id, 'month': month, **empty_rollup() } for month in months]
+        return {
+            'plan_id': str(plan_id),
+            'plan_name': plan.name,
+            'data': PlanMonthlyRollupSchema(many=True, exclude=('plan_id', 'plan_name')).dump(rows),
+        }
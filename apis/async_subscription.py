@@ -0,0 +1,90 @@
+from datetime import datetime
+from flask import current_app
+from marshmallow import ValidationError
+from werkzeug.http import parse_etags
+from core.extensions import async_db, subscription_cache, response_encoder, read_router
+from core.schema.subscription_schema import SubscriptionHistorySchema
+from core.cursor import decode_cursor
+from core.history import history_statement, history_page
+from core.subscriptions import subscription_version_stmt
+from core.etag import etag_headers, not_modified
+from apis.subscription_namespace import active_subscription_query, active_subscription_value
+
+# Coroutine twins of the two hot reads of `subscription_namespace`, for the ASGI
+# serving mode (see core/asgi.py). Same statements, same bodies and headers;
+# anything they do not answer themselves goes to the Flask route (return None).
+
+
+async def read_version(connection, user_id):
+    '''`(version, end_date)` of the user's pointer row, see `subscription_version`'''
+    row = (await connection.execute(subscription_version_stmt, { 'subscriber_id': user_id })).first()
+    return (row.version, row.end_date) if row is not None else (0, None)
+
+
+async def active_subscription(user_id, headers, args):
+    '''GET /api/subscriptions/active'''
+    now = int(datetime.now().timestamp())
+
+    async with async_db.engine_for(user_id, read_router.token(headers)).connect() as connection:
+        version, end_date = await read_version(connection, user_id)
+        if end_date is None or end_date <= now:
+            return response_encoder.output_json({ 'error': "No active subscription found." }, 404)
+
+        tag = f"active-{user_id}-{version}"
+        response = not_modified(tag, parse_etags(headers.get('If-None-Match')))
+        if response is not None:
+            return response
+
+        async def load():
+            result = await connection.execute(active_subscription_query, { "user_id": user_id, "now": now })
+            return active_subscription_value(result, tag)
+
+        # The cache is shared with the Flask route, concurrent misses share one query
+        cached_tag, data = await subscription_cache.get_or_load_async(user_id, load)
+        if cached_tag != tag:
+            subscription_cache.invalidate(user_id)
+            cached_tag, data = await subscription_cache.get_or_load_async(user_id, load)
+
+    if data is None:
+        return response_encoder.output_json({ 'error': "No active subscription found." }, 404)
+    return response_encoder.output_json(data, 200, etag_headers(cached_tag))
+
+
+async def subscription_history(user_id, headers, args):
+    '''GET /api/subscriptions, `cursor` pages only'''
+    try:
+        valid_history_request = SubscriptionHistorySchema().load(args)
+    except ValidationError:
+        return None
+
+    cursor = None
+    if valid_history_request['cursor']:
+        try:
+            cursor = decode_cursor(valid_history_request['cursor'])
+        except ValueError:
+            return None
+    elif valid_history_request['last_seen_id']:
+        # legacy cursor, one more lookup, left to the Flask route
+        return None
+
+    per_page = min(valid_history_request['per_page'], current_app.config['HISTORY_MAX_PER_PAGE'])
+    fields = valid_history_request['fields'] or None
+
+    engine = async_db.engine_for(user_id, read_router.token(headers))
+    async with engine.connect() as connection:
+        version, _ = await read_version(connection, user_id)
+        tag = f"history-{user_id}-{version}"
+        response = not_modified(tag, parse_etags(headers.get('If-None-Match')))
+        if response is not None:
+            return response
+
+        sql, params = history_statement(user_id, per_page, fields, cursor, engine.dialect.name)
+        result = await connection.execute(sql, params)
+
+    return response_encoder.output_json(history_page(result.all(), result.keys(), per_page, fields), 200, etag_headers(tag))
+
+
+routes = {
+    '/api/subscriptions/active': active_subscription,
+    '/api/subscriptions': subscription_history,
+}
@@ -4,9 +4,12 @@ from flask_restx import Namespace, Resource
 from models import User
 from marshmallow import ValidationError
 from core.schema.user_schema import UserLoginSchema, UserRegisterSchema, UserSchema
-from core.error_handler import validation_error
+from core.error_handler import validation_error, hasher_busy_error, is_unique_violation, unique_violation_error
+from core.hashing import HasherBusy
+from core.auth import is_admin_email
 from core.extensions import db
 from flask_jwt_extended import create_access_token
+from sqlalchemy.exc import IntegrityError
 
 api = Namespace('auth')
 
@@ -24,13 +27,23 @@ class UserRegister(Resource):
             return validation_error(err)
 
         created_at = int(datetime.now().timestamp())
-        user = User(**valid_user_request, created_at=created_at)
-        # add to session and commit
+        try:
+            user = User(**valid_user_request, created_at=created_at)
+        except HasherBusy as err:
+            return hasher_busy_error(err)
+        # add to session and commit, a taken email fails on the unique constraint
         db.session.add(user)
-        db.session.commit()
-        # transform user object
-        userSchema = UserSchema()
-        return userSchema.dump(user)
+        try:
+            db.session.flush()
+            # transform user object before commit, so it is not reloaded after
+            data = UserSchema().dump(user)
+            db.session.commit()
+        except IntegrityError as err:
+            db.session.rollback()
+            if not is_unique_violation(err):
+                raise
+            return unique_violation_error(f"Email {valid_user_request['email']} already exists.")
+        return data
     
 
 @api.route('/login')
@@ -53,12 +66,20 @@ class UserAuth(Resource):
         if user is None:
             return { 'error': "Password or Email not correct." }, 400
 
-        is_valid = user.check_password(password)
+        try:
+            is_valid = user.check_password(password)
 
-        if is_valid == False:
-            return { 'error': "Password or Email not correct." }, 400
+            if is_valid == False:
+                return { 'error': "Password or Email not correct." }, 400
+
+            # Transparently upgrade hashes made with an older cost factor
+            if user.needs_rehash():
+                user.password = password
+                db.session.commit()
+        except HasherBusy as err:
+            return hasher_busy_error(err)
 
-        auth_token = create_access_token(str(user.id))
+        auth_token = create_access_token(str(user.id), additional_claims={ "is_admin": is_admin_email(user.email) })
 
         return {
             "token": auth_token
@@ -0,0 +1,52 @@
+from flask_restx import Namespace, Resource
+from core.extensions import subscription_cache, read_router, expiry_sweeper, subscription_archiver, idempotency_keys
+from core.auth import admin_required
+
+api = Namespace('metrics')
+
+@api.route('/cache')
+class cacheMetrics(Resource):
+    @api.doc('cache-metrics')
+    @admin_required()
+    def get(self):
+        '''Retrieve hit/miss/eviction counters of the active subscription cache (admin only)'''
+
+        return {
+            'active_subscription': subscription_cache.stats()
+        }
+
+@api.route('/pool')
+class poolMetrics(Resource):
+    @api.doc('pool-metrics')
+    @admin_required()
+    def get(self):
+        '''Retrieve live connection pool statistics of the primary and replica engines (admin only)'''
+
+        return read_router.stats()
+
+@api.route('/expiry')
+class expiryMetrics(Resource):
+    @api.doc('expiry-metrics')
+    @admin_required()
+    def get(self):
+        '''Retrieve the expiry sweeper settings and the throughput of its last run (admin only)'''
+
+        return expiry_sweeper.stats()
+
+@api.route('/archive')
+class archiveMetrics(Resource):
+    @api.doc('archive-metrics')
+    @admin_required()
+    def get(self):
+        '''Retrieve the subscription archiver settings and the throughput of its last run (admin only)'''
+
+        return subscription_archiver.stats()
+
+@api.route('/idempotency')
+class idempotencyMetrics(Resource):
+    @api.doc('idempotency-metrics')
+    @admin_required()
+    def get(self):
+        '''Retrieve executed/replayed/waited counters of the Idempotency-Key handling (admin only)'''
+
+        return idempotency_keys.stats()
@@ -1,11 +1,15 @@
 from datetime import datetime
-from flask import request
+from flask import request, Response
 from flask_restx import Namespace, Resource
-from core.schema.plan_schema import PlanSchema, PlanCreateSchema
+from core.schema.plan_schema import PlanSchema, PlanCreateSchema, PlanFeaturesSchema
 from marshmallow import ValidationError
-from core.error_handler import validation_error
-from core.extensions import db
+from core.error_handler import validation_error, is_unique_violation, unique_violation_error
+from core.extensions import db, plan_catalog
+from core.plan_catalog import bump_catalog_version
+from core.auth import admin_required
 from models import Plan
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 
 api = Namespace('plans')
 
@@ -15,10 +19,9 @@ class plan(Resource):
     def get(self):
         '''Retrieve a list of all available subscription plans'''
 
-        plans = Plan.query.all()
-
-        planSchema = PlanSchema(many=True)
-        return planSchema.dump(plans)  
+        # Served from the in-memory catalog, the body was encoded once when the snapshot was built
+        snapshot = plan_catalog.snapshot()
+        return Response(snapshot.body, mimetype='application/json')
 
     @api.doc('create-subscription-plans')
     def post(self):
@@ -33,11 +36,50 @@ class plan(Resource):
             return validation_error(err)
 
         created_at = int(datetime.now().timestamp())
+        valid_plan_request['features'] = sorted(set(valid_plan_request['features']))
         plan = Plan(**valid_plan_request, created_at=created_at)
-        # add to session and commit
+        # add to session and commit, a taken name fails on the unique constraint
         db.session.add(plan)
-        db.session.commit()
-        # transform plan object
-        planSchema = PlanSchema()
-        return planSchema.dump(plan)    
+        try:
+            db.session.flush()
+            # transform plan object before commit, so it is not reloaded after
+            data = PlanSchema().dump(plan)
+            # other workers reload their catalog on the next version check
+            bump_catalog_version(db.session, db.session.get_bind().dialect.name)
+            db.session.commit()
+        except IntegrityError as err:
+            db.session.rollback()
+            if not is_unique_violation(err):
+                raise
+            return unique_violation_error(f"Plan '{valid_plan_request['name']}' already exists.")
+        # publish a new catalog snapshot including this plan
+        plan_catalog.rebuild()
+        return data
 
+
+@api.route('/<int:plan_id>/features')
+class planFeatures(Resource):
+    @api.doc('update-plan-features')
+    @admin_required()
+    def put(self, plan_id):
+        '''Replace the feature set of a plan (admin only)'''
+
+        json = request.json
+        try:
+            schema = PlanFeaturesSchema()
+            # Validate features request -> throw ValidationError exception if not valid
+            valid_features_request = schema.load(json)
+        except ValidationError as err:
+            return validation_error(err)
+
+        result = db.session.execute(
+            update(Plan).where(Plan.id == plan_id).values(features=sorted(set(valid_features_request['features'])))
+        )
+        if not result.rowcount:
+            db.session.rollback()
+            return { 'error': f"Plan with id '{plan_id}' does not exists." }, 404
+        bump_catalog_version(db.session, db.session.get_bind().dialect.name)
+        db.session.commit()
+        # publish a new catalog snapshot, the entitlement bitsets are compiled with it
+        snapshot = plan_catalog.rebuild()
+        return PlanSchema().dump(snapshot.plans[plan_id])
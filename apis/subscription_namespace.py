@@ -1,77 +1,114 @@
-from datetime import datetime, timedelta
-from flask import request
-from sqlalchemy import text
+from datetime import datetime
+from flask import request, current_app, Response, stream_with_context
+from sqlalchemy import bindparam, text
 from flask_restx import Namespace, Resource
-from core.extensions import db
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from core.schema.subscription_schema import SubscriptionSchema, SubscriptionCreateSchema
+from core.extensions import db, subscription_cache, plan_catalog, read_router
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from core.schema.subscription_schema import subscription_serializer, SubscriptionCreateSchema, SubscriptionBulkCreateSchema, SubscriptionExportSchema, SubscriptionHistorySchema, SubscriptionActiveBatchSchema
+from core.cursor import decode_cursor
+from core.history import history_statement, history_page, legacy_cursor_statement
+from core.export import stream_subscriptions, stream_active_subscriptions, EXPORT_FORMATS
+from core.subscriptions import bulk_create_subscriptions, create_subscription, upgrade_subscription, cancel_subscription, subscription_changed, subscription_version, current_plan_id, SubscriptionWriteError
+from core.etag import etag_headers, not_modified
+from core.auth import admin_required
+from core.idempotency import idempotent, idempotent_commit, HEADER as IDEMPOTENCY_KEY_HEADER
+from core.archive import subscription_columns, union_all_tables
 from marshmallow import ValidationError
 from core.error_handler import validation_error
-from models import Subscription, Plan
 
 api = Namespace('subscriptions')
 
+IDEMPOTENCY_KEY_PARAM = { IDEMPOTENCY_KEY_HEADER: { 'in': 'header', 'description': "Optional, retries with the same key replay the first response" } }
+
+# Primary key read of the user's pointer row, primary key join to the subscription
 active_subscription_query = text("""
-            SELECT *
-            FROM subscriptions
-            WHERE user_id = :user_id
-            AND is_active = TRUE
-            AND end_date > :now
-            ORDER BY created_at DESC
-            LIMIT 1
+            SELECT subscriptions.*
+            FROM current_subscriptions
+            JOIN subscriptions ON subscriptions.id = current_subscriptions.subscription_id
+            WHERE current_subscriptions.user_id = :user_id
+            AND current_subscriptions.end_date > :now
         """)
 
-@api.route('')
-class SubscriptionResource(Resource):
-    @api.doc('subscriptions-history')
-    @jwt_required()
-    def get(self):
-        '''Retrieve subscription history'''
-        user_id = get_jwt_identity()
-
-        # Pagination result using cursor-based pattern
-        last_seen_id = int(request.args.get("last_seen_id", 0))
-        per_page = int(request.args.get("per_page", 10))
+# Set based form of the same lookup: one statement per chunk of users, primary key
+# reads of the pointer rows and primary key joins, whatever the history lengths
+active_subscriptions_batch_query = text("""
+            SELECT subscriptions.*
+            FROM current_subscriptions
+            JOIN subscriptions ON subscriptions.id = current_subscriptions.subscription_id
+            WHERE current_subscriptions.user_id IN :user_ids
+            AND current_subscriptions.end_date > :now
+        """).bindparams(bindparam('user_ids', expanding=True))
 
-        params = {
-            "user_id": int(user_id),
-            "limit": per_page
-        }
+# Entitlement check bodies, encoded once
+ENTITLED = b'{"entitled": true}\n'
+NOT_ENTITLED = b'{"entitled": false}\n'
 
-        sql = """
-            SELECT *
-            FROM subscriptions
-            WHERE user_id = :user_id
-        """
+def active_subscription_value(result, tag):
+    '''Serialize the row of `active_subscription_query` for the cache -> ((tag, data), expires_at)'''
+    active_subscription = result.first()
 
-        if last_seen_id:
-            # Fetch records created before the last_seen_id
-            sql += "AND id < :last_seen_id"
-            params["last_seen_id"] = last_seen_id
+    if active_subscription is None:
+        return (tag, None), None
 
-        sql += """
-            ORDER BY created_at DESC
-            LIMIT :limit 
-        """
+    return (tag, subscription_serializer.dump(active_subscription, result.keys())), active_subscription.end_date
 
-        sql = text(sql)
+def load_active_subscription(user_id, tag):
+    '''Query and serialize the active subscription of a user for the cache -> ((tag, data), expires_at)'''
+    now = int(datetime.now().timestamp())
 
-        subscriptions = db.session.execute(sql, params).all()
+    result = db.session.execute(active_subscription_query, {"user_id": user_id, "now": now}, bind_arguments=read_router.bind_arguments(user_id))
+    return active_subscription_value(result, tag)
 
-        schema = SubscriptionSchema(many=True)
-        subscriptions_list = schema.dump(subscriptions)
+@api.route('')
+class SubscriptionResource(Resource):
+    @api.doc('subscriptions-history')
+    @jwt_required()
+    def get(self):
+        '''Retrieve subscription history'''
+        user_id = int(get_jwt_identity())
 
-        # Get the id of last subscription in the list
-        last_seen_id = subscriptions_list[-1].get("id") if len(subscriptions_list) else None
+        try:
+            schema = SubscriptionHistorySchema()
+            # Validate history query -> throw ValidationError exception if not valid
+            valid_history_request = schema.load(request.args)
+        except ValidationError as err:
+            return validation_error(err)
 
-        return {
-            'data': subscriptions_list,
-            "per_page": per_page,
-            "next_cursor_id": last_seen_id
-        }
+        dialect_name = read_router.engine_for(user_id).dialect.name
+
+        # Conditional GET, the version is read before the page it validates
+        version, _ = subscription_version(user_id)
+        tag = f"history-{user_id}-{version}"
+        response = not_modified(tag)
+        if response is not None:
+            return response
+
+        # Server enforced page size ceiling
+        per_page = min(valid_history_request['per_page'], current_app.config['HISTORY_MAX_PER_PAGE'])
+        fields = valid_history_request['fields'] or None
+
+        # Pagination result using a (created_at, id) keyset cursor, matching the sort key
+        cursor = None
+        if valid_history_request['cursor']:
+            try:
+                cursor = decode_cursor(valid_history_request['cursor'])
+            except ValueError as err:
+                return { 'errors': { 'cursor': [str(err)] } }, 422
+        elif valid_history_request['last_seen_id']:
+            # Legacy cursor, resolve the position of the row by primary key, in whichever table holds it
+            cursor_sql = legacy_cursor_statement(dialect_name)
+            cursor = db.session.execute(cursor_sql, { "id": valid_history_request['last_seen_id'], "user_id": user_id }, bind_arguments=read_router.bind_arguments(user_id)).first()
+            if cursor is None:
+                return { 'errors': { 'last_seen_id': ["Unknown subscription."] } }, 422
+
+        sql, params = history_statement(user_id, per_page, fields, cursor, dialect_name)
+        result = db.session.execute(sql, params, bind_arguments=read_router.bind_arguments(user_id))
+
+        return history_page(result.all(), result.keys(), per_page, fields), 200, etag_headers(tag)
     
-    @api.doc('create-subscription')
+    @api.doc('create-subscription', params=IDEMPOTENCY_KEY_PARAM)
     @jwt_required()
+    @idempotent()
     def post(self):
         '''Create a new subscription'''
 
@@ -85,27 +122,103 @@ class SubscriptionResource(Resource):
             return validation_error(err)
         
         plan_id = json.get('plan_id')
-        
-        plan = Plan.query.filter_by(id=plan_id).first()
+
         # Check if plan exist
-        if plan is None:
+        if plan_catalog.get(plan_id) is None:
             return { 'error': f"Plan with id '{plan_id}' does not exists." }, 400
-        
-        start_date = datetime.now()
-        end_date = start_date + timedelta(days=30) # Add extra 30 days
-
-        name = plan.name
-        price = plan.price
-        start_date = int(start_date.timestamp())
-        end_date = int(end_date.timestamp())
-        created_at = int(datetime.now().timestamp())
-
-        subscription = Subscription(plan_id=plan_id, name=name, price=price, is_active=True, user_id=user_id, start_date=start_date, end_date=end_date, created_at=created_at)
-        # Add to session and commit
-        db.session.add(subscription)
-        db.session.commit()
-        schema = SubscriptionSchema()   
-        return schema.dump(subscription)
+
+        try:
+            # One INSERT ... SELECT from plans, returning the new row
+            subscription = create_subscription(user_id, plan_id)
+        except SubscriptionWriteError as err:
+            db.session.rollback()
+            return { 'error': str(err) }, err.status
+        # the stored Idempotency-Key response commits with the subscription
+        rv = idempotent_commit(subscription_serializer.dump_object(subscription))
+        subscription_changed(user_id)
+        return rv
+
+@api.route('/export')
+class subscriptionExport(Resource):
+    @api.doc('export-subscriptions')
+    @jwt_required()
+    def get(self):
+        '''Stream the full subscription history as NDJSON or CSV'''
+
+        try:
+            schema = SubscriptionExportSchema()
+            # Validate export query -> throw ValidationError exception if not valid
+            valid_export_request = schema.load(request.args)
+        except ValidationError as err:
+            return validation_error(err)
+
+        fmt = valid_export_request['format']
+        params = {}
+        conditions = []
+
+        if valid_export_request['all_users']:
+            if not get_jwt().get('is_admin', False):
+                return { 'error': "Admin privileges required." }, 403
+            # Uses idx_created_at
+            order_by = "created_at ASC"
+        else:
+            # Uses idx_user_id_created_at_id_desc_name_price
+            conditions.append("user_id = :user_id")
+            params["user_id"] = int(get_jwt_identity())
+            order_by = "created_at DESC, id DESC"
+
+        if valid_export_request['from_'] is not None:
+            conditions.append("created_at >= :from_date")
+            params["from_date"] = valid_export_request['from_']
+
+        if valid_export_request['to'] is not None:
+            conditions.append("created_at < :to_date")
+            params["to_date"] = valid_export_request['to']
+
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        columns = ", ".join(subscription_columns())
+        engine = read_router.engine_for(params.get("user_id"))
+        # Both tables, each read in index order
+        sql = text(union_all_tables(f"SELECT {columns} FROM {{table}} {where}", f"ORDER BY {order_by}", engine.dialect.name))
+        stream = stream_subscriptions(engine, sql, params, fmt, batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+
+        return Response(stream_with_context(stream), mimetype=EXPORT_FORMATS[fmt], headers={
+            'Content-Disposition': f'attachment; filename=subscriptions.{fmt}'
+        })
+
+@api.route('/bulk')
+class subscriptionBulk(Resource):
+    @api.doc('bulk-create-subscriptions')
+    @admin_required()
+    def post(self):
+        '''Provision subscriptions for many users at once (admin only)'''
+
+        json = request.json
+        try:
+            schema = SubscriptionBulkCreateSchema()
+            # Validate bulk request -> throw ValidationError exception if not valid
+            valid_bulk_request = schema.load(json)
+        except ValidationError as err:
+            return validation_error(err)
+
+        items = valid_bulk_request['items']
+        max_items = current_app.config['BULK_SUBSCRIPTION_MAX_ITEMS']
+        if len(items) > max_items:
+            return { 'errors': { 'items': [f"Longer than maximum length {max_items}."] } }, 422
+
+        results = bulk_create_subscriptions(items, chunk_size=current_app.config['BULK_SUBSCRIPTION_CHUNK_SIZE'])
+
+        created = 0
+        for result in results:
+            if result['status'] == 'created':
+                created += 1
+                subscription_changed(result['user_id'])
+
+        return {
+            'data': results,
+            'created': created,
+            'failed': len(results) - created
+        }
 
 @api.route('/active')
 class subscriptionActive(Resource):
@@ -114,23 +227,76 @@ class subscriptionActive(Resource):
     def get(self):
         '''Retrieve the currently active subscription for the user'''
 
-        user_id = get_jwt_identity()
-        now = int(datetime.now().timestamp())
+        user_id = int(get_jwt_identity())
 
-        sql = active_subscription_query
+        # The pointer row alone answers "none" and If-None-Match, without a subscription query
+        version, end_date = subscription_version(user_id)
+        if end_date is None or end_date <= int(datetime.now().timestamp()):
+            return { 'error': f"No active subscription found." }, 404
 
-        active_subscription = db.session.execute(sql, {"user_id": user_id, "now": now}).first()
+        tag = f"active-{user_id}-{version}"
+        response = not_modified(tag)
+        if response is not None:
+            return response
+
+        # Served from cache, concurrent misses for the same user share one query
+        cached_tag, active_subscription = subscription_cache.get_or_load(user_id, lambda: load_active_subscription(user_id, tag))
+        if cached_tag != tag:
+            # Cached before a write made by another worker, the version tells
+            subscription_cache.invalidate(user_id)
+            cached_tag, active_subscription = subscription_cache.get_or_load(user_id, lambda: load_active_subscription(user_id, tag))
 
         if active_subscription is None:
             return { 'error': f"No active subscription found." }, 404
-        
-        schema = SubscriptionSchema()
-        return schema.dump(active_subscription)
+
+        # Cached data is never older than the version it was cached with
+        return active_subscription, 200, etag_headers(cached_tag)
+
+@api.route('/active/batch')
+class subscriptionActiveBatch(Resource):
+    @api.doc('get-active-subscriptions-batch')
+    @admin_required()
+    def post(self):
+        '''Retrieve the active subscriptions of many users at once (admin only)'''
+
+        json = request.json
+        try:
+            schema = SubscriptionActiveBatchSchema()
+            # Validate batch request -> throw ValidationError exception if not valid
+            valid_batch_request = schema.load(json)
+        except ValidationError as err:
+            return validation_error(err)
+
+        # Duplicates are answered once, in first seen order
+        user_ids = list(dict.fromkeys(valid_batch_request['user_ids']))
+        max_users = current_app.config['ACTIVE_BATCH_MAX_USERS']
+        if len(user_ids) > max_users:
+            return { 'errors': { 'user_ids': [f"Longer than maximum length {max_users}."] } }, 422
+
+        now = int(datetime.now().timestamp())
+        # Not tied to one user, served by the replica when there is one
+        engine = read_router.engine_for(None)
+        stream = stream_active_subscriptions(engine, active_subscriptions_batch_query, user_ids, now, chunk_size=current_app.config['ACTIVE_BATCH_CHUNK_SIZE'])
+
+        return Response(stream_with_context(stream), mimetype='application/json')
+
+@api.route('/entitlements/<string:feature>')
+class subscriptionEntitlement(Resource):
+    @api.doc('check-entitlement')
+    @jwt_required()
+    def get(self, feature):
+        '''Whether the plan of the active subscription grants a feature'''
+
+        # Pointer row read for the plan id, then a bitset test on the in-memory plan catalog
+        plan_id = current_plan_id(get_jwt_identity())
+        entitled = plan_id is not None and plan_catalog.entitled(plan_id, feature)
+        return Response(ENTITLED if entitled else NOT_ENTITLED, mimetype='application/json')
 
 @api.route('/upgrade')
 class subscriptionUpgrade(Resource):
-    @api.doc('upgrade-subscription')
+    @api.doc('upgrade-subscription', params=IDEMPOTENCY_KEY_PARAM)
     @jwt_required()
+    @idempotent()
     def put(self):
         '''Upgrade the current subscription to a higher plan'''
 
@@ -145,47 +311,20 @@ class subscriptionUpgrade(Resource):
         
         plan_id = json.get('plan_id')
 
-        plan = Plan.query.filter_by(id=plan_id).first()
-
         # Check if plan is valid
-        if plan is None:
+        if plan_catalog.get(plan_id) is None:
             return { 'error': f"Plan with id '{plan_id}' does not exists." }, 400
-        
-        sql = active_subscription_query
-        now = int(datetime.now().timestamp())
-
-        active_subscription = db.session.execute(sql, {"user_id": user_id, "now": now}).first()
-
-        if active_subscription is None:
-            return { 'error': f"No active subscription found." }, 404
-
-        # Check if new plan is the same as current plan
-        if int(active_subscription.plan_id) == int(plan_id):
-            return { "error": "You're already on this subscription plan. Please select a different plan to upgrade."}, 400
-
-        # Update/end current plan
-        update_sql = text("""
-            UPDATE subscriptions
-            SET is_active = FALSE, end_date = :now
-            WHERE id = :id
-        """)
-        db.session.execute(update_sql, {"id": active_subscription.id, "now": now})
 
-        start_date = datetime.now()
-        end_date = start_date + timedelta(days=30) # Add extra 30 days
-
-        name = plan.name
-        price = plan.price
-        start_date = int(start_date.timestamp())
-        end_date = int(end_date.timestamp())
-        created_at = int(datetime.now().timestamp())
-
-        subscription = Subscription(plan_id=plan_id, name=name, price=price, is_active=True, user_id=user_id, start_date=start_date, end_date=end_date, created_at=created_at)
-        # Add to session and commit
-        db.session.add(subscription)
-        db.session.commit()
-        schema = SubscriptionSchema()
-        return schema.dump(subscription)
+        try:
+            # End the active subscription (UPDATE ... RETURNING) and start the new one (INSERT ... SELECT)
+            subscription = upgrade_subscription(user_id, plan_id)
+        except SubscriptionWriteError as err:
+            db.session.rollback()
+            return { 'error': str(err) }, err.status
+        # the stored Idempotency-Key response commits with the subscription
+        rv = idempotent_commit(subscription_serializer.dump_object(subscription))
+        subscription_changed(user_id)
+        return rv
 
 
 @api.route('/cancel')
@@ -196,21 +335,11 @@ class subscriptionCancel(Resource):
         '''Cancel the current active subscription'''
 
         user_id = get_jwt_identity()
-        sql = active_subscription_query
-        now = int(datetime.now().timestamp())
 
-        current_subscription = db.session.execute(sql, {"user_id": user_id, "now": now}).first()
-    
-        if current_subscription:
-            # Updated/end current active subscription
-            update_sql = text("""
-                UPDATE subscriptions
-                SET is_active = false,
-                    end_date = :now
-                WHERE id = :id
-            """)
-            db.session.execute(update_sql, {"id": current_subscription.id, "now": now})
+        # End the current subscription and clear the user's pointer
+        if cancel_subscription(user_id):
             db.session.commit()
+            subscription_changed(user_id)
 
         return {
             "success": "ok"
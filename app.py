@@ -2,25 +2,77 @@ from dotenv import load_dotenv
 load_dotenv()  # take environment variables
 
 import os
+import click
 from flask import Flask
-from config import config_by_env
-from apis import api
-from core.extensions import db, flask_bcrypt, migrate, ma, jwt
 
-env = os.getenv('FLASK_ENV') or 'dev'
 flask_debug = os.getenv('FLASK_DEBUG') or False
 
-app = Flask(__name__)
-app.config.from_object(config_by_env[env])
 
-# init packages for automatic context push
-api.init_app(app)
-db.init_app(app)
-ma.init_app(app)
-jwt.init_app(app)
-migrate.init_app(app=app, db=db)
-flask_bcrypt.init_app(app)
+def create_app(env=None):
+    '''
+    Build the Flask app for `env` (FLASK_ENV, dev by default).
+
+    The namespaces, schemas and extensions are imported here, not when this
+    module is imported. Extensions are process wide, build one app per process.
+    See core/warmup.py to warm it up before serving and gunicorn.conf.py to
+    share one preloaded app between workers.
+    '''
+    from config import config_by_env
+    from apis import api
+    from core.commands import seed_command, backfill_current_subscriptions_command, rebuild_rollups_command, expire_subscriptions_command, archive_subscriptions_command, purge_idempotency_keys_command, export_openapi_command
+    from core.extensions import db, password_hasher, ma, jwt, subscription_cache, plan_catalog, read_router, sqlite_profile, query_instrumentation, expiry_sweeper, subscription_archiver, idempotency_keys, async_db, openapi_document, response_encoder
+
+    app = Flask(__name__)
+    app.config.from_object(config_by_env[env or os.getenv('FLASK_ENV') or 'dev'])
+
+    # init packages for automatic context push
+    api.init_app(app)
+    db.init_app(app)
+    sqlite_profile.init_app(app)  # after db, hooks the sqlite engines
+    query_instrumentation.init_app(app)  # after db, hooks every engine
+    ma.init_app(app)
+    jwt.init_app(app)
+    password_hasher.init_app(app)
+    subscription_cache.init_app(app)
+    plan_catalog.init_app(app)
+    read_router.init_app(app)
+    expiry_sweeper.init_app(app)  # starts the sweeper thread when EXPIRY_SWEEPER_ENABLED
+    subscription_archiver.init_app(app)  # starts the archiver thread when ARCHIVER_ENABLED
+    idempotency_keys.init_app(app)  # starts the purge thread when IDEMPOTENCY_PURGER_ENABLED
+    async_db.init_app(app)  # async engines of the ASGI serving mode (asgi.py), created on first use
+    openapi_document.init_app(app)  # after api, takes over its swagger.json route
+    response_encoder.init_app(app)  # JSON backend of the api, compression of every response
+
+    # flask db ...: migrations (alembic) are only loaded by the CLI
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    # CLI: flask seed, flask backfill-current-subscriptions, flask expire-subscriptions, flask archive-subscriptions,
+    #      flask purge-idempotency-keys, flask export-openapi
+    app.cli.add_command(seed_command)
+    app.cli.add_command(backfill_current_subscriptions_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(expire_subscriptions_command)
+    app.cli.add_command(archive_subscriptions_command)
+    app.cli.add_command(purge_idempotency_keys_command)
+    app.cli.add_command(export_openapi_command)
+
+    return app
+
+
+def __getattr__(name):
+    # `app:app` (flask run, tests, benchmarks, asgi.py) builds the default app on first use
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
-    app.run(debug=flask_debug)
+    from core.warmup import warm_up
 
+    app = create_app()
+    warm_up(app)
+    app.run(debug=flask_debug)
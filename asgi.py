@@ -0,0 +1,11 @@
+'''
+ASGI serving mode: the active subscription and history reads run as
+coroutines on async database engines, every other route on the Flask app.
+
+    uvicorn asgi:app --workers 4
+'''
+from app import app as flask_app
+from apis.async_subscription import routes
+from core.asgi import AsgiApp
+
+app = AsgiApp(flask_app, routes)
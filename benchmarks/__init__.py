@@ -0,0 +1,42 @@
+'''
+Benchmarks, run them as modules from the project root:
+
+    python -m benchmarks.bench_bulk_subscriptions
+
+They use a throwaway SQLite database unless `DATABASE_URL` is set.
+'''
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def bench_app():
+    '''Return the flask app bound to the benchmark database, with statement and slow query logging off'''
+    if not os.getenv('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='subscription-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    from app import app
+    from core.extensions import db, async_db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.echo = False
+            engine.pool.echo = False
+    async_db.echo = False
+    # bulk seeding is slow by design, keep it out of the slow query log
+    logging.getLogger('slow_query').setLevel(logging.ERROR)
+    return app
+
+
+@contextmanager
+def timer(label, count=None):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    line = f"{label:<40} {elapsed * 1000:10.1f} ms"
+    if count:
+        line += f"  {count / elapsed:12.0f} /s"
+    print(line)
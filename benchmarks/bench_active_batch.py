@@ -0,0 +1,84 @@
+'''
+Active subscriptions of N users: N calls of `GET /api/subscriptions/active`
+against one `POST /api/subscriptions/active/batch`, through the Flask test
+client, then the same two shapes at the SQL level (N pointer lookups against
+one set-based statement per `ACTIVE_BATCH_CHUNK_SIZE` users).
+
+Half of the users have an active subscription, every user has `HISTORY`
+ended ones before it.
+
+    python -m benchmarks.bench_active_batch [users]
+'''
+import json
+import sys
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert, text
+from benchmarks import bench_app, timer
+
+app = bench_app()
+
+from core.extensions import db, subscription_cache
+from core.subscriptions import backfill_current_subscriptions, chunked
+from apis.subscription_namespace import active_subscription_query, active_subscriptions_batch_query
+from models import User, Plan, Subscription
+
+HISTORY = 20
+
+
+def seed(users, now):
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as connection:
+        connection.execute(insert(Plan), [{ 'name': "Premium", 'price': 200, 'created_at': now }])
+        connection.execute(insert(User), [{
+            'id': user_id, 'email': f"user-{user_id}@example.com", 'first_name': "Bench", 'last_name': "User",
+            'password_hash': "-", 'created_at': now,
+        } for user_id in range(1, users + 1)])
+        connection.execute(insert(Subscription), [{
+            'user_id': user_id, 'plan_id': 1, 'name': "Premium", 'price': 200,
+            'start_date': now - (HISTORY - i) * 86400, 'end_date': now + (30 - HISTORY + i) * 86400,
+            'created_at': now - (HISTORY - i) * 86400,
+            # the latest subscription of every other user is still active
+            'is_active': i == HISTORY - 1 and user_id % 2 == 0,
+        } for user_id in range(1, users + 1) for i in range(HISTORY)])
+        backfill_current_subscriptions(connection)
+        connection.execute(text("ANALYZE"))
+
+
+def run(users):
+    now = int(datetime.now().timestamp())
+    user_ids = list(range(1, users + 1))
+    client = app.test_client()
+
+    with app.app_context():
+        seed(users, now)
+        tokens = [create_access_token(str(user_id)) for user_id in user_ids]
+        admin_token = create_access_token("1", additional_claims={ "is_admin": True })
+        chunk_size = app.config['ACTIVE_BATCH_CHUNK_SIZE']
+
+    subscription_cache.clear()
+    looped = {}
+    with timer(f"GET /active x{users}", users):
+        for user_id, token in zip(user_ids, tokens):
+            response = client.get("/api/subscriptions/active", headers={ "authorization": "Bearer " + token })
+            looped[str(user_id)] = response.json if response.status_code == 200 else None
+
+    with timer(f"POST /active/batch ({users} ids)", users):
+        response = client.post("/api/subscriptions/active/batch", json={ "user_ids": user_ids }, headers={
+            "authorization": "Bearer " + admin_token
+        })
+        batched = json.loads(response.get_data())['data']
+    assert batched == looped
+
+    with app.app_context(), db.engine.connect() as connection:
+        with timer(f"SQL pointer lookup x{users}", users):
+            for user_id in user_ids:
+                connection.execute(active_subscription_query, { 'user_id': user_id, 'now': now }).first()
+        with timer(f"SQL batch, {chunk_size} ids per statement", users):
+            for chunk in chunked(user_ids, chunk_size):
+                connection.execute(active_subscriptions_batch_query, { 'user_ids': chunk, 'now': now }).all()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
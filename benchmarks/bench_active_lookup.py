@@ -0,0 +1,93 @@
+'''
+Active subscription lookup across history lengths: the former range scan of
+`idx_user_id_is_active_end_date_created_at` against the `current_subscriptions`
+pointer read.
+
+Two history shapes per length:
+* ended       - every older subscription was ended (is_active = FALSE)
+* overlapping - every older subscription is still active, as left by repeated
+                subscribes without an upgrade
+
+    python -m benchmarks.bench_active_lookup [lookups]
+'''
+import statistics
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import insert, text
+from benchmarks import bench_app
+
+app = bench_app()
+
+from core.extensions import db
+from core.subscriptions import backfill_current_subscriptions
+from apis.subscription_namespace import active_subscription_query
+from models import User, Plan, Subscription
+
+HISTORY_LENGTHS = (1, 10, 100, 1000, 10000)
+SHAPES = ('ended', 'overlapping')
+
+scan_query = text("""
+            SELECT *
+            FROM subscriptions
+            WHERE user_id = :user_id
+            AND is_active = TRUE
+            AND end_date > :now
+            ORDER BY created_at DESC
+            LIMIT 1
+        """)
+
+
+def seed(now):
+    '''One user per (shape, history length) -> { (shape, length): user_id }'''
+    db.drop_all()
+    db.create_all()
+    users = {}
+    with db.engine.begin() as connection:
+        connection.execute(insert(Plan), [{ 'name': "Premium", 'price': 200, 'created_at': now }])
+        user_id = 0
+        for shape in SHAPES:
+            for length in HISTORY_LENGTHS:
+                user_id += 1
+                users[(shape, length)] = user_id
+                connection.execute(insert(User), [{
+                    'id': user_id, 'email': f"user-{user_id}@example.com", 'first_name': "Bench", 'last_name': "User",
+                    'password_hash': "-", 'created_at': now,
+                }])
+                connection.execute(insert(Subscription), [{
+                    'user_id': user_id, 'plan_id': 1, 'name': "Premium", 'price': 200,
+                    'start_date': now - (length - i) * 60, 'end_date': now + 30 * 86400 - (length - i) * 60,
+                    'created_at': now - (length - i) * 60,
+                    'is_active': shape == 'overlapping' or i == length - 1,
+                } for i in range(length)])
+        backfill_current_subscriptions(connection)
+        connection.execute(text("ANALYZE"))
+    return users
+
+
+def measure(connection, query, user_id, now, lookups):
+    timings = []
+    for _ in range(lookups):
+        start = time.perf_counter()
+        connection.execute(query, { 'user_id': user_id, 'now': now }).first()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def run(lookups):
+    now = int(datetime.now().timestamp())
+    with app.app_context():
+        users = seed(now)
+        print(f"{'shape':<12} {'history':>8} {'range scan':>12} {'pointer':>12}  (median per lookup, {lookups} lookups)")
+        with db.engine.connect() as connection:
+            for (shape, length), user_id in users.items():
+                # both return the latest subscription
+                assert connection.execute(scan_query, { 'user_id': user_id, 'now': now }).first().id == \
+                    connection.execute(active_subscription_query, { 'user_id': user_id, 'now': now }).first().id
+                scan = measure(connection, scan_query, user_id, now, lookups)
+                pointer = measure(connection, active_subscription_query, user_id, now, lookups)
+                print(f"{shape:<12} {length:>8} {scan:>9.1f} us {pointer:>9.1f} us")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,63 @@
+'''
+Hot/cold split: size of the hot `subscriptions` table and median latency of
+the history page and active subscription reads before and after the
+archiver moved long ended subscriptions out, plus the mover's throughput.
+
+    python -m benchmarks.bench_archive [subscriptions] [after_days]
+'''
+import statistics
+import sys
+import time
+from benchmarks import bench_app
+
+app = bench_app()
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from core.extensions import db, subscription_cache
+from core.archive import archive_subscriptions
+from core.seed import seed_database
+
+SEEDED_AT = int(time.time())
+LOOKUPS = 500
+
+
+def measure(client, path, tokens):
+    timings = []
+    for i in range(LOOKUPS):
+        subscription_cache.clear()
+        start = time.perf_counter()
+        response = client.get(path, headers=tokens[i % len(tokens)])
+        timings.append(time.perf_counter() - start)
+        assert response.status_code in (200, 404), response.json
+    return statistics.median(timings) * 1000
+
+
+def sizes():
+    return [db.session.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() for table in ('subscriptions', 'subscriptions_archive')]
+
+
+def run(subscriptions, after_days):
+    client = app.test_client()
+    with app.app_context():
+        seed_database(db.engine, max(1, subscriptions // 10), subscriptions, now=SEEDED_AT, reset=True)
+        # heaviest users, their history spans both tables once archived
+        users = db.session.execute(text("SELECT user_id FROM subscriptions GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 50")).scalars().all()
+        tokens = [{ 'authorization': "Bearer " + create_access_token(identity=str(user_id)) } for user_id in users]
+
+        print(f"{'':<8} {'hot rows':>10} {'archived':>10} {'history p50':>12} {'active p50':>12}")
+        hot, archived = sizes()
+        print(f"{'before':<8} {hot:>10} {archived:>10} {measure(client, '/api/subscriptions?per_page=10', tokens):>9.3f} ms "
+              f"{measure(client, '/api/subscriptions/active', tokens):>9.3f} ms")
+
+        result = archive_subscriptions(db.engine, SEEDED_AT - after_days * 24 * 3600, batch_size=5000)
+        db.session.execute(text("ANALYZE"))
+        hot, archived = sizes()
+        print(f"{'after':<8} {hot:>10} {archived:>10} {measure(client, '/api/subscriptions?per_page=10', tokens):>9.3f} ms "
+              f"{measure(client, '/api/subscriptions/active', tokens):>9.3f} ms")
+        print(f"archived {result['rows']} rows in {result['seconds']:.1f}s ({result['rows_per_second']} rows/s, "
+              f"longest batch {result['longest_batch_ms']:.0f} ms)")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000, int(sys.argv[2]) if len(sys.argv) > 2 else 180)
@@ -0,0 +1,187 @@
+'''
+Read throughput of the sync (WSGI) and async (ASGI) serving modes at 100 to
+2,000 concurrent clients, against a local SQLite stand-in.
+
+Each mode runs as a real server in a child process:
+* sync  - the Flask app on Werkzeug's threaded server, one thread per connection
+* async - `asgi:app` on uvicorn, one event loop
+
+Every client keeps one HTTP/1.1 connection open and alternates
+`GET /api/subscriptions/active` and the first history page for its user,
+as fast as the server answers, for `--seconds` per concurrency level.
+
+    python -m benchmarks.bench_async_reads [--clients 100,500,1000,2000] [--seconds 10] [--users 2000]
+'''
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+HOST = '127.0.0.1'
+HISTORY = 20
+
+
+def serve(mode, port):
+    '''Child process: serve the app in `mode` until killed'''
+    from benchmarks import bench_app
+
+    app = bench_app()
+    if mode == 'sync':
+        from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler, make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no access log, as uvicorn
+
+        # keep-alive, and a listen queue as deep as uvicorn's
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"
+        ThreadedWSGIServer.request_queue_size = 4096
+        make_server(HOST, port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        from asgi import app as asgi_app
+
+        uvicorn.run(asgi_app, host=HOST, port=port, log_level='warning', access_log=False, backlog=4096)
+
+
+def seed(users):
+    from benchmarks import bench_app
+
+    app = bench_app()
+
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert, text
+    from core.extensions import db
+    from core.subscriptions import backfill_current_subscriptions
+    from models import User, Plan, Subscription
+
+    now = int(datetime.now().timestamp())
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        with db.engine.begin() as connection:
+            connection.execute(insert(Plan), [{ 'name': "Premium", 'price': 200, 'created_at': now }])
+            connection.execute(insert(User), [{
+                'id': user_id, 'email': f"user-{user_id}@example.com", 'first_name': "Bench", 'last_name': "User",
+                'password_hash': "-", 'created_at': now,
+            } for user_id in range(1, users + 1)])
+            connection.execute(insert(Subscription), [{
+                'user_id': user_id, 'plan_id': 1, 'name': "Premium", 'price': 200,
+                'start_date': now - (HISTORY - i) * 86400, 'end_date': now + (30 - HISTORY + i) * 86400,
+                'created_at': now - (HISTORY - i) * 86400, 'is_active': i == HISTORY - 1,
+            } for user_id in range(1, users + 1) for i in range(HISTORY)])
+            backfill_current_subscriptions(connection)
+            connection.execute(text("ANALYZE"))
+        return [create_access_token(str(user_id)) for user_id in range(1, users + 1)]
+
+
+def requests_for(token):
+    return [
+        f"GET {path} HTTP/1.1\r\nHost: {HOST}\r\nAuthorization: Bearer {token}\r\n\r\n".encode()
+        for path in ("/api/subscriptions/active", "/api/subscriptions?per_page=10")
+    ]
+
+
+async def read_response(reader):
+    '''-> (status, keep the connection)'''
+    status = int((await reader.readline()).split()[1])
+    length, keep_alive = 0, True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value == 'close':
+            keep_alive = False
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def client(port, requests, deadline, latencies, errors):
+    connection = None
+    position = 0
+    while time.perf_counter() < deadline:
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(HOST, port)
+            reader, writer = connection
+            start = time.perf_counter()
+            writer.write(requests[position % len(requests)])
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            position += 1
+            if not keep_alive:
+                writer.close()
+                connection = None
+        except (OSError, asyncio.IncompleteReadError, IndexError, ValueError) as err:
+            errors.append(type(err).__name__)
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(port, tokens, clients, seconds):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(port, requests_for(tokens[i % len(tokens)]), deadline, latencies, errors) for i in range(clients)))
+    return latencies, errors
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def run(levels, seconds, users):
+    tokens = seed(users)  # also sets DATABASE_URL, inherited by the servers
+    print(f"{users} users, {HISTORY} subscriptions each, {seconds}s per level, {os.cpu_count()} CPU")
+    print(f"{'mode':<6} {'clients':>8} {'requests/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for mode in ('sync', 'async'):
+        port = free_port()
+        server = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_async_reads', '--serve', mode, '--port', str(port)])
+        try:
+            wait_for(port)
+            asyncio.run(load(port, tokens, 10, 1))  # warm-up: connections, caches, plans
+            for clients in levels:
+                latencies, errors = asyncio.run(load(port, tokens, clients, seconds))
+                quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [float('nan')] * 99
+                print(f"{mode:<6} {clients:>8} {len(latencies) / seconds:>11.0f} {quantiles[49] * 1000:>9.1f} {quantiles[98] * 1000:>9.1f} {len(errors):>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', default='100,500,1000,2000')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--serve', choices=('sync', 'async'))
+    parser.add_argument('--port', type=int)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.port)
+    else:
+        run([int(clients) for clients in args.clients.split(',')], args.seconds, args.users)
@@ -0,0 +1,73 @@
+'''
+Provision N seats through `POST /api/subscriptions` (one request per seat)
+and through `POST /api/subscriptions/bulk` (one request), then compare.
+
+    python -m benchmarks.bench_bulk_subscriptions [seats]
+'''
+import sys
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+from benchmarks import bench_app, timer
+
+app = bench_app()
+
+from core.extensions import db, plan_catalog, subscription_cache
+from models import User, Plan
+
+
+def reset(seats):
+    '''Fresh schema with one plan and `seats` users'''
+    db.drop_all()
+    db.create_all()
+    plan_catalog.invalidate()
+    subscription_cache.clear()
+
+    now = int(datetime.now().timestamp())
+    db.session.execute(insert(Plan), [{ 'name': 'Seat', 'price': 20, 'created_at': now }])
+    db.session.execute(insert(User), [
+        {
+            'email': f'seat-{i}@example.com',
+            'first_name': 'seat',
+            'last_name': 'user',
+            'password_hash': 'x',
+            'created_at': now
+        }
+        for i in range(1, seats + 1)
+    ])
+    db.session.commit()
+
+
+def run(seats):
+    client = app.test_client()
+    headers = { "Content-Type": "application/json" }
+
+    with app.app_context():
+        reset(seats)
+        tokens = [create_access_token(str(user_id)) for user_id in range(1, seats + 1)]
+
+    with timer(f"single-row handler x{seats}", seats):
+        for token in tokens:
+            response = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers={
+                **headers,
+                "authorization": "Bearer " + token
+            })
+            assert response.status_code == 200
+
+    with app.app_context():
+        reset(seats)
+        admin_token = create_access_token("1", additional_claims={ "is_admin": True })
+
+    items = [{ "user_id": user_id, "plan_id": 1 } for user_id in range(1, seats + 1)]
+    with timer(f"bulk handler x{seats}", seats):
+        response = client.post("/api/subscriptions/bulk", json={ "items": items }, headers={
+            **headers,
+            "authorization": "Bearer " + admin_token
+        })
+    assert response.status_code == 200
+    assert response.json.get("created") == seats
+
+
+if __name__ == '__main__':
+    seats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    run(seats)
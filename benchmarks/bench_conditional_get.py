@@ -0,0 +1,60 @@
+'''
+Polling cost of the active subscription and first history page: a full 200
+against a 304 revalidation with `If-None-Match`, through the Flask test
+client. Statements per request come from the `Server-Timing` header.
+
+    python -m benchmarks.bench_conditional_get [requests]
+'''
+import re
+import statistics
+import sys
+import time
+from benchmarks import bench_app
+
+app = bench_app()
+
+from flask_jwt_extended import create_access_token
+from core.extensions import db, subscription_cache
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+HISTORY = 50
+
+
+def measure(client, path, headers, requests, cached):
+    timings = []
+    for _ in range(requests):
+        if not cached:
+            subscription_cache.clear()
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append(time.perf_counter() - start)
+    return response.status_code, int(QUERIES.search(response.headers['Server-Timing']).group(1)), statistics.median(timings) * 1000
+
+
+def run(requests):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        headers = { "authorization": "Bearer " + create_access_token(identity="1") }
+
+    client = app.test_client()
+    client.post("/api/auth/register-user", json={ "email": "poll@example.com", "first_name": "Poll", "last_name": "User", "password": "password" })
+    client.post("/api/plans", json={ "name": "Basic", "price": 50 })
+    client.post("/api/plans", json={ "name": "Premium", "price": 200 })
+    for i in range(HISTORY):
+        client.put("/api/subscriptions/upgrade", json={ "plan_id": str(i % 2 + 1) }, headers=headers) if i else \
+            client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=headers)
+
+    print(f"{'request':<44} {'status':>6} {'statements':>10} {'median':>10}")
+    for path, cached_modes in (("/api/subscriptions/active", (False, True)), ("/api/subscriptions?per_page=10", (False,))):
+        etag = client.get(path, headers=headers).headers['ETag']
+        for cached in cached_modes:
+            label = f"{path.split('?')[0]}{' (cached)' if cached else ''}"
+            status, statements, median = measure(client, path, headers, requests, cached)
+            print(f"{label:<44} {status:>6} {statements:>10} {median:>7.3f} ms")
+        status, statements, median = measure(client, path, { **headers, "If-None-Match": etag }, requests, True)
+        print(f"{label.replace(' (cached)', '') + ' If-None-Match':<44} {status:>6} {statements:>10} {median:>7.3f} ms")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,63 @@
+'''
+"Does the user's plan grant this feature?" answered two ways, through the
+Flask test client: `GET /api/subscriptions/active` (the caller then reads the
+plan) against `GET /api/subscriptions/entitlements/<feature>`, a pointer row
+read plus a bitset test on the plan catalog. Statements per request come
+from the `Server-Timing` header.
+
+    python -m benchmarks.bench_entitlements [requests]
+'''
+import re
+import statistics
+import sys
+import time
+from benchmarks import bench_app
+
+app = bench_app()
+
+from flask_jwt_extended import create_access_token
+from core.extensions import db, subscription_cache, plan_catalog
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def measure(client, path, headers, requests, cached):
+    timings = []
+    for _ in range(requests):
+        if not cached:
+            subscription_cache.clear()
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append(time.perf_counter() - start)
+    return response, int(QUERIES.search(response.headers['Server-Timing']).group(1)), statistics.median(timings) * 1000
+
+
+def run(requests):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        headers = { "authorization": "Bearer " + create_access_token(identity="1") }
+
+    client = app.test_client()
+    client.post("/api/auth/register-user", json={ "email": "check@example.com", "first_name": "Check", "last_name": "User", "password": "password" })
+    client.post("/api/plans", json={ "name": "Premium", "price": 200, "features": [f"feature-{i}" for i in range(64)] })
+    client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=headers)
+
+    print(f"{'request':<44} {'bytes':>6} {'statements':>10} {'median':>10}")
+    for label, path, cached in (
+        ("active subscription (cache miss)", "/api/subscriptions/active", False),
+        ("active subscription (cached)", "/api/subscriptions/active", True),
+        ("entitlement check", "/api/subscriptions/entitlements/feature-42", True),
+    ):
+        response, statements, median = measure(client, path, headers, requests, cached)
+        print(f"{label:<44} {len(response.get_data()):>6} {statements:>10} {median:>7.3f} ms")
+
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(requests):
+            plan_catalog.entitled(1, "feature-42")
+        print(f"{'bitset test alone':<44} {'':>6} {0:>10} {(time.perf_counter() - start) / requests * 1e6:>7.3f} us")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,33 @@
+'''
+Expiry sweep throughput and transaction length per batch size, on a dataset
+generated by `core.seed` and swept at a reference time where most of the
+active subscriptions have lapsed. Throttling is off, it only adds idle time.
+
+    python -m benchmarks.bench_expiry [subscriptions]
+'''
+import sys
+from benchmarks import bench_app
+
+app = bench_app()
+
+from core.extensions import db
+from core.expiry import sweep_expired_subscriptions
+from core.seed import seed_database
+
+BATCH_SIZES = (100, 1000, 5000)
+SEEDED_AT = 1700000000
+SWEPT_AT = SEEDED_AT + 25 * 24 * 3600
+
+
+def run(subscriptions):
+    with app.app_context():
+        print(f"{'batch size':>10} {'rows':>8} {'batches':>8} {'rows/s':>10} {'longest batch':>14}")
+        for batch_size in BATCH_SIZES:
+            seed_database(db.engine, max(1, subscriptions // 10), subscriptions, active_ratio=1.0, now=SEEDED_AT, reset=True)
+            result = sweep_expired_subscriptions(db.engine, now=SWEPT_AT, batch_size=batch_size)
+            print(f"{batch_size:>10} {result['rows']:>8} {result['batches']:>8} {result['rows_per_second']:>10} "
+                  f"{result['longest_batch_ms']:>11.1f} ms")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
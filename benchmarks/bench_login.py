@@ -0,0 +1,92 @@
+'''
+Login throughput at several bcrypt pool sizes, with the latency of a cheap
+read (`GET /api/plans`) measured during the spike.
+
+    python -m benchmarks.bench_login [clients] [logins_per_client] [rounds]
+'''
+import statistics
+import sys
+import threading
+import time
+from benchmarks import bench_app
+
+app = bench_app()
+
+from core.extensions import db, password_hasher, plan_catalog
+from models import User
+
+headers = { "Content-Type": "application/json" }
+
+
+def login_spike(clients, logins):
+    statuses = []
+    read_latencies = []
+    done = threading.Event()
+
+    def login_client():
+        client = app.test_client()
+        for _ in range(logins):
+            response = client.post("/api/auth/login", json={ "email": "bench@example.com", "password": "password" }, headers=headers)
+            statuses.append(response.status_code)
+
+    def read_client():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get("/api/plans")
+            read_latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    reader = threading.Thread(target=read_client)
+    reader.start()
+    threads = [threading.Thread(target=login_client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    reader.join()
+
+    ok = statuses.count(200)
+    busy = statuses.count(503)
+    p95 = statistics.quantiles(read_latencies, n=20)[-1] * 1000 if len(read_latencies) > 1 else float('nan')
+    return ok / elapsed, busy, p95
+
+
+def run(clients, logins, rounds):
+    app.config['BCRYPT_LOG_ROUNDS'] = rounds
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        plan_catalog.invalidate()
+        app.config['BCRYPT_POOL_SIZE'] = 0
+        db.session.add(User(email="bench@example.com", first_name="bench", last_name="user", password="password", created_at=0))
+        db.session.commit()
+
+    print(f"{clients} clients x {logins} logins, cost factor {rounds}")
+    print(f"{'pool size':<12}{'logins/s':>10}{'rejected':>10}{'read p95 ms':>14}")
+    for pool_size in [0, 1, 2, 4, 8]:
+        with app.app_context():
+            password_hasher.shutdown()
+        app.config['BCRYPT_POOL_SIZE'] = pool_size
+        app.config['BCRYPT_QUEUE_DEPTH'] = 4 * max(pool_size, 1)
+        if pool_size:
+            # start the workers outside of the measurement
+            with app.app_context():
+                executor, _ = password_hasher._pool()
+                list(executor.map(abs, range(pool_size * 2)))
+
+        throughput, busy, p95 = login_spike(clients, logins)
+        label = "inline" if pool_size == 0 else str(pool_size)
+        print(f"{label:<12}{throughput:10.1f}{busy:10d}{p95:14.1f}")
+
+    with app.app_context():
+        password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    clients, logins, rounds = args + [16, 10, 10][len(args):]
+    run(clients, logins, rounds)
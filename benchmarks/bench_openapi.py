@@ -0,0 +1,64 @@
+'''
+Serving the OpenAPI document: the flask-restx `swagger.json` view, which
+serializes the spec on every request and introspects every namespace on the
+first one, against the precomputed bytes of `OpenApiDocument` (core/openapi.py).
+Request timings go through the Flask test client.
+
+    python -m benchmarks.bench_openapi [requests]
+'''
+import statistics
+import sys
+import time
+from benchmarks import bench_app, timer
+
+app = bench_app()
+
+from flask_restx.api import SwaggerView
+from flask_restx.swagger import Swagger
+from apis import api
+from core.extensions import openapi_document
+from core.openapi import encode
+
+
+def measure(client, requests, headers=None):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get("/api/swagger.json", headers=headers or {})
+        timings.append(time.perf_counter() - start)
+    return response, statistics.median(timings) * 1000
+
+
+def run(requests):
+    with app.test_request_context():
+        with timer("introspect namespaces (Swagger.as_dict)"):
+            Swagger(api).as_dict()
+    body = openapi_document.generate(app)
+    with timer("compress, br 11 + gzip 9 (once)"):
+        encode(body)
+
+    client = app.test_client()
+    endpoint = api.endpoint('specs')
+    precomputed = app.view_functions[endpoint]
+    # the view flask-restx registers for the route
+    app.view_functions[endpoint] = api.output(SwaggerView.as_view(endpoint, api))
+    response, restx = measure(client, requests)
+    restx_size = len(response.data)
+    app.view_functions[endpoint] = precomputed
+
+    print(f"\n{'swagger.json':<40} {'median':>10} {'bytes':>8}")
+    print(f"{'flask-restx view':<40} {restx:>7.3f} ms {restx_size:>8}")
+    for label, headers in (
+        ("precomputed, identity", {}),
+        ("precomputed, gzip", { 'Accept-Encoding': 'gzip' }),
+        ("precomputed, br", { 'Accept-Encoding': 'gzip, deflate, br' }),
+    ):
+        response, median = measure(client, requests, headers)
+        print(f"{label:<40} {median:>7.3f} ms {len(response.data):>8}")
+    headers = { 'Accept-Encoding': 'br', 'If-None-Match': response.headers['ETag'] }
+    response, median = measure(client, requests, headers)
+    print(f"{'precomputed, br, 304 revalidation':<40} {median:>7.3f} ms {len(response.data):>8}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
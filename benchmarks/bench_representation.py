@@ -0,0 +1,90 @@
+'''
+Encoding cost and size of subscription history pages of 10, 100 and 1,000 rows:
+
+1. encode only - the page dict to bytes with the stdlib encoder and orjson,
+   then gzip (level 6) and brotli (quality 4) of the result
+2. full request - `GET /api/subscriptions?per_page=N` through the Flask test
+   client, per JSON backend and `Accept-Encoding`, with bytes on the wire
+
+    python -m benchmarks.bench_representation [requests]
+'''
+import statistics
+import sys
+import time
+from datetime import datetime
+from benchmarks import bench_app
+
+app = bench_app()
+app.config['HISTORY_MAX_PER_PAGE'] = 1000
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+from core.extensions import db, response_encoder
+from core.representation import json_backend, COMPRESSORS
+from core.subscriptions import backfill_current_subscriptions
+from models import User, Plan, Subscription
+
+SIZES = (10, 100, 1000)
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def seed():
+    now = int(datetime.now().timestamp())
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        with db.engine.begin() as connection:
+            connection.execute(insert(Plan), [{ 'name': "Premium", 'price': 200, 'created_at': now }])
+            connection.execute(insert(User), [{
+                'id': 1, 'email': "pages@example.com", 'first_name': "Bench", 'last_name': "User", 'password_hash': "-", 'created_at': now,
+            }])
+            connection.execute(insert(Subscription), [{
+                'user_id': 1, 'plan_id': 1, 'name': "Premium", 'price': 200,
+                'start_date': now - (max(SIZES) - i) * 3600, 'end_date': now + 30 * 86400,
+                'created_at': now - (max(SIZES) - i) * 3600, 'is_active': i == max(SIZES) - 1,
+            } for i in range(max(SIZES))])
+            backfill_current_subscriptions(connection)
+        return create_access_token("1")
+
+
+def run(requests):
+    token = seed()
+    client = app.test_client()
+    levels = response_encoder.levels
+
+    print("encode only, ms (median)")
+    print(f"{'rows':>6} {'json':>8} {'orjson':>8} {'gzip':>8} {'br':>8}   {'bytes':>8} {'gzip':>8} {'br':>8}")
+    for size in SIZES:
+        page = client.get(f"/api/subscriptions?per_page={size}", headers={ 'Authorization': "Bearer " + token }).json
+        body = json_backend('orjson')(page)
+        compressed = { encoding: compress(body, levels[encoding]) for encoding, compress in COMPRESSORS.items() }
+        print(
+            f"{size:>6} {median_ms(lambda: json_backend('json')(page), requests):>8.3f} {median_ms(lambda: json_backend('orjson')(page), requests):>8.3f}"
+            f" {median_ms(lambda: COMPRESSORS['gzip'](body, levels['gzip']), requests):>8.3f} {median_ms(lambda: COMPRESSORS['br'](body, levels['br']), requests):>8.3f}"
+            f"   {len(body):>8} {len(compressed['gzip']):>8} {len(compressed['br']):>8}"
+        )
+
+    print("\nfull request, ms (median) / bytes")
+    print(f"{'rows':>6} {'backend':>8} {'identity':>18} {'gzip':>18} {'br':>18}")
+    for size in SIZES:
+        for backend in ('json', 'orjson'):
+            response_encoder.dumps = json_backend(backend)
+            cells = []
+            for encoding in ('identity', 'gzip', 'br'):
+                headers = { 'Authorization': "Bearer " + token, 'Accept-Encoding': encoding }
+                elapsed = median_ms(lambda: client.get(f"/api/subscriptions?per_page={size}", headers=headers), max(1, requests // 10))
+                cells.append(f"{elapsed:>8.2f} / {len(client.get(f'/api/subscriptions?per_page={size}', headers=headers).data):>6}")
+            print(f"{size:>6} {backend:>8} {cells[0]:>18} {cells[1]:>18} {cells[2]:>18}")
+    response_encoder.dumps = json_backend(app.config['JSON_BACKEND'])
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
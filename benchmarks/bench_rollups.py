@@ -0,0 +1,105 @@
+'''
+Per plan monthly analytics over a seeded history: an ad-hoc window + GROUP BY
+scan of both subscription tables (new subscriptions, upgrades and MRR only,
+a subset of what the rollups hold) against the primary key read of
+`plan_monthly_rollups`, then `GET /api/analytics/rollups` through the Flask
+test client, and `rebuild_rollups` inline and over worker processes.
+
+    python -m benchmarks.bench_rollups [subscriptions] [requests]
+'''
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from benchmarks import bench_app, timer
+
+app = bench_app()
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from core.archive import archive_subscriptions, union_all_tables
+from core.extensions import db
+from core.rollups import month_of, rebuild_rollups, shift_month
+from core.seed import seed_database
+
+SEEDED_AT = int(time.time())
+
+# The question the rollups answer, asked of the history: classify every row
+# against the previous subscription of its user, then group the month
+ADHOC_SQL = """
+    SELECT plan_id,
+           SUM(CASE WHEN upgrade = 1 THEN 0 ELSE 1 END) AS new_subscriptions,
+           SUM(upgrade) AS upgrades_in,
+           SUM(price) AS mrr
+    FROM (
+        SELECT plan_id, price, start_date,
+               CASE WHEN previous_plan_id <> plan_id AND previous_end = start_date
+                         AND previous_active = 0 AND previous_end < previous_start + :period
+                    THEN 1 ELSE 0 END AS upgrade
+        FROM (
+            SELECT plan_id, price, start_date,
+                   LAG(plan_id) OVER w AS previous_plan_id, LAG(start_date) OVER w AS previous_start,
+                   LAG(end_date) OVER w AS previous_end, LAG(is_active) OVER w AS previous_active
+            FROM ({history}) history
+            WINDOW w AS (PARTITION BY user_id ORDER BY created_at, id)
+        ) ordered
+    ) classified
+    WHERE start_date >= :first AND start_date < :next
+    GROUP BY plan_id
+    ORDER BY plan_id
+"""
+
+ROLLUP_SQL = "SELECT plan_id, new_subscriptions, upgrades_in, mrr FROM plan_monthly_rollups WHERE month = :month ORDER BY plan_id"
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def month_bounds(month):
+    first, following = (datetime.strptime(value, '%Y-%m').replace(tzinfo=timezone.utc) for value in (month, shift_month(month, 1)))
+    return int(first.timestamp()), int(following.timestamp())
+
+
+def run(subscriptions, requests):
+    from core.subscriptions import SUBSCRIPTION_PERIOD
+
+    client = app.test_client()
+    with app.app_context():
+        seed_database(db.engine, max(1, subscriptions // 10), subscriptions, now=SEEDED_AT, workers=os.cpu_count(), reset=True)
+        # part of the history lives in the archive, both reads have to see it
+        archive_subscriptions(db.engine, SEEDED_AT - 180 * 24 * 3600, batch_size=5000)
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        month = shift_month(month_of(SEEDED_AT), -1)
+        first, following = month_bounds(month)
+        history = union_all_tables("SELECT user_id, plan_id, price, start_date, end_date, is_active, created_at, id FROM {table}", dialect_name=db.engine.dialect.name)
+        adhoc = text(ADHOC_SQL.format(history=history))
+        params = { 'period': SUBSCRIPTION_PERIOD, 'first': first, 'next': following, 'month': month }
+
+        scanned = [tuple(row) for row in db.session.execute(adhoc, params)]
+        rolled = [tuple(row) for row in db.session.execute(text(ROLLUP_SQL), params)]
+        assert [row[:3] for row in scanned] == [row[:3] for row in rolled if row[1] or row[2]], (scanned, rolled)
+
+        print(f"{subscriptions} subscriptions, month {month}")
+        print(f"{'ad-hoc scan (window + GROUP BY)':<40} {median_ms(lambda: db.session.execute(adhoc, params).all(), max(1, requests // 50)):>10.3f} ms")
+        print(f"{'rollup read':<40} {median_ms(lambda: db.session.execute(text(ROLLUP_SQL), params).all(), requests):>10.3f} ms")
+
+        headers = { 'Authorization': "Bearer " + create_access_token("1", additional_claims={ 'is_admin': True }) }
+        print(f"{'GET /api/analytics/rollups':<40} {median_ms(lambda: client.get(f'/api/analytics/rollups?month={month}', headers=headers), requests):>10.3f} ms")
+        db.session.remove()
+
+        for workers in (0, os.cpu_count()):
+            with timer(f"rebuild, {workers} workers", subscriptions):
+                rebuild_rollups(db.engine, workers=workers, chunk_size=5000)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
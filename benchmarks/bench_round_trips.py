@@ -0,0 +1,62 @@
+'''
+SQL statements issued per write endpoint, read from the `Server-Timing`
+header (see core/instrumentation.py). COMMIT is not a statement and is not
+counted.
+
+    python -m benchmarks.bench_round_trips
+'''
+import re
+from benchmarks import bench_app
+
+app = bench_app()
+
+from flask_jwt_extended import create_access_token
+from core.extensions import db
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def statements(response):
+    return int(QUERIES.search(response.headers['Server-Timing']).group(1))
+
+
+def run():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    client = app.test_client()
+    user = { "email": "round-trips@example.com", "first_name": "Round", "last_name": "Trips", "password": "password" }
+
+    cases = []
+
+    def call(label, method, path, json, headers=None, expected=200):
+        response = client.open(path, method=method, json=json, headers=headers)
+        assert response.status_code == expected, (label, response.status_code, response.json)
+        cases.append((label, response.status_code, statements(response)))
+        return response
+
+    call("register", 'POST', "/api/auth/register-user", user)
+    call("register (duplicate email)", 'POST', "/api/auth/register-user", user, expected=422)
+    call("create plan", 'POST', "/api/plans", { "name": "Basic", "price": 50 })
+    call("create plan (duplicate name)", 'POST', "/api/plans", { "name": "Basic", "price": 50 }, expected=422)
+    call("create plan", 'POST', "/api/plans", { "name": "Premium", "price": 200 })
+
+    with app.app_context():
+        headers = { "authorization": "Bearer " + create_access_token(identity="1") }
+
+    call("subscribe", 'POST', "/api/subscriptions", { "plan_id": "1" }, headers)
+    call("subscribe (unknown plan)", 'POST', "/api/subscriptions", { "plan_id": "99" }, headers, expected=400)
+    call("upgrade", 'PUT', "/api/subscriptions/upgrade", { "plan_id": "2" }, headers)
+    call("upgrade (same plan)", 'PUT', "/api/subscriptions/upgrade", { "plan_id": "2" }, headers, expected=400)
+
+    keyed = { **headers, "Idempotency-Key": "round-trips" }
+    call("upgrade (Idempotency-Key)", 'PUT', "/api/subscriptions/upgrade", { "plan_id": "1" }, keyed)
+    call("upgrade (replayed)", 'PUT', "/api/subscriptions/upgrade", { "plan_id": "1" }, keyed)
+
+    for label, status, count in cases:
+        print(f"{label:<32} {status}  {count} statements")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,55 @@
+'''
+Serialize subscription rows with `SubscriptionSchema(many=True).dump` and with
+the precompiled `subscription_serializer`, reporting time and peak memory.
+
+    python -m benchmarks.bench_serialization [rows]
+'''
+import json
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from benchmarks import bench_app
+
+app = bench_app()
+
+from core.schema.subscription_schema import SubscriptionSchema, subscription_serializer
+from core.subscriptions import SubscriptionRecord
+
+
+def make_rows(count):
+    return [
+        (i, Decimal('200.00'), 'Premium', 1700000000 + i, 1702592000 + i, i % 2, 1, 2, 1700000000 + i)
+        for i in range(1, count + 1)
+    ]
+
+
+def measure(label, fn, count):
+    fn()  # warm up
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<30} {elapsed * 1000:9.1f} ms  {elapsed * 1e6 / count:7.2f} us/row  peak {peak / 1024 / 1024:7.2f} MiB")
+
+
+def run(count):
+    keys = SubscriptionRecord._fields
+    rows = make_rows(count)
+    records = [SubscriptionRecord(*row) for row in rows]
+    schema = SubscriptionSchema(many=True)
+
+    assert json.dumps(schema.dump(records)) == json.dumps(subscription_serializer.dump_many(rows, keys))
+
+    print(f"{count} rows")
+    measure("marshmallow schema.dump", lambda: schema.dump(records), count)
+    measure("subscription_serializer", lambda: subscription_serializer.dump_many(rows, keys), count)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,120 @@
+'''
+Concurrent readers (active subscription lookup) and writers (subscribe)
+against a SQLite file, with SQLite defaults and with the SQLITE_PRAGMAS profile.
+
+    python -m benchmarks.bench_sqlite_profile [readers] [writers] [seconds]
+'''
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import create_engine, insert
+from benchmarks import bench_app
+
+app = bench_app()
+
+from core.extensions import db
+from core.pool import TimedQueuePool
+from core.sqlite import apply_sqlite_pragmas
+from apis.subscription_namespace import active_subscription_query
+from core.subscriptions import backfill_current_subscriptions
+from core.upsert import upsert
+from models import Subscription, CurrentSubscription
+
+USERS = 1000
+
+set_current = upsert(CurrentSubscription.__table__, ('user_id',), ('subscription_id', 'plan_id', 'end_date'), 'sqlite')
+
+
+def make_engine(path, pragmas):
+    engine = create_engine('sqlite:///' + path, poolclass=TimedQueuePool, pool_size=32, max_overflow=0,
+                           connect_args={ 'timeout': 30 })
+    if pragmas:
+        apply_sqlite_pragmas(engine, pragmas)
+    return engine
+
+
+def seed(engine):
+    db.metadata.create_all(engine)
+    now = int(datetime.now().timestamp())
+    rows = [
+        {
+            'name': 'Premium', 'price': 200, 'start_date': now - 86400 * (i % 60),
+            'end_date': now - 86400 * (i % 60) + 86400 * 30, 'is_active': True,
+            'user_id': i % USERS + 1, 'plan_id': 1, 'created_at': now - 86400 * (i % 60)
+        }
+        for i in range(50000)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(Subscription), rows)
+        backfill_current_subscriptions(connection)
+
+
+def run_mix(engine, readers, writers, seconds):
+    stop = threading.Event()
+    read_latencies = []
+    write_latencies = []
+
+    def reader(n):
+        user_id = n
+        while not stop.is_set():
+            user_id = user_id % USERS + 1
+            start = time.perf_counter()
+            with engine.connect() as connection:
+                now = int(datetime.now().timestamp())
+                connection.execute(active_subscription_query, { "user_id": user_id, "now": now }).first()
+            read_latencies.append(time.perf_counter() - start)
+
+    def writer(n):
+        user_id = n
+        while not stop.is_set():
+            user_id = user_id % USERS + 1
+            now = int(datetime.now().timestamp())
+            start = time.perf_counter()
+            # the subscribe path: INSERT, pointer upsert and a commit
+            with engine.begin() as connection:
+                subscription_id = connection.execute(insert(Subscription).returning(Subscription.id), {
+                    'name': 'Premium', 'price': 200, 'start_date': now, 'end_date': now + 86400 * 30,
+                    'is_active': True, 'user_id': user_id, 'plan_id': 1, 'created_at': now
+                }).scalar()
+                connection.execute(set_current, {
+                    'user_id': user_id, 'subscription_id': subscription_id, 'plan_id': 1, 'end_date': now + 86400 * 30
+                })
+            write_latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    def summary(latencies):
+        if len(latencies) < 2:
+            return f"{len(latencies) / seconds:9.0f} /s"
+        p95 = statistics.quantiles(latencies, n=20)[-1] * 1000
+        return f"{len(latencies) / seconds:9.0f} /s  p95 {p95:7.2f} ms"
+
+    return summary(read_latencies), summary(write_latencies)
+
+
+def run(readers, writers, seconds):
+    directory = tempfile.mkdtemp(prefix='sqlite-profile-bench-')
+    print(f"{readers} readers, {writers} writers, {seconds}s")
+    for label, pragmas in [("defaults", None), ("SQLITE_PRAGMAS", app.config['SQLITE_PRAGMAS'])]:
+        engine = make_engine(os.path.join(directory, f"{label}.db"), pragmas)
+        seed(engine)
+        reads, writes = run_mix(engine, readers, writers, seconds)
+        print(f"{label:<16} active lookup {reads}   subscribe {writes}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    readers, writers, seconds = args + [8, 2, 5][len(args):]
+    run(readers, writers, seconds)
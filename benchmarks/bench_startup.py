@@ -0,0 +1,148 @@
+'''
+Worker cold start and memory, before and after the preloaded, warmed up app.
+
+1. First requests of a fresh process, against a local SQLite stand-in:
+   * lazy - build the app, serve (what every worker used to do)
+   * warm - build the app, `warm_up` (core/warmup.py), serve
+2. gunicorn with `--workers N` (prod config):
+   * before - `gunicorn app:app`, every worker imports and builds its own app
+   * after  - `gunicorn -c gunicorn.conf.py`, one preloaded and prepared app,
+     forked workers that connect and warm up before accepting traffic
+   Reports the time until the server answers, the first response of each
+   worker, and per worker memory from /proc/<pid>/smaps_rollup once every
+   worker has served traffic: RSS, PSS (shared pages split between the
+   processes sharing them) and USS (pages private to the worker).
+
+    python -m benchmarks.bench_startup [--workers 4] [--users 200]
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_async_reads import seed, free_port, HOST
+
+PATHS = ("/api/subscriptions/active", "/api/subscriptions?per_page=10", "/api/plans", "/api/swagger.json")
+
+
+def cold(mode):
+    '''Child process: time the build and the first two rounds of requests, print them as JSON'''
+    started = time.perf_counter()
+    from benchmarks import bench_app
+    app = bench_app()
+    timings = { 'build': time.perf_counter() - started }
+
+    if mode == 'warm':
+        from core.warmup import warm_up
+        started = time.perf_counter()
+        warm_up(app)
+        timings['warm_up'] = time.perf_counter() - started
+
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        headers = { 'Authorization': "Bearer " + create_access_token("1") }
+    client = app.test_client()
+    for round in ('first', 'second'):
+        for path in PATHS:
+            started = time.perf_counter()
+            assert client.get(path, headers=headers).status_code == 200
+            timings[f"{round} {path}"] = time.perf_counter() - started
+    print(json.dumps(timings))
+
+
+def memory(pid):
+    '''(rss, pss, uss) KiB of a process'''
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                values[name] = int(value.split()[0])
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def workers_of(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as children:
+        return [int(child) for child in children.read().split()]
+
+
+def get(port, path, token):
+    request = urllib.request.Request(f"http://{HOST}:{port}{path}", headers={ 'Authorization': "Bearer " + token })
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+        return time.perf_counter() - started, response.status
+
+
+def gunicorn(label, args, workers, tokens):
+    port = free_port()
+    env = { **os.environ, 'FLASK_ENV': 'prod' }
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *args, '--workers', str(workers), '--bind', f"{HOST}:{port}", '--log-level', 'warning'],
+        env=env,
+    )
+    try:
+        # up: the first answer of any worker
+        while True:
+            try:
+                first, _ = get(port, PATHS[0], tokens[0])
+                break
+            except OSError:
+                time.sleep(0.01)
+        up = time.perf_counter() - started
+
+        # first requests spread over the workers, one connection each
+        with ThreadPoolExecutor(workers * 4) as pool:
+            firsts = [elapsed for elapsed, _ in pool.map(lambda i: get(port, PATHS[i % len(PATHS)], tokens[i % len(tokens)]), range(workers * 4))]
+            list(pool.map(lambda i: get(port, PATHS[i % len(PATHS)], tokens[i % len(tokens)]), range(workers * 100)))
+
+        children = workers_of(server.pid)
+        rows = [memory(pid) for pid in children]
+        master = memory(server.pid)
+        print(
+            f"{label:<7} {up * 1000:>8.0f} {first * 1000:>9.1f} {statistics.median(firsts) * 1000:>10.1f} {max(firsts) * 1000:>9.1f}"
+            f" {statistics.mean(row[0] for row in rows) / 1024:>9.1f} {statistics.mean(row[1] for row in rows) / 1024:>9.1f}"
+            f" {statistics.mean(row[2] for row in rows) / 1024:>9.1f} {(master[1] + sum(row[1] for row in rows)) / 1024:>10.1f}"
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(workers, users):
+    tokens = seed(users)  # also sets DATABASE_URL, inherited by the child processes
+
+    print("first requests of a fresh process, ms")
+    results = {
+        mode: json.loads(subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--cold', mode], capture_output=True, text=True, check=True).stdout.splitlines()[-1])
+        for mode in ('lazy', 'warm')
+    }
+    print(f"{'':<40} {'lazy':>9} {'warm':>9}")
+    for key in results['warm']:
+        print(f"{key:<40} {results['lazy'].get(key, 0) * 1000:>9.1f} {results['warm'][key] * 1000:>9.1f}")
+
+    print(f"\ngunicorn, {workers} workers, {os.cpu_count()} CPU; ms, then MiB per worker and total PSS")
+    print(f"{'':<7} {'up':>8} {'1st req':>9} {'1st p50':>10} {'1st max':>9} {'RSS':>9} {'PSS':>9} {'USS':>9} {'total PSS':>10}")
+    # gunicorn reads ./gunicorn.conf.py unless given another config file
+    with tempfile.NamedTemporaryFile(suffix='.py') as no_config:
+        gunicorn('before', ['-c', no_config.name, 'app:app'], workers, tokens)
+    gunicorn('after', ['-c', 'gunicorn.conf.py'], workers, tokens)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--cold', choices=('lazy', 'warm'))
+    args = parser.parse_args()
+    if args.cold:
+        cold(args.cold)
+    else:
+        run(args.workers, args.users)
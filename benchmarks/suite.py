@@ -0,0 +1,295 @@
+'''
+Layered benchmark suite for the two hot reads, the active subscription and the
+first history page, measured one layer at a time:
+
+* raw      - SQL on a DBAPI cursor
+* orm      - `select(Subscription)` through the session, rows loaded as entities
+* dump     - serialization of an already fetched page (serializer and schema)
+* request  - the endpoint through the Flask test client, JWT and all
+
+Every case runs cold (fresh connections, emptied app caches, a user not read
+before) and warm (after warm-up, cycling over a small hot set of users), and
+reports p50/p95/p99 latency.
+
+    python -m benchmarks.suite [--size 10k|1m|10m] [--samples N] [--save] [--tolerance 0.25]
+
+Datasets are generated by `core.seed` (as `flask seed` does) once per size into
+`BENCH_DATA_DIR` (a temp directory by default) and reused, unless
+`DATABASE_URL` is set. `--save` writes the results
+to the baseline file, otherwise the run is compared with it and exits 1 when
+a p50 or p95 is slower than the baseline by more than the tolerance.
+'''
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from itertools import cycle, islice
+
+SIZES = { '10k': 10_000, '1m': 1_000_000, '10m': 10_000_000 }
+SUBSCRIPTIONS_PER_USER = 10  # on average, see `flask seed`
+HISTORY_PAGE = 10
+HOT_USERS = 10
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+COMPARED = ('p50', 'p95')
+
+
+def dataset_url(size):
+    data_dir = os.getenv('BENCH_DATA_DIR', os.path.join(tempfile.gettempdir(), 'subscription-bench'))
+    os.makedirs(data_dir, exist_ok=True)
+    return 'sqlite:///' + os.path.join(data_dir, f'subscriptions-{size}.db')
+
+
+def prepare(size, count):
+    from sqlalchemy import inspect, text
+    from core.extensions import db
+    from core.seed import seed_database
+
+    seeded = None
+    if inspect(db.engine).has_table('subscriptions'):
+        seeded = db.session.execute(text("SELECT COUNT(*) FROM subscriptions")).scalar()
+    db.session.remove()
+
+    if seeded != count:
+        print(f"seeding {count} subscriptions ...", file=sys.stderr)
+        result = seed_database(db.engine, max(1, count // SUBSCRIPTIONS_PER_USER), count, workers=os.cpu_count(), reset=True)
+        print(f"seeded in {result['seconds']:.1f} s", file=sys.stderr)
+
+    # users with an active subscription, so both endpoints answer 200
+    return db.session.execute(text("""
+            SELECT DISTINCT user_id
+            FROM subscriptions
+            WHERE is_active = TRUE AND end_date > :now
+            ORDER BY user_id
+        """), { 'now': int(time.time()) }).scalars().all()
+
+
+def raw_statement(engine, sql):
+    '''Compile a `text()` statement for the driver -> (sql string, values -> DBAPI params)'''
+    compiled = sql.compile(dialect=engine.dialect)
+    if compiled.positional:
+        return str(compiled), lambda values: tuple(compiled.construct_params(values)[key] for key in compiled.positiontup)
+    return str(compiled), compiled.construct_params
+
+
+def build_cases(app):
+    '''(layer, scenario) -> function(user_id)'''
+    from datetime import datetime
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import select, text
+    from core.extensions import db
+    from core.schema.subscription_schema import SubscriptionSchema, subscription_serializer
+    from apis.subscription_namespace import active_subscription_query
+    from models import Subscription, CurrentSubscription
+
+    history_query = text("""
+            SELECT *
+            FROM subscriptions
+            WHERE user_id = :user_id
+            ORDER BY created_at DESC, id DESC
+            LIMIT :limit
+        """)
+
+    def raw(sql, values):
+        statement, params = raw_statement(db.engine, sql)
+
+        def run(user_id):
+            conn = db.engine.raw_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(statement, params(values(user_id)))
+                cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
+        return run
+
+    def orm(query):
+        def run(user_id):
+            db.session.scalars(query(user_id)).all()
+            db.session.remove()
+        return run
+
+    pages = {}
+
+    def dump_serializer(user_id):
+        rows, keys, _ = pages[user_id]
+        return subscription_serializer.dump_many(rows, keys)
+
+    def dump_schema(user_id):
+        return SubscriptionSchema(many=True).dump(pages[user_id][2])
+
+    def page(user_id):
+        if user_id not in pages:
+            result = db.session.execute(history_query, { 'user_id': user_id, 'limit': HISTORY_PAGE })
+            rows = result.all()
+            entities = db.session.scalars(orm_history(user_id)).all()
+            db.session.expunge_all()
+            pages[user_id] = (rows, result.keys(), entities)
+        return pages[user_id]
+
+    def orm_active(user_id):
+        # the endpoint's pointer join: primary key read of current_subscriptions, then of subscriptions
+        return (select(Subscription)
+                .join(CurrentSubscription, CurrentSubscription.subscription_id == Subscription.id)
+                .where(CurrentSubscription.user_id == user_id, CurrentSubscription.end_date > int(datetime.now().timestamp())))
+
+    def orm_history(user_id):
+        return (select(Subscription)
+                .where(Subscription.user_id == user_id)
+                .order_by(Subscription.created_at.desc(), Subscription.id.desc())
+                .limit(HISTORY_PAGE))
+
+    # the page is fetched outside the timed call, the dump layer measures serialization only
+    dump_serializer.prepare = dump_schema.prepare = page
+
+    tokens = {}
+
+    def request(path):
+        client = app.test_client()
+
+        def run(user_id):
+            if user_id not in tokens:
+                tokens[user_id] = { 'authorization': "Bearer " + create_access_token(identity=str(user_id)) }
+            response = client.get(path, headers=tokens[user_id])
+            assert response.status_code == 200, response.json
+        return run
+
+    return {
+        ('raw', 'active'): raw(active_subscription_query, lambda user_id: { 'user_id': user_id, 'now': int(datetime.now().timestamp()) }),
+        ('raw', 'history'): raw(history_query, lambda user_id: { 'user_id': user_id, 'limit': HISTORY_PAGE }),
+        ('orm', 'active'): orm(orm_active),
+        ('orm', 'history'): orm(orm_history),
+        ('dump', 'history-serializer'): dump_serializer,
+        ('dump', 'history-schema'): dump_schema,
+        ('request', 'active'): request("/api/subscriptions/active"),
+        ('request', 'history'): request(f"/api/subscriptions?per_page={HISTORY_PAGE}"),
+    }
+
+
+def reset():
+    '''Cold start: new connections and empty application caches'''
+    from core.extensions import db, subscription_cache, plan_catalog, read_router
+    from core.schema.subscription_schema import subscription_serializer
+
+    db.session.remove()
+    for engine in db.engines.values():
+        engine.dispose()
+    subscription_cache.clear()
+    plan_catalog.invalidate()
+    read_router.clear()
+    subscription_serializer._compiled.clear()
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return { 'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98] }
+
+
+def measure(fn, users, samples, warm):
+    timings = []
+    prepare = getattr(fn, 'prepare', None)
+    if warm:
+        hot = users[:HOT_USERS]
+        for user_id in islice(cycle(hot), max(len(hot), samples // 10)):
+            if prepare is not None:
+                prepare(user_id)
+            fn(user_id)
+        order = islice(cycle(hot), samples)
+    else:
+        # each cold sample reads a user no earlier sample touched, as long as there are enough users
+        order = islice(cycle(users[HOT_USERS:] or users), samples)
+
+    for user_id in order:
+        if not warm:
+            reset()
+        if prepare is not None:
+            prepare(user_id)
+        start = time.perf_counter()
+        fn(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return percentiles(timings)
+
+
+def run(app, users, samples, layers):
+    results = {}
+    with app.app_context():
+        for (layer, scenario), fn in build_cases(app).items():
+            if layer not in layers:
+                continue
+            for mode in ('cold', 'warm'):
+                name = f"{layer}.{scenario}.{mode}"
+                results[name] = measure(fn, users, samples, warm=mode == 'warm')
+                stats = results[name]
+                print(f"{name:<36} p50 {stats['p50']:9.3f} ms  p95 {stats['p95']:9.3f} ms  p99 {stats['p99']:9.3f} ms")
+        reset()
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    '''Names of the cases slower than baseline * (1 + tolerance)'''
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        for metric in COMPARED:
+            before, after = baseline[name][metric], stats[metric]
+            # ignore sub-noise differences on microsecond timings
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{name} {metric}: {before:.3f} -> {after:.3f} ms (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', default='10k', help="dataset: 10k, 1m, 10m or a number of subscriptions")
+    parser.add_argument('--samples', type=int, default=200, help="timed calls per case and mode")
+    parser.add_argument('--layers', default='raw,orm,dump,request')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline for this size")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument('--min-delta-ms', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    count = SIZES.get(args.size.lower()) or int(args.size)
+    size = args.size.lower()
+
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = dataset_url(size)
+
+    from benchmarks import bench_app
+    app = bench_app()
+
+    with app.app_context():
+        users = prepare(size, count)
+    print(f"dataset {size}: {count} subscriptions, {len(users)} users, {args.samples} samples per case")
+
+    results = run(app, users, args.samples, set(args.layers.split(',')))
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.save:
+        baselines[size] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if size not in baselines:
+        print(f"no baseline for {size} in {args.baseline}, run with --save to record one")
+        return 0
+
+    regressions = compare(results, baselines[size], args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    print(f"{len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,119 @@
 import os
+from core.pool import TimedQueuePool
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 database_url = os.getenv('DATABASE_URL', None)
+replica_database_url = os.getenv('REPLICA_DATABASE_URL', None)
 sqlite_database_url = 'sqlite:///' + os.path.join(basedir, 'sqlite.db')
 
+
+def engine_options(pool_size=5, max_overflow=10):
+    '''SQLAlchemy engine/pool options, every value can be overridden from the environment'''
+    return {
+        'poolclass': TimedQueuePool,  # QueuePool + checkout wait statistics
+        'pool_size': int(os.getenv('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),  # seconds to wait for a connection
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),  # below MySQL wait_timeout
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+
+
+def replica_binds():
+    '''Read replica bind, used by the history and active subscription reads'''
+    return { 'replica': replica_database_url } if replica_database_url else {}
+
+
 class Config:
     JWT_ACCESS_TOKEN_EXPIRES = 60 * 60 * 1  # 1 hour
     JWT_SECRET_KEY = os.getenv('SECRET_KEY', '@#$%^&*_secret_key')
     DEBUG = False
+    # Password hashing, see core/hashing.py
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', os.cpu_count() or 1))  # 0 -> hash on the request thread
+    BCRYPT_QUEUE_DEPTH = int(os.getenv('BCRYPT_QUEUE_DEPTH', 4 * (os.cpu_count() or 1)))
+    # Comma separated emails whose tokens carry the `is_admin` claim
+    ADMIN_EMAILS = [email.strip() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()]
+    # Bulk subscription provisioning
+    BULK_SUBSCRIPTION_MAX_ITEMS = int(os.getenv('BULK_SUBSCRIPTION_MAX_ITEMS', 5000))
+    BULK_SUBSCRIPTION_CHUNK_SIZE = int(os.getenv('BULK_SUBSCRIPTION_CHUNK_SIZE', 500))  # rows per INSERT statement
+    # Batch active subscription lookup for internal services
+    ACTIVE_BATCH_MAX_USERS = int(os.getenv('ACTIVE_BATCH_MAX_USERS', 5000))
+    ACTIVE_BATCH_CHUNK_SIZE = int(os.getenv('ACTIVE_BATCH_CHUNK_SIZE', 1000))  # user ids per statement
+    # Largest subscription history page a client can request
+    HISTORY_MAX_PER_PAGE = int(os.getenv('HISTORY_MAX_PER_PAGE', 100))
+    # SQLite performance profile (single node deployments), see core/sqlite.py
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # safe with WAL, fsync on checkpoint only
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),  # negative -> KiB
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # ms a writer waits for the lock
+        'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+    }
+    SQLITE_OPTIMIZE_ON_SHUTDOWN = True
+    # SQL accounting, see core/instrumentation.py
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() == 'true'  # per request db time in a Server-Timing header
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+    # Reads stay on the primary this long after a user's own write
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+    # Rows fetched per round trip by the streaming export
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    # Active subscription read-through cache
+    ACTIVE_SUBSCRIPTION_CACHE_TTL = int(os.getenv('ACTIVE_SUBSCRIPTION_CACHE_TTL', 60))  # seconds
+    ACTIVE_SUBSCRIPTION_CACHE_SIZE = int(os.getenv('ACTIVE_SUBSCRIPTION_CACHE_SIZE', 10000))  # users
+    # Expiry sweeper, see core/expiry.py
+    EXPIRY_SWEEPER_ENABLED = os.getenv('EXPIRY_SWEEPER_ENABLED', 'false').lower() == 'true'  # in-process thread
+    EXPIRY_SWEEP_INTERVAL = int(os.getenv('EXPIRY_SWEEP_INTERVAL', 60))  # seconds between sweeps
+    EXPIRY_SWEEP_BATCH_SIZE = int(os.getenv('EXPIRY_SWEEP_BATCH_SIZE', 1000))  # rows per transaction
+    EXPIRY_SWEEP_THROTTLE_MS = float(os.getenv('EXPIRY_SWEEP_THROTTLE_MS', 50))  # pause between batches
+    # Subscription archiver, see core/archive.py
+    ARCHIVER_ENABLED = os.getenv('ARCHIVER_ENABLED', 'false').lower() == 'true'  # in-process thread
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 180))  # ended subscriptions older than this move out
+    ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 3600))  # seconds between runs
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))  # rows per transaction
+    ARCHIVE_THROTTLE_MS = float(os.getenv('ARCHIVE_THROTTLE_MS', 50))  # pause between batches
+    # Idempotency-Key on subscription writes, see core/idempotency.py
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))  # seconds a key and its response are kept
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 10))  # a duplicate waits this long for the first request
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 30))  # an unfinished claim older than this is abandoned
+    IDEMPOTENCY_PURGER_ENABLED = os.getenv('IDEMPOTENCY_PURGER_ENABLED', 'false').lower() == 'true'  # in-process thread
+    IDEMPOTENCY_PURGE_INTERVAL = int(os.getenv('IDEMPOTENCY_PURGE_INTERVAL', 600))
+    IDEMPOTENCY_PURGE_BATCH_SIZE = int(os.getenv('IDEMPOTENCY_PURGE_BATCH_SIZE', 1000))
+    # ASGI serving mode (asgi.py): threads running the Flask routes that are not served by coroutines
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 16))
+    # Response encoding, see core/representation.py
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')  # auto -> orjson when installed, json -> stdlib encoder
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes, smaller bodies are sent as they are
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))  # 11 is for static files, far too slow per request
+    # Plan monthly rollups, see core/rollups.py
+    ROLLUP_MAX_MONTHS = int(os.getenv('ROLLUP_MAX_MONTHS', 36))  # longest month range of a plan a client can request
+    ROLLUP_REBUILD_CHUNK_SIZE = int(os.getenv('ROLLUP_REBUILD_CHUNK_SIZE', 5000))  # users per unit of work of `flask rebuild-rollups`
+    # Plan catalog snapshot, reloaded after this many seconds, or when the shared version moved on
+    PLAN_CATALOG_TTL = int(os.getenv('PLAN_CATALOG_TTL', 300))
+    PLAN_CATALOG_CHECK_SECONDS = float(os.getenv('PLAN_CATALOG_CHECK_SECONDS', 1))  # version check interval, bounds how stale other workers' plans can be
 
 
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_ECHO = True # log query
     SQLALCHEMY_DATABASE_URI = database_url or sqlite_database_url
+    SQLALCHEMY_BINDS = replica_binds()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=10)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 
 class TestingConfig(Config):
     DEBUG = True
     TESTING = True
+    ADMIN_EMAILS = ['admin@example.com']
+    BCRYPT_LOG_ROUNDS = 4
+    BCRYPT_POOL_SIZE = 0
     SQLALCHEMY_DATABASE_URI = sqlite_database_url
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=5)
     PRESERVE_CONTEXT_ON_EXCEPTION = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
@@ -29,6 +121,9 @@ class TestingConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = database_url
+    SQLALCHEMY_BINDS = replica_binds()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=20)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 
 config_by_env = dict(
@@ -0,0 +1,119 @@
+import logging
+import time
+from sqlalchemy import Integer, bindparam, delete, exists, insert, select
+from core.jobs import PeriodicJob, keyset_chunks, run_in_batches
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+
+def subscription_columns():
+    '''Column list shared by `subscriptions` and `subscriptions_archive`, in table order'''
+    from models import Subscription
+
+    return [column.key for column in Subscription.__table__.columns]
+
+
+def union_all_tables(sql, order_by="", dialect_name=None):
+    '''
+    `sql` (a SELECT with a `{table}` placeholder) over the hot and the archive
+    table, concatenated with UNION ALL and sorted by `order_by` (ORDER BY /
+    LIMIT clauses). SQLite and PostgreSQL merge the two index ordered branches
+    and stop at the LIMIT. MySQL does not push the LIMIT down, so each branch
+    there gets its own ORDER BY / LIMIT.
+    '''
+    hot, archived = sql.format(table='subscriptions'), sql.format(table='subscriptions_archive')
+    if dialect_name in ('mysql', 'mariadb'):
+        return f"({hot} {order_by}) UNION ALL ({archived} {order_by}) {order_by}"
+    return f"{hot} UNION ALL {archived} {order_by}"
+
+
+def _statements():
+    from models import Subscription, SubscriptionArchive, CurrentSubscription
+
+    subscriptions = Subscription.__table__
+    archive = SubscriptionArchive.__table__
+    columns = subscription_columns()
+    ids = bindparam('ids', expanding=True)
+
+    # ended before the horizon, read from idx_is_active_end_date. A subscription
+    # something still points at stays (pointers only reference active rows, this is a guard)
+    ended = keyset_chunks(
+        select(subscriptions.c.id, subscriptions.c.end_date)
+        .where(
+            subscriptions.c.is_active == False,
+            subscriptions.c.end_date < bindparam('before', type_=Integer),
+            ~exists().where(CurrentSubscription.subscription_id == subscriptions.c.id),
+        ),
+        subscriptions.c.end_date, subscriptions.c.id,
+    )
+    copy = insert(archive).from_select(columns, select(*(subscriptions.c[key] for key in columns)).where(subscriptions.c.id.in_(ids)))
+    remove = delete(subscriptions).where(subscriptions.c.id.in_(ids))
+    return ended, copy, remove
+
+
+def archive_subscriptions(engine, before, batch_size=1000, throttle=0.0, max_batches=None):
+    '''
+    Move subscriptions that ended before the `before` timestamp from
+    `subscriptions` to `subscriptions_archive`: INSERT ... SELECT then DELETE
+    by id, one keyset ordered batch per transaction (see `run_in_batches`).
+    Returns the batch statistics.
+    '''
+    (first, after), copy, remove = _statements()
+
+    def apply(connection, ids):
+        connection.execute(copy, { 'ids': ids })
+        return connection.execute(remove, { 'ids': ids }).rowcount
+
+    return run_in_batches(engine, first, after, apply, { 'before': int(before) }, batch_size, throttle, max_batches)
+
+
+class SubscriptionArchiver(PeriodicJob):
+    '''
+    Keeps `subscriptions` down to recent and active rows: subscriptions that
+    ended more than `ARCHIVE_AFTER_DAYS` days ago are moved to
+    `subscriptions_archive`, which only the history and export reads visit.
+
+    Runs as `flask archive-subscriptions` or, with `ARCHIVER_ENABLED`, as a
+    daemon thread every `ARCHIVE_INTERVAL` seconds.
+    '''
+    name = 'subscription-archiver'
+
+    def __init__(self, app=None):
+        self.after_days = 180
+        self.batch_size = 1000
+        self.throttle = 0.05
+        super().__init__(app)
+
+    def init_app(self, app):
+        self.after_days = app.config.get('ARCHIVE_AFTER_DAYS', self.after_days)
+        self.batch_size = app.config.get('ARCHIVE_BATCH_SIZE', self.batch_size)
+        self.throttle = app.config.get('ARCHIVE_THROTTLE_MS', self.throttle * 1000) / 1000
+        self.interval = app.config.get('ARCHIVE_INTERVAL', self.interval)
+        app.extensions['subscription_archiver'] = self
+        if app.config.get('ARCHIVER_ENABLED'):
+            self.start(app)
+
+    def archive(self, now=None, after_days=None, batch_size=None, throttle=None):
+        '''One run on the app engine -> batch statistics'''
+        from core.extensions import db
+
+        after_days = self.after_days if after_days is None else after_days
+        before = int(now or time.time()) - after_days * DAY
+        result = self.record(archive_subscriptions(
+            db.engine, before,
+            batch_size=batch_size or self.batch_size,
+            throttle=self.throttle if throttle is None else throttle,
+        ))
+        if result['rows']:
+            logger.info("archived %(rows)d subscriptions in %(batches)d batches, %(seconds).2fs (%(rows_per_second)d rows/s)", result)
+        return result
+
+    run_once = archive
+
+    def stats(self):
+        return {
+            **super().stats(),
+            'after_days': self.after_days, 'batch_size': self.batch_size, 'throttle_ms': self.throttle * 1000,
+        }
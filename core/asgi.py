@@ -0,0 +1,83 @@
+from urllib.parse import parse_qsl
+from a2wsgi import WSGIMiddleware
+from flask_jwt_extended import decode_token
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_accept_header
+
+
+class AsgiApp:
+    '''
+    ASGI serving mode of the Flask app.
+
+    `routes` maps a GET path to a coroutine `handler(user_id, headers, args)`
+    that returns a Flask `Response`, or None to hand the request over. Those
+    run on the event loop, with an app context, for requests carrying a valid
+    access token; they read through the async engines of `AsyncDatabase` and
+    never hold a thread while waiting on the database.
+
+    Every other request (writes, auth, plans, metrics, Swagger), and every
+    request a handler hands over (no or invalid token, invalid query), runs
+    the Flask app as it is, on a pool of `ASGI_WSGI_THREADS` threads. Errors
+    are therefore answered by the Flask routes only.
+    '''
+
+    def __init__(self, app, routes, workers=None):
+        self.app = app
+        self.routes = routes
+        self.wsgi = WSGIMiddleware(app, workers=workers or app.config.get('ASGI_WSGI_THREADS', 10))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if handler is not None:
+            headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+            with self.app.app_context():
+                user_id = self.identity(headers)
+                response = None
+                if user_id is not None:
+                    args = MultiDict(parse_qsl(scope['query_string'].decode(), keep_blank_values=True))
+                    response = await handler(user_id, headers, args)
+            if response is not None:
+                # compressed like the responses of the Flask app
+                response = self.app.extensions['response_encoder'].compress(response, parse_accept_header(headers.get('Accept-Encoding')))
+                return await self.send(send, response)
+
+        await self.wsgi(scope, receive, send)
+
+    def identity(self, headers):
+        '''User id of a valid access token in the `Authorization` header, None otherwise'''
+        header_type, _, token = headers.get(self.app.config['JWT_HEADER_NAME'], '').partition(' ')
+        if header_type != self.app.config['JWT_HEADER_TYPE'] or not token:
+            return None
+        try:
+            claims = decode_token(token)
+            # `jwt_required()` refuses refresh tokens
+            if claims.get('type') != 'access':
+                return None
+            return int(claims[self.app.config['JWT_IDENTITY_CLAIM']])
+        except Exception:
+            # expired, tampered with, not ours: the Flask route answers
+            return None
+
+    @staticmethod
+    async def send(send, response):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.to_wsgi_list()],
+        })
+        await send({ 'type': 'http.response.body', 'body': response.get_data() })
+
+    async def lifespan(self, receive, send):
+        from core.extensions import async_db
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({ 'type': 'lifespan.startup.complete' })
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db.dispose()
+                await send({ 'type': 'lifespan.shutdown.complete' })
+                return
@@ -0,0 +1,80 @@
+from sqlalchemy.engine import make_url
+from core.sqlite import apply_sqlite_pragmas
+
+# asyncio driver used for the database of a sync URL
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+    'mariadb': 'mariadb+aiomysql',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_url(url):
+    '''`url` with the asyncio driver of the same database, unchanged when it already is one'''
+    url = make_url(url)
+    if url.get_dialect().is_async:
+        return url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver for '{backend}' databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class AsyncDatabase:
+    '''
+    Async engines for the ASGI serving mode (`asgi.py`): one per bind, the
+    primary and the `replica` of `SQLALCHEMY_BINDS`, on the asyncio driver of
+    the same database. Engines are created on first use, inside the event loop.
+
+    Pool sizes come from `SQLALCHEMY_ENGINE_OPTIONS`. The SQLite profile and
+    the slow query log hook them like the sync engines.
+    '''
+
+    def __init__(self, app=None):
+        self.urls = {}
+        self.engine_options = {}
+        self.echo = False
+        self.pragmas = {}
+        self._engines = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.urls = { None: app.config['SQLALCHEMY_DATABASE_URI'], **app.config.get('SQLALCHEMY_BINDS', {}) }
+        # TimedQueuePool is a sync pool, async engines get the asyncio adapted one
+        self.engine_options = { key: value for key, value in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).items() if key != 'poolclass' }
+        self.echo = app.config.get('SQLALCHEMY_ECHO', False)
+        self.pragmas = app.config.get('SQLITE_PRAGMAS', {})
+        app.extensions['async_db'] = self
+
+    def engine(self, bind=None):
+        engine = self._engines.get(bind)
+        if engine is None:
+            engine = self._engines[bind] = self._create(self.urls[bind])
+        return engine
+
+    def _create(self, url):
+        # asyncio support is only imported by the ASGI serving mode
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from core.extensions import query_instrumentation
+
+        engine = create_async_engine(async_url(url), echo=self.echo, **self.engine_options)
+        if engine.dialect.name == 'sqlite':
+            apply_sqlite_pragmas(engine.sync_engine, self.pragmas)
+        query_instrumentation.instrument(engine.sync_engine)
+        return engine
+
+    def engine_for(self, user_id=None, token=None):
+        '''Async engine to read `user_id` data from, routed like `ReadRouter.engine_for`, `token` is the client's `Read-Your-Writes` value'''
+        from core.extensions import read_router
+
+        if 'replica' not in self.urls or (user_id is not None and read_router.is_sticky(user_id, token)):
+            return self.engine()
+        return self.engine('replica')
+
+    async def dispose(self):
+        '''Close every pooled connection, call before the event loop ends'''
+        engines, self._engines = list(self._engines.values()), {}
+        for engine in engines:
+            await engine.dispose()
@@ -0,0 +1,21 @@
+from functools import wraps
+from flask import current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+
+
+def is_admin_email(email):
+    '''Admins are configured by email through `ADMIN_EMAILS`'''
+    return email in current_app.config.get('ADMIN_EMAILS', [])
+
+
+def admin_required():
+    '''Same as `jwt_required()` but the token must also carry the `is_admin` claim'''
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            verify_jwt_in_request()
+            if not get_jwt().get('is_admin', False):
+                return { 'error': "Admin privileges required." }, 403
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
@@ -0,0 +1,201 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+_MISS = object()
+
+
+class _Flight:
+    '''A load in progress, shared by every concurrent miss for the same key'''
+    __slots__ = ('event', 'value', 'error', 'stale')
+
+    def __init__(self, event=None):
+        self.event = threading.Event() if event is None else event
+        self.value = None
+        self.error = None
+        self.stale = False
+
+
+class ActiveSubscriptionCache:
+    '''
+    Read-through cache of serialized active subscriptions keyed by user id.
+
+    * Values are opaque, the active endpoint stores `(etag, serialized subscription)`
+      and drops an entry whose ETag no longer matches the user's version.
+    * An entry never outlives the subscription `end_date` it was built from.
+    * Concurrent misses for the same user are coalesced into a single load,
+      per thread pool (`get_or_load`) and per event loop (`get_or_load_async`).
+    * The cache is per process, `ACTIVE_SUBSCRIPTION_CACHE_TTL` bounds how long
+      an entry is kept.
+    '''
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.max_size = 10000
+        self._entries = OrderedDict()  # user_id -> (expires_at, value)
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('ACTIVE_SUBSCRIPTION_CACHE_TTL', self.ttl)
+        self.max_size = app.config.get('ACTIVE_SUBSCRIPTION_CACHE_SIZE', self.max_size)
+        app.extensions['active_subscription_cache'] = self
+
+    def _reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_load(self, user_id, loader):
+        '''
+        Return the cached value for `user_id`, calling `loader()` on a miss.
+        `loader` returns a `(value, expires_at)` tuple, `expires_at` is a unix
+        timestamp or None when the value has no natural expiry.
+        '''
+        with self._lock:
+            value = self._hit(user_id)
+            if value is not _MISS:
+                return value
+
+            flight = self._flights.get(user_id)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._flights[user_id] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value, expires_at = loader()
+        except Exception as err:
+            flight.error = err
+            raise
+        else:
+            flight.value = value
+            self._store(user_id, value, expires_at, flight)
+        finally:
+            with self._lock:
+                # an invalidate may have replaced it with a newer flight already
+                if self._flights.get(user_id) is flight:
+                    del self._flights[user_id]
+            flight.event.set()
+
+        return value
+
+    async def get_or_load_async(self, user_id, loader):
+        '''`get_or_load` for coroutines: `loader` is a coroutine function, waiting misses yield to the event loop'''
+        with self._lock:
+            value = self._hit(user_id)
+            if value is not _MISS:
+                return value
+
+            flight = self._async_flights.get(user_id)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._async_flights[user_id] = _Flight(asyncio.Event())
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            await flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value, expires_at = await loader()
+        except Exception as err:
+            flight.error = err
+            raise
+        else:
+            flight.value = value
+            self._store(user_id, value, expires_at, flight)
+        finally:
+            with self._lock:
+                # an invalidate may have replaced it with a newer flight already
+                if self._async_flights.get(user_id) is flight:
+                    del self._async_flights[user_id]
+            flight.event.set()
+
+        return value
+
+    def _hit(self, user_id):
+        '''The live entry of `user_id` or `_MISS`, call with the lock held'''
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return _MISS
+        if entry[0] > time.time():
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return entry[1]
+        # Entry outlived its subscription or ttl
+        del self._entries[user_id]
+        self.expirations += 1
+        return _MISS
+
+    def _store(self, user_id, value, expires_at, flight):
+        ttl_expires_at = time.time() + self.ttl
+        if expires_at is None or expires_at > ttl_expires_at:
+            expires_at = ttl_expires_at
+
+        with self._lock:
+            # A write invalidated this user while we were loading, the value may be stale
+            if flight.stale:
+                return
+            self._entries[user_id] = (expires_at, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        '''
+        Drop the cached value for `user_id`, call after any subscription write.
+        A load in flight is not stored, and later misses start a fresh one
+        instead of joining it, only callers already waiting get its value.
+        '''
+        with self._lock:
+            self._entries.pop(user_id, None)
+            for flights in (self._flights, self._async_flights):
+                flight = flights.pop(user_id, None)
+                if flight is not None:
+                    flight.stale = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for flights in (self._flights, self._async_flights):
+                for flight in flights.values():
+                    flight.stale = True
+                flights.clear()
+            self._reset_counters()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
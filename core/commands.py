@@ -0,0 +1,120 @@
+import logging
+import os
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from core.extensions import db, expiry_sweeper, subscription_archiver, idempotency_keys, openapi_document
+from core.rollups import rebuild_rollups
+from core.seed import seed_database
+from core.subscriptions import backfill_current_subscriptions
+
+
+@click.command('seed')
+@click.option('--subscriptions', type=int, default=100_000, show_default=True, help="Subscriptions to generate.")
+@click.option('--users', type=int, default=None, help="Users to generate, defaults to subscriptions / 10.")
+@click.option('--skew', type=float, default=1.0, show_default=True, help="Zipf exponent of subscriptions per user, 0 is uniform.")
+@click.option('--active-ratio', type=float, default=0.6, show_default=True, help="Share of users with an active subscription.")
+@click.option('--history-days', type=int, default=730, show_default=True, help="How far back the history goes.")
+@click.option('--seed', 'seed_value', type=int, default=42, show_default=True, help="Random seed, same seed -> same data.")
+@click.option('--now', type=int, default=None, help="Reference timestamp, defaults to the current time.")
+@click.option('--workers', type=int, default=os.cpu_count(), show_default=True, help="Worker processes, 0 loads inline.")
+@click.option('--chunk-size', type=int, default=10_000, show_default=True, help="Rows per INSERT batch.")
+@click.option('--reset', is_flag=True, help="Drop and recreate every table first.")
+@with_appcontext
+def seed_command(subscriptions, users, skew, active_ratio, history_days, seed_value, now, workers, chunk_size, reset):
+    '''Generate a large, skewed dataset of users and subscriptions.'''
+    users = users or max(1, subscriptions // 10)
+    if subscriptions < users:
+        raise click.BadParameter("must be at least --users.", param_hint='--subscriptions')
+
+    engine = db.engine
+    # statement logging would print every batch, and bulk loads are slow queries by design
+    engine.echo = False
+    logging.getLogger('slow_query').setLevel(logging.ERROR)
+
+    step = max(1, subscriptions // 10)
+    reported = [0]
+
+    def progress(loaded, total):
+        if loaded - reported[0] >= step or loaded == total:
+            reported[0] = loaded
+            click.echo(f"  {loaded}/{total} subscriptions")
+
+    result = seed_database(
+        engine, users, subscriptions, skew=skew, active_ratio=active_ratio, history_days=history_days,
+        seed=seed_value, workers=workers, chunk_size=chunk_size, reset=reset, now=now,
+        pragmas=current_app.config.get('SQLITE_PRAGMAS'), progress=progress,
+    )
+    click.echo(f"Seeded {result['users']} users and {result['subscriptions']} subscriptions "
+               f"in {result['seconds']:.1f}s ({result['subscriptions'] / result['seconds']:.0f} rows/s)")
+
+
+@click.command('backfill-current-subscriptions')
+@with_appcontext
+def backfill_current_subscriptions_command():
+    '''Rebuild the current subscription pointers from the subscriptions table.'''
+    with db.engine.begin() as connection:
+        count = backfill_current_subscriptions(connection)
+    click.echo(f"Pointed {count} users at their current subscription")
+
+
+@click.command('rebuild-rollups')
+@click.option('--workers', type=int, default=os.cpu_count(), show_default=True, help="Worker processes, 0 runs inline.")
+@click.option('--chunk-size', type=int, default=None, help="Users per unit of work, defaults to ROLLUP_REBUILD_CHUNK_SIZE.")
+@with_appcontext
+def rebuild_rollups_command(workers, chunk_size):
+    '''Recompute the plan monthly rollups from the subscription history.'''
+    engine = db.engine
+    engine.echo = False
+    result = rebuild_rollups(
+        engine, workers=workers, chunk_size=chunk_size or current_app.config['ROLLUP_REBUILD_CHUNK_SIZE'],
+        pragmas=current_app.config.get('SQLITE_PRAGMAS'),
+    )
+    click.echo(f"Rolled {result['subscriptions']} subscriptions up into {result['rows']} plan months "
+               f"in {result['seconds']:.1f}s")
+
+
+@click.command('expire-subscriptions')
+@click.option('--batch-size', type=int, default=None, help="Rows per transaction, defaults to EXPIRY_SWEEP_BATCH_SIZE.")
+@click.option('--throttle-ms', type=float, default=None, help="Pause between batches, defaults to EXPIRY_SWEEP_THROTTLE_MS.")
+@click.option('--now', type=int, default=None, help="Reference timestamp, defaults to the current time.")
+@with_appcontext
+def expire_subscriptions_command(batch_size, throttle_ms, now):
+    '''Deactivate every subscription whose end date has passed.'''
+    db.engine.echo = False
+    result = expiry_sweeper.sweep(now=now, batch_size=batch_size, throttle=None if throttle_ms is None else throttle_ms / 1000)
+    click.echo(f"Expired {result['rows']} subscriptions in {result['batches']} batches, "
+               f"{result['seconds']:.1f}s ({result['rows_per_second']} rows/s)")
+
+
+@click.command('archive-subscriptions')
+@click.option('--after-days', type=int, default=None, help="Archive subscriptions ended this many days ago, defaults to ARCHIVE_AFTER_DAYS.")
+@click.option('--batch-size', type=int, default=None, help="Rows per transaction, defaults to ARCHIVE_BATCH_SIZE.")
+@click.option('--throttle-ms', type=float, default=None, help="Pause between batches, defaults to ARCHIVE_THROTTLE_MS.")
+@click.option('--now', type=int, default=None, help="Reference timestamp, defaults to the current time.")
+@with_appcontext
+def archive_subscriptions_command(after_days, batch_size, throttle_ms, now):
+    '''Move long ended subscriptions to the archive table.'''
+    db.engine.echo = False
+    result = subscription_archiver.archive(now=now, after_days=after_days, batch_size=batch_size, throttle=None if throttle_ms is None else throttle_ms / 1000)
+    click.echo(f"Archived {result['rows']} subscriptions in {result['batches']} batches, "
+               f"{result['seconds']:.1f}s ({result['rows_per_second']} rows/s)")
+
+
+@click.command('purge-idempotency-keys')
+@click.option('--batch-size', type=int, default=None, help="Rows per transaction, defaults to IDEMPOTENCY_PURGE_BATCH_SIZE.")
+@with_appcontext
+def purge_idempotency_keys_command(batch_size):
+    '''Delete expired idempotency keys and their stored responses.'''
+    db.engine.echo = False
+    result = idempotency_keys.purge(batch_size=batch_size)
+    click.echo(f"Purged {result['rows']} idempotency keys in {result['batches']} batches")
+
+
+@click.command('export-openapi')
+@click.argument('directory', type=click.Path(file_okay=False), default='static')
+@with_appcontext
+def export_openapi_command(directory):
+    '''Write swagger.json and its .gz and .br twins to DIRECTORY, for static hosting.'''
+    for path in openapi_document.export(current_app._get_current_object(), directory):
+        click.echo(f"Wrote {path} ({os.path.getsize(path)} bytes)")
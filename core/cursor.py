@@ -0,0 +1,20 @@
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['JWT_SECRET_KEY'], salt='subscription-history-cursor')
+
+
+def encode_cursor(created_at, id):
+    '''Opaque, signed token for the (created_at, id) keyset position of a row'''
+    return _serializer().dumps([created_at, id])
+
+
+def decode_cursor(token):
+    '''Return (created_at, id) from a token, raise ValueError if it was not issued by us'''
+    try:
+        created_at, id = _serializer().loads(token)
+        return int(created_at), int(id)
+    except (BadSignature, TypeError, ValueError):
+        raise ValueError("Invalid cursor.")
@@ -3,3 +3,20 @@ def validation_error(e):
     '''Return a custom message and 422 status code'''
     return { 'errors': e.messages }, 422
 
+def is_unique_violation(e):
+    '''True when an `IntegrityError` was raised by a unique constraint (SQLite, MySQL, PostgreSQL)'''
+    orig = getattr(e, 'orig', None)
+    if getattr(orig, 'pgcode', None) == '23505':
+        return True
+    if orig is not None and orig.args and orig.args[0] == 1062:  # MySQL ER_DUP_ENTRY
+        return True
+    return 'UNIQUE constraint failed' in str(orig)
+
+def unique_violation_error(message):
+    '''Same shape as the schema level ValidationError the unique check used to raise'''
+    return { 'errors': { '_schema': [message] } }, 422
+
+def hasher_busy_error(e):
+    '''Every password hashing slot is taken, ask the client to retry'''
+    return { 'error': "Server is busy, please retry shortly." }, 503, { 'Retry-After': '1' }
+
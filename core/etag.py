@@ -0,0 +1,17 @@
+from flask import request, Response
+
+
+def etag_headers(tag):
+    '''Strong ETag of a per-user response, revalidated on every use'''
+    return { 'ETag': f'"{tag}"', 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization' }
+
+
+def not_modified(tag, if_none_match=None):
+    '''A 304 response when `If-None-Match` (of the request, or the parsed `if_none_match`) carries `tag`, None otherwise'''
+    # weak comparison (RFC 9110), compressed responses carry the tag as W/"..."
+
+    if if_none_match is None:
+        if_none_match = request.if_none_match
+    if if_none_match.contains_weak(tag):
+        return Response(status=304, headers=etag_headers(tag))
+    return None
@@ -0,0 +1,108 @@
+import logging
+import time
+from sqlalchemy import Integer, bindparam, case, select, update
+from core.jobs import PeriodicJob, keyset_chunks, run_in_batches
+
+logger = logging.getLogger(__name__)
+
+
+def _statements():
+    from models import Subscription, CurrentSubscription
+
+    subscriptions = Subscription.__table__
+    current = CurrentSubscription.__table__
+    now = bindparam('now', type_=Integer)
+
+    # lapsed subscriptions, read from idx_is_active_end_date
+    lapsed = keyset_chunks(
+        select(subscriptions.c.id, subscriptions.c.end_date)
+        .where(subscriptions.c.is_active == True, subscriptions.c.end_date <= now),
+        subscriptions.c.end_date, subscriptions.c.id,
+    )
+    # the predicate is repeated, a subscription upgraded or cancelled since the read is left alone
+    expire = (
+        update(subscriptions)
+        .where(
+            subscriptions.c.id.in_(bindparam('ids', expanding=True)),
+            subscriptions.c.is_active == True,
+            subscriptions.c.end_date <= now,
+        )
+        .values(is_active=False)
+    )
+    # every user with a row in the batch gets a new version: a lapsed row the
+    # pointer does not reference still changes the user's history (ETag)
+    swept = current.c.subscription_id.in_(bindparam('ids', expanding=True))
+    update_pointers = (
+        update(current)
+        .where(current.c.user_id.in_(
+            select(subscriptions.c.user_id).where(subscriptions.c.id.in_(bindparam('ids', expanding=True)))
+        ))
+        .values(
+            subscription_id=case((swept, None), else_=current.c.subscription_id),
+            plan_id=case((swept, None), else_=current.c.plan_id),
+            end_date=case((swept, None), else_=current.c.end_date),
+            version=current.c.version + 1,
+        )
+    )
+    return lapsed, expire, update_pointers
+
+
+def sweep_expired_subscriptions(engine, now=None, batch_size=1000, throttle=0.0, max_batches=None):
+    '''
+    Set `is_active = FALSE` on subscriptions whose `end_date` has passed,
+    clear the current subscription pointers to them and move the version of
+    their users on, in keyset ordered batches (see `run_in_batches`).
+    Returns the batch statistics.
+    '''
+    (first, after), expire, update_pointers = _statements()
+    now = int(now or time.time())
+
+    def apply(connection, ids):
+        expired = connection.execute(expire, { 'ids': ids, 'now': now }).rowcount
+        connection.execute(update_pointers, { 'ids': ids })
+        return expired
+
+    return run_in_batches(engine, first, after, apply, { 'now': now }, batch_size, throttle, max_batches)
+
+
+class ExpirySweeper(PeriodicJob):
+    '''
+    Background expiry of lapsed subscriptions, see `sweep_expired_subscriptions`.
+
+    Runs as `flask expire-subscriptions` (cron, one-off) or, with
+    `EXPIRY_SWEEPER_ENABLED`, as a daemon thread sweeping every
+    `EXPIRY_SWEEP_INTERVAL` seconds. Sweeps are idempotent, several processes
+    running the thread only repeat each other's reads.
+    '''
+    name = 'expiry-sweeper'
+
+    def __init__(self, app=None):
+        self.batch_size = 1000
+        self.throttle = 0.05
+        super().__init__(app)
+
+    def init_app(self, app):
+        self.batch_size = app.config.get('EXPIRY_SWEEP_BATCH_SIZE', self.batch_size)
+        self.throttle = app.config.get('EXPIRY_SWEEP_THROTTLE_MS', self.throttle * 1000) / 1000
+        self.interval = app.config.get('EXPIRY_SWEEP_INTERVAL', self.interval)
+        app.extensions['expiry_sweeper'] = self
+        if app.config.get('EXPIRY_SWEEPER_ENABLED'):
+            self.start(app)
+
+    def sweep(self, now=None, batch_size=None, throttle=None):
+        '''One sweep on the app engine -> sweep statistics'''
+        from core.extensions import db
+
+        result = self.record(sweep_expired_subscriptions(
+            db.engine, now=now,
+            batch_size=batch_size or self.batch_size,
+            throttle=self.throttle if throttle is None else throttle,
+        ))
+        if result['rows']:
+            logger.info("expired %(rows)d subscriptions in %(batches)d batches, %(seconds).2fs (%(rows_per_second)d rows/s)", result)
+        return result
+
+    run_once = sweep
+
+    def stats(self):
+        return { **super().stats(), 'batch_size': self.batch_size, 'throttle_ms': self.throttle * 1000 }
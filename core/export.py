@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+from core.schema.subscription_schema import subscription_serializer
+from core.subscriptions import chunked
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def stream_subscriptions(engine, sql, params, fmt='ndjson', batch_size=1000):
+    '''
+    Yield `sql` results encoded as NDJSON lines or CSV rows, one chunk per batch.
+
+    Rows are read through a server-side cursor (`stream_results`) on a dedicated
+    connection, `batch_size` at a time, so memory stays flat whatever the row count.
+    '''
+    fields = list(subscription_serializer.plan)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator='\n')
+
+    if fmt == 'csv':
+        writer.writeheader()
+
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(sql, params)
+        keys = result.keys()
+        for batch in result.partitions():
+            rows = subscription_serializer.dump_many(batch, keys)
+            if fmt == 'csv':
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(row))
+                    buffer.write('\n')
+
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    # header only export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_active_subscriptions(engine, sql, user_ids, now, chunk_size=1000):
+    '''
+    Yield `{"data": {user_id: subscription | null}}` for every id of `user_ids`,
+    in request order. `sql` resolves a whole chunk of `:user_ids` in one
+    statement, `chunk_size` ids per round trip, and each chunk is written out
+    as soon as it is read.
+    '''
+    yield '{"data":{'
+    with engine.connect() as connection:
+        for position, chunk in enumerate(chunked(user_ids, chunk_size)):
+            result = connection.execute(sql, { 'user_ids': chunk, 'now': now })
+            rows = result.all()
+            active = dict(zip((row.user_id for row in rows), subscription_serializer.dump_many(rows, result.keys())))
+            entries = ",".join(f'"{user_id}":{json.dumps(active.get(user_id))}' for user_id in chunk)
+            yield entries if position == 0 else "," + entries
+    yield '}}'
@@ -1,12 +1,32 @@
-from flask_bcrypt import Bcrypt
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
+from core.cache import ActiveSubscriptionCache
+from core.plan_catalog import PlanCatalog
+from core.hashing import PasswordHasher
+from core.replica import ReadRouter
+from core.sqlite import SQLiteProfile
+from core.instrumentation import QueryInstrumentation
+from core.expiry import ExpirySweeper
+from core.archive import SubscriptionArchiver
+from core.idempotency import IdempotencyKeys
+from core.async_db import AsyncDatabase
+from core.openapi import OpenApiDocument
+from core.representation import ResponseEncoder
 
 # declare flask app packages
 db = SQLAlchemy()
 ma = Marshmallow()
-migrate = Migrate()
-flask_bcrypt = Bcrypt()
+password_hasher = PasswordHasher()
+read_router = ReadRouter()
+sqlite_profile = SQLiteProfile()
+query_instrumentation = QueryInstrumentation()
 jwt = JWTManager()
+subscription_cache = ActiveSubscriptionCache()
+plan_catalog = PlanCatalog()
+expiry_sweeper = ExpirySweeper()
+subscription_archiver = SubscriptionArchiver()
+idempotency_keys = IdempotencyKeys()
+async_db = AsyncDatabase()
+openapi_document = OpenApiDocument()
+response_encoder = ResponseEncoder()
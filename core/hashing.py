@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from flask import current_app
+
+
+class HasherBusy(Exception):
+    '''Raised instead of queueing when every hashing slot is taken'''
+
+
+# Module level so the pool can pickle them
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check_password(password, password_hash):
+    return bcrypt.checkpw(password, password_hash)
+
+
+def hash_rounds(password_hash):
+    '''Cost factor of a bcrypt hash, e.g. 12 for "$2b$12$..."'''
+    return int(password_hash.split('$')[2])
+
+
+class PasswordHasher:
+    '''
+    Runs bcrypt in a bounded process pool so a login spike cannot occupy every
+    request thread.
+
+    * `BCRYPT_LOG_ROUNDS` - work factor of new hashes
+    * `BCRYPT_POOL_SIZE` - worker processes, 0 hashes inline on the request thread
+    * `BCRYPT_QUEUE_DEPTH` - jobs allowed to wait for a worker, beyond that
+      requests fail fast with `HasherBusy`
+
+    The pool is created on first use (and again after a fork), so pre-fork
+    servers do not share it between workers.
+    '''
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = self
+
+    @property
+    def rounds(self):
+        return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+    def _pool(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    pool_size = current_app.config.get('BCRYPT_POOL_SIZE', 0)
+                    queue_depth = current_app.config.get('BCRYPT_QUEUE_DEPTH', pool_size * 4)
+                    # spawn: never fork a threaded server process (held locks, open connections)
+                    context = multiprocessing.get_context('spawn')
+                    self._executor = ProcessPoolExecutor(max_workers=pool_size, mp_context=context) if pool_size else None
+                    self._slots = threading.BoundedSemaphore(pool_size + queue_depth) if pool_size else None
+                    self._pid = os.getpid()
+        return self._executor, self._slots
+
+    def _run(self, fn, *args):
+        executor, slots = self._pool()
+        if executor is None:
+            return fn(*args)
+
+        if not slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            slots.release()
+
+    def generate_password_hash(self, password):
+        return self._run(_hash_password, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def check_password_hash(self, password_hash, password):
+        return self._run(_check_password, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        '''True when the hash was made with a lower cost factor than configured'''
+        return hash_rounds(password_hash) < self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+            self._pid = None
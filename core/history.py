@@ -0,0 +1,74 @@
+from sqlalchemy import text
+from core.archive import subscription_columns, union_all_tables
+from core.cursor import encode_cursor
+from core.schema.subscription_schema import subscription_serializer
+
+
+def legacy_cursor_statement(dialect_name):
+    '''Position of a row given as `last_seen_id`, resolved by primary key in whichever table holds it'''
+    return text(union_all_tables("""
+                SELECT created_at, id
+                FROM {table}
+                WHERE id = :id AND user_id = :user_id
+            """, dialect_name=dialect_name))
+
+
+def history_statement(user_id, per_page, fields, cursor, dialect_name):
+    '''
+    One page of the subscription history of `user_id` -> (sql, params).
+    `fields` is a sparse fieldset or None, `cursor` a (created_at, id) keyset
+    position or None for the first page. One row more than `per_page` is read
+    to know whether there is a next page.
+    '''
+    # Sparse fieldset, (id, created_at) are always read to build the next cursor
+    columns = ", ".join(subscription_columns() if fields is None else dict.fromkeys(["id", "created_at", *fields]))
+
+    params = {
+        "user_id": user_id,
+        "limit": per_page + 1
+    }
+
+    sql = f"""
+            SELECT {columns}
+            FROM {{table}}
+            WHERE user_id = :user_id
+        """
+
+    if cursor:
+        # Fetch records positioned after the cursor in (created_at DESC, id DESC) order
+        sql += """
+            AND created_at <= :cursor_created_at
+            AND (created_at < :cursor_created_at OR id < :cursor_id)
+            """
+        params["cursor_created_at"], params["cursor_id"] = cursor
+
+    # Recent and archived rows, both tables read in index order and merged
+    sql = text(union_all_tables(sql, """
+            ORDER BY created_at DESC, id DESC
+            LIMIT :limit
+        """, dialect_name))
+    return sql, params
+
+
+def history_page(subscriptions, keys, per_page, fields):
+    '''Response body of a page read with `history_statement`'''
+    has_more = len(subscriptions) > per_page
+    subscriptions = subscriptions[:per_page]
+
+    subscriptions_list = subscription_serializer.dump_many(subscriptions, keys, only=fields)
+
+    # Position of the last subscription in the list
+    next_cursor = None
+    next_cursor_id = None
+    if subscriptions:
+        last = subscriptions[-1]
+        next_cursor_id = str(last.id)
+        if has_more:
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+    return {
+        'data': subscriptions_list,
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "next_cursor_id": next_cursor_id
+    }
@@ -0,0 +1,295 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, request, Response
+from flask_jwt_extended import get_jwt_identity
+from flask_restx.utils import unpack
+from sqlalchemy import Integer, String, and_, bindparam, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from core.error_handler import is_unique_violation
+from core.jobs import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint():
+    '''sha256 of the method, path and body, JSON bodies are compared by value'''
+    body = request.get_json(silent=True)
+    payload = request.get_data(as_text=True) if body is None else json.dumps(body, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{request.method} {request.path}\n{payload}".encode()).hexdigest()
+
+
+def idempotent():
+    '''
+    Honour an `Idempotency-Key` header on a write handler, see `IdempotencyKeys`.
+    Goes below `jwt_required()`, keys are scoped to the authenticated user.
+    '''
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return fn(*args, **kwargs)
+            store = current_app.extensions['idempotency_keys']
+            return store.execute(int(get_jwt_identity()), key, lambda: fn(*args, **kwargs))
+        return decorator
+    return wrapper
+
+
+def idempotent_commit(rv):
+    '''
+    Commit `db.session` for an `idempotent()` handler returning `rv`, with the
+    response stored for the request's `Idempotency-Key` in the same
+    transaction: a worker dying after the commit cannot leave the key claimed
+    without a response, for a retry to take over and write again. Returns `rv`.
+    '''
+    from core.extensions import db
+
+    pending = g.pop('idempotency_key', None)
+    if pending is not None:
+        store, params = pending
+        completion = store._completion(params, rv)
+        if completion is not None:
+            db.session.execute(store._statement('complete'), completion)
+        else:
+            g.idempotency_key = pending
+    db.session.commit()
+    return rv
+
+
+def _statements():
+    from models import IdempotencyKey
+
+    table = IdempotencyKey.__table__
+    user_id, key = bindparam('owner_id', type_=Integer), bindparam('idempotency_key', type_=String)
+    by_key = and_(table.c.user_id == user_id, table.c.key == key)
+    now, fingerprint = bindparam('now', type_=Integer), bindparam('request_fingerprint', type_=String)
+    expires_at = bindparam('claim_expires_at', type_=Integer)
+
+    return {
+        'claim': insert(table).values(
+            user_id=user_id, key=key, fingerprint=fingerprint, created_at=now, expires_at=expires_at,
+        ),
+        # an expired key, or an in-flight claim of the same request abandoned by a crashed worker
+        'take_over': update(table).where(by_key, or_(
+            table.c.expires_at <= now,
+            and_(
+                table.c.status_code.is_(None),
+                table.c.created_at <= bindparam('abandoned_before', type_=Integer),
+                table.c.fingerprint == fingerprint,
+            ),
+        )).values(fingerprint=fingerprint, status_code=None, response=None, created_at=now, expires_at=expires_at),
+        'read': select(table.c.fingerprint, table.c.status_code, table.c.response, table.c.created_at, table.c.expires_at).where(by_key),
+        'complete': update(table).where(by_key).values(
+            status_code=bindparam('response_status', type_=Integer), response=bindparam('response_body', type_=String),
+        ),
+        'release': delete(table).where(by_key, table.c.status_code.is_(None)),
+        'expired': select(table.c.user_id, table.c.key).where(table.c.expires_at <= now).limit(bindparam('batch_size', type_=Integer)),
+        'purge': delete(table).where(by_key),
+    }
+
+
+class IdempotencyKeys(PeriodicJob):
+    '''
+    Idempotency keys for subscription writes, stored in `idempotency_keys`.
+
+    * The first request with a key claims it with one INSERT, runs the handler
+      and stores the status code and serialized response. Handlers that write
+      commit through `idempotent_commit(rv)`, which stores it in their own transaction.
+    * A retry with the same key and the same request (fingerprint) gets the
+      stored response back, read by primary key, without running the handler.
+    * A retry while the first request is still running waits for it, up to
+      `IDEMPOTENCY_WAIT_SECONDS` (on an in-process event when the claim is held
+      by this process, polling otherwise), then replays, or answers 409.
+    * The same key with a different request is a 422.
+    * 5xx responses and exceptions release the claim, the retry runs again.
+
+    Keys live `IDEMPOTENCY_TTL` seconds. Expired rows are replaced on reuse and
+    deleted by `flask purge-idempotency-keys` or, with
+    `IDEMPOTENCY_PURGER_ENABLED`, by a daemon thread.
+    '''
+    name = 'idempotency-purger'
+
+    def __init__(self, app=None):
+        self.ttl = 24 * 3600
+        self.wait = 10
+        self.lock_seconds = 30
+        self.poll = 0.05
+        self.batch_size = 1000
+        self._statements = None
+        self._inflight = {}  # (user_id, key) -> Event, set when this process completes or releases the claim
+        self._inflight_lock = threading.Lock()
+        self.counters = { 'executed': 0, 'replayed': 0, 'waited': 0, 'conflicts': 0, 'mismatches': 0 }
+        super().__init__(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('IDEMPOTENCY_TTL', self.ttl)
+        self.wait = app.config.get('IDEMPOTENCY_WAIT_SECONDS', self.wait)
+        self.lock_seconds = app.config.get('IDEMPOTENCY_LOCK_SECONDS', self.lock_seconds)
+        self.batch_size = app.config.get('IDEMPOTENCY_PURGE_BATCH_SIZE', self.batch_size)
+        self.interval = app.config.get('IDEMPOTENCY_PURGE_INTERVAL', self.interval)
+        app.extensions['idempotency_keys'] = self
+        if app.config.get('IDEMPOTENCY_PURGER_ENABLED'):
+            self.start(app)
+
+    def _statement(self, name):
+        if self._statements is None:
+            self._statements = _statements()
+        return self._statements[name]
+
+    def _execute(self, name, params):
+        from core.extensions import db
+
+        # own short transaction: the claim is visible to duplicates at once, and
+        # a rollback of the handler's session does not undo it
+        with db.engine.begin() as connection:
+            return connection.execute(self._statement(name), params)
+
+    def _completion(self, params, rv):
+        '''`complete` parameters storing the handler's `rv`, None when it is not replayed'''
+        if isinstance(rv, Response):
+            return None
+        data, status, _ = unpack(rv)
+        if status >= 500:
+            return None
+        return { **params, 'response_status': status, 'response_body': json.dumps(data, separators=(',', ':')) }
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def execute(self, user_id, key, handler):
+        '''Run `handler` once per (user, key) and request, replay its response otherwise'''
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return { 'errors': { HEADER: [f"Length must be between 1 and {MAX_KEY_LENGTH}."] } }, 422
+
+        fingerprint = request_fingerprint()
+        params = { 'owner_id': user_id, 'idempotency_key': key, 'request_fingerprint': fingerprint }
+        deadline = time.monotonic() + self.wait
+        waited = False
+
+        if self._claim(params):
+            return self._run(params, handler)
+
+        while True:
+            now = int(time.time())
+            row = self._execute('read', params).first()
+
+            if row is None or row.expires_at <= now or (
+                    row.status_code is None and row.created_at <= now - self.lock_seconds and row.fingerprint == fingerprint):
+                # released, expired or abandoned: this request takes the key
+                if self._claim(params) if row is None else self._take_over(params):
+                    return self._run(params, handler)
+                continue
+
+            if row.fingerprint != fingerprint:
+                self._count('mismatches')
+                return { 'errors': { HEADER: ["Already used with a different request."] } }, 422
+
+            if row.status_code is not None:
+                self._count('replayed')
+                return json.loads(row.response), row.status_code, { 'Idempotent-Replayed': 'true' }
+
+            # the first request is still running
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count('conflicts')
+                return { 'error': f"A request with this {HEADER} is still in progress." }, 409, { 'Retry-After': '1' }
+            if not waited:
+                waited = True
+                self._count('waited')
+            event = self._inflight.get((user_id, key))
+            if event is not None:
+                event.wait(remaining)
+            else:
+                time.sleep(min(self.poll, remaining))
+
+    def _claim(self, params):
+        now = int(time.time())
+        try:
+            self._execute('claim', { **params, 'now': now, 'claim_expires_at': now + self.ttl })
+        except IntegrityError as err:
+            if not is_unique_violation(err):
+                raise
+            return False
+        return True
+
+    def _take_over(self, params):
+        now = int(time.time())
+        return self._execute('take_over', {
+            **params, 'now': now, 'claim_expires_at': now + self.ttl, 'abandoned_before': now - self.lock_seconds,
+        }).rowcount == 1
+
+    def _run(self, params, handler):
+        inflight = (params['owner_id'], params['idempotency_key'])
+        event = threading.Event()
+        with self._inflight_lock:
+            self._inflight[inflight] = event
+        g.idempotency_key = (self, params)
+        try:
+            try:
+                rv = handler()
+            except BaseException:
+                # no-op once `idempotent_commit` stored the response
+                self._execute('release', params)
+                raise
+
+            # still pending: the handler did not write through `idempotent_commit`
+            if g.pop('idempotency_key', None) is not None:
+                completion = self._completion(params, rv)
+                if completion is not None:
+                    self._execute('complete', completion)
+                else:
+                    self._execute('release', params)
+                    if isinstance(rv, Response):
+                        return rv
+            self._count('executed')
+            return rv
+        finally:
+            g.pop('idempotency_key', None)
+            with self._inflight_lock:
+                self._inflight.pop(inflight, None)
+            event.set()
+
+    def purge(self, now=None, batch_size=None):
+        '''Delete expired keys, `batch_size` per transaction -> `{rows, batches, seconds, rows_per_second}`'''
+        from core.extensions import db
+
+        now = int(now or time.time())
+        batch_size = batch_size or self.batch_size
+        started = time.perf_counter()
+        rows = batches = 0
+        while True:
+            with db.engine.begin() as connection:
+                expired = connection.execute(self._statement('expired'), { 'now': now, 'batch_size': batch_size }).all()
+                if expired:
+                    connection.execute(self._statement('purge'), [{ 'owner_id': user_id, 'idempotency_key': key } for user_id, key in expired])
+            if not expired:
+                break
+            rows += len(expired)
+            batches += 1
+            if len(expired) < batch_size:
+                break
+
+        seconds = time.perf_counter() - started
+        result = self.record({
+            'rows': rows, 'batches': batches, 'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds) if seconds else 0,
+        })
+        if rows:
+            logger.info("purged %(rows)d idempotency keys in %(batches)d batches", result)
+        return result
+
+    run_once = purge
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(self.counters)
+        return { **stats, 'ttl': self.ttl, 'wait_seconds': self.wait, 'in_flight': len(self._inflight) }
@@ -0,0 +1,155 @@
+import json
+import logging
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('slow_query')
+
+# EXPLAIN prefix per dialect, the statement is planned but not executed
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'mysql': 'EXPLAIN ',
+    'mariadb': 'EXPLAIN ',
+    'postgresql': 'EXPLAIN ',
+}
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+class RequestQueryStats:
+    __slots__ = ('count', 'total', 'slowest', 'slowest_statement', 'started_at')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.started_at = time.perf_counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = statement
+
+    def server_timing(self):
+        total = (time.perf_counter() - self.started_at) * 1000
+        return (
+            f'db;dur={self.total * 1000:.3f};desc="{self.count} queries", '
+            f'db-slowest;dur={self.slowest * 1000:.3f}, '
+            f'app;dur={total:.3f}'
+        )
+
+
+class QueryInstrumentation:
+    '''
+    SQL accounting built on SQLAlchemy engine events.
+
+    * per request: query count, total DB time and slowest statement, sent back
+      in a `Server-Timing` header (`SERVER_TIMING`)
+    * statements slower than `SLOW_QUERY_THRESHOLD_MS` are written to the
+      `slow_query` logger as one JSON object, with the `EXPLAIN` output of the
+      active dialect (`SLOW_QUERY_EXPLAIN`)
+
+    Call after `db.init_app`.
+    '''
+
+    def __init__(self, app=None):
+        self.server_timing = True
+        self.slow_query_threshold_ms = 100
+        self.explain = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from core.extensions import db
+
+        self.server_timing = app.config.get('SERVER_TIMING', self.server_timing)
+        self.slow_query_threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS', self.slow_query_threshold_ms)
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', self.explain)
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            self.instrument(engine)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.extensions['query_instrumentation'] = self
+
+    def instrument(self, engine):
+        '''Hook a (sync) engine, for engines created after `init_app`'''
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _start_request(self):
+        g.query_stats = RequestQueryStats()
+
+    def _finish_request(self, response):
+        stats = g.pop('query_stats', None)
+        if stats is not None:
+            if self.server_timing:
+                response.headers['Server-Timing'] = stats.server_timing()
+            if stats.slowest_statement is not None:
+                logger.debug("%s %s: %d queries, %.3f ms, slowest %.3f ms: %s", request.method, request.path,
+                             stats.count, stats.total * 1000, stats.slowest * 1000, stats.slowest_statement)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started_at'].pop()
+
+        if has_request_context():
+            stats = g.get('query_stats')
+            if stats is not None:
+                stats.record(statement, elapsed)
+
+        if elapsed * 1000 >= self.slow_query_threshold_ms:
+            self._log_slow_query(conn, statement, parameters, context, executemany, elapsed)
+
+    def _handle_error(self, exception_context):
+        # The failed statement never reaches after_cursor_execute, it still was a round trip
+        conn = exception_context.connection
+        if conn is None or not conn.info.get('query_started_at'):
+            return
+        elapsed = time.perf_counter() - conn.info['query_started_at'].pop()
+        if has_request_context():
+            stats = g.get('query_stats')
+            if stats is not None:
+                stats.record(exception_context.statement, elapsed)
+
+    def _log_slow_query(self, conn, statement, parameters, context, executemany, elapsed):
+        dialect = conn.dialect.name
+        record = {
+            'duration_ms': round(elapsed * 1000, 3),
+            'dialect': dialect,
+            'statement': ' '.join(statement.split()),
+        }
+        if has_request_context():
+            record['endpoint'] = f"{request.method} {request.path}"
+
+        streaming = context is not None and context.execution_options.get('stream_results')
+        if self.explain and not executemany and not streaming:
+            record['plan'] = self._explain(conn, statement, parameters)
+
+        slow_query_logger.warning(json.dumps(record, default=str))
+
+    def _explain(self, conn, statement, parameters):
+        prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+        if prefix is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return None
+        # Raw DBAPI cursor: the statement is already compiled for this driver, and
+        # going around SQLAlchemy keeps EXPLAIN out of the events and the stats
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [' | '.join(str(value) for value in row) for row in cursor.fetchall()]
+        except Exception as err:
+            return [f"EXPLAIN failed: {err}"]
+        finally:
+            cursor.close()
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from sqlalchemy import Integer, and_, bindparam, or_
+
+logger = logging.getLogger(__name__)
+
+
+def run_in_batches(engine, first, after, apply, params, batch_size=1000, throttle=0.0, max_batches=None):
+    '''
+    Walk the rows selected by `first` in `(end_date, id)` keyset order,
+    `batch_size` at a time, and call `apply(connection, ids) -> rows changed`
+    on each chunk. `after` is `first` restricted to rows past the
+    `last_end`/`last_id` cursor. Every batch is its own short transaction so
+    locks are held for one chunk only, `throttle` seconds are slept between
+    batches to leave room for request traffic.
+    Returns `{rows, batches, seconds, rows_per_second, longest_batch_ms}`.
+    '''
+    started = time.perf_counter()
+    rows = batches = 0
+    longest = 0.0
+    cursor = None
+
+    while max_batches is None or batches < max_batches:
+        if batches and throttle:
+            time.sleep(throttle)
+
+        batch_started = time.perf_counter()
+        with engine.begin() as connection:
+            values = { **params, 'batch_size': batch_size }
+            if cursor is None:
+                chunk = connection.execute(first, values).all()
+            else:
+                chunk = connection.execute(after, { **values, 'last_end': cursor[0], 'last_id': cursor[1] }).all()
+            if not chunk:
+                break
+            rows += apply(connection, [row.id for row in chunk])
+
+        longest = max(longest, time.perf_counter() - batch_started)
+        batches += 1
+        cursor = (chunk[-1].end_date, chunk[-1].id)
+        if len(chunk) < batch_size:
+            break
+
+    seconds = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'batches': batches,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else 0,
+        'longest_batch_ms': round(longest * 1000, 3),  # the longest a transaction held its locks
+    }
+
+
+def keyset_chunks(query, end_date, id):
+    '''`query` limited to `:batch_size` rows in (end_date, id) order -> (first chunk, chunk after the cursor)'''
+    first = query.order_by(end_date, id).limit(bindparam('batch_size', type_=Integer))
+    last_end, last_id = bindparam('last_end', type_=Integer), bindparam('last_id', type_=Integer)
+    after = first.where(or_(end_date > last_end, and_(end_date == last_end, id > last_id)))
+    return first, after
+
+
+class PeriodicJob:
+    '''
+    Base of the in-process background jobs: a daemon thread that calls
+    `run_once` inside an app context every `interval` seconds, and keeps the
+    result of the last run plus running totals for the metrics endpoints.
+
+    Subclasses implement `run_once() -> { rows, ... }` and call `record` with
+    the result of every run, scheduled or not.
+    '''
+    name = 'periodic-job'
+
+    def __init__(self, app=None):
+        self.interval = 60
+        self.last_run = None
+        self.totals = { 'runs': 0, 'rows': 0, 'errors': 0 }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def record(self, result):
+        with self._lock:
+            self.last_run = { **result, 'finished_at': int(time.time()) }
+            self.totals['runs'] += 1
+            self.totals['rows'] += result['rows']
+        return result
+
+    def start(self, app):
+        '''Start the job thread, a no-op when it already runs'''
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(app,), name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, app):
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    self.run_once()
+            except Exception:
+                with self._lock:
+                    self.totals['errors'] += 1
+                logger.exception("%s failed", self.name)
+            self._stop.wait(self.interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'interval': self.interval,
+                'last_run': self.last_run,
+                **self.totals,
+            }
@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+import brotli
+from flask import current_app, request, Response
+
+# Served encodings, in order of preference when the client accepts several equally
+ENCODINGS = ('br', 'gzip', 'identity')
+
+# The document once generated: body and ETag per encoding
+OpenApiBundle = namedtuple('OpenApiBundle', ['bodies', 'tags'])
+
+
+def encode(body):
+    '''Every representation of `body` -> {encoding: bytes}, compressed once at the highest levels'''
+    return {
+        'br': brotli.compress(body, quality=11, mode=brotli.MODE_TEXT),
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),  # no timestamp, same bytes on every build
+        'identity': body,
+    }
+
+
+class OpenApiDocument:
+    '''
+    The OpenAPI (Swagger) document of the API, generated once and served from memory.
+
+    flask-restx builds the spec by introspecting every namespace, and serializes
+    it on each `swagger.json` request. This extension takes over that route. The
+    spec is generated on first use, or by the warm-up before workers fork. It is
+    held as identity, gzip and brotli bytes, each with a content hash ETag. A
+    request then costs an `Accept-Encoding` choice and an `If-None-Match` check.
+
+    `flask export-openapi DIR` writes the same files for static hosting.
+    '''
+
+    def __init__(self, app=None):
+        self.api = None
+        self._bundle = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from apis import api
+
+        self.api = api
+        # the `specs` endpoint of flask-restx, `swagger.json` under the api prefix
+        app.view_functions[api.endpoint('specs')] = self.view
+        app.extensions['openapi_document'] = self
+
+    def generate(self, app):
+        '''Introspect the namespaces -> the spec as JSON bytes'''
+        with app.test_request_context():
+            schema = self.api.__schema__
+        if 'error' in schema:
+            raise RuntimeError(schema['error'])
+        return json.dumps(schema, separators=(',', ':')).encode()
+
+    def bundle(self, app):
+        '''Return the encoded document, generating it on first use'''
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                bundle = self._bundle
+                if bundle is None:
+                    bodies = encode(self.generate(app))
+                    digest = hashlib.sha256(bodies['identity']).hexdigest()[:32]
+                    # one strong ETag per representation, they differ byte for byte
+                    tags = { encoding: digest if encoding == 'identity' else f"{digest}-{encoding}" for encoding in bodies }
+                    bundle = self._bundle = OpenApiBundle(bodies, tags)
+        return bundle
+
+    def view(self):
+        bundle = self.bundle(current_app._get_current_object())
+        encoding = request.accept_encodings.best_match(ENCODINGS, default='identity')
+        tag = bundle.tags[encoding]
+
+        headers = { 'ETag': f'"{tag}"', 'Cache-Control': 'public, no-cache', 'Vary': 'Accept-Encoding' }
+        if request.if_none_match.contains(tag):
+            return Response(status=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(bundle.bodies[encoding], mimetype='application/json', headers=headers)
+
+    def export(self, app, directory, filename='swagger.json'):
+        '''Write the document and its precompressed twins (`.gz`, `.br`) to `directory` -> paths'''
+        bodies = self.bundle(app).bodies
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for encoding, suffix in (('identity', ''), ('gzip', '.gz'), ('br', '.br')):
+            path = os.path.join(directory, filename + suffix)
+            with open(path, 'wb') as file:
+                file.write(bodies[encoding])
+            paths.append(path)
+        return paths
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from core.upsert import upsert
+
+# Immutable, slotted view of a plan row, `features` is a sorted tuple of names
+PlanRecord = namedtuple('PlanRecord', ['id', 'name', 'price', 'created_at', 'features'])
+
+# plans -> read-only { plan_id: PlanRecord }, body -> `GET /api/plans` response encoded once,
+# feature_bits -> { feature: bit }, entitlements -> { plan_id: bitset of the plan's features },
+# catalog_version -> `plan_catalog_version` the plans were read at
+PlanSnapshot = namedtuple('PlanSnapshot', ['version', 'plans', 'body', 'loaded_at', 'feature_bits', 'entitlements', 'catalog_version'])
+
+CATALOG_VERSION_ID = 1
+
+
+def read_catalog_version():
+    '''Shared catalog version, a primary key read of `plan_catalog_version`'''
+    from models import PlanCatalogVersion
+    from core.extensions import db
+
+    return db.session.execute(
+        db.select(PlanCatalogVersion.version).where(PlanCatalogVersion.id == CATALOG_VERSION_ID)
+    ).scalar() or 0
+
+
+def bump_catalog_version(connection, dialect_name):
+    '''Move the shared catalog version on, in the transaction of `connection` (a Connection or session) writing plans'''
+    from models import PlanCatalogVersion
+
+    stmt = upsert(PlanCatalogVersion.__table__, ('id',), (), dialect_name, ('version',))
+    connection.execute(stmt, { 'id': CATALOG_VERSION_ID, 'version': 1 })
+
+
+def compile_entitlements(plans):
+    '''One bit per feature name across `plans` -> ({ feature: bit }, { plan_id: bitset })'''
+    names = sorted({feature for plan in plans for feature in plan.features})
+    feature_bits = {name: 1 << position for position, name in enumerate(names)}
+    entitlements = {}
+    for plan in plans:
+        bitset = 0
+        for feature in plan.features:
+            bitset |= feature_bits[feature]
+        entitlements[plan.id] = bitset
+    return feature_bits, entitlements
+
+
+class PlanCatalog:
+    '''
+    Versioned in-process snapshot of the (tiny, rarely changing) plan catalog.
+
+    Readers grab the current snapshot without locking, a rebuild publishes a
+    new snapshot object instead of mutating the old one.
+
+    Plan writes bump `plan_catalog_version` in their transaction. Readers
+    compare it with the snapshot's at most every `PLAN_CATALOG_CHECK_SECONDS`,
+    so a plan or feature change made by another worker is served within that
+    interval instead of `PLAN_CATALOG_TTL`.
+    '''
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self.check_interval = 1.0
+        self._checked_at = 0.0  # monotonic time of the last version check
+        self._snapshot = None
+        self._version = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PLAN_CATALOG_TTL', self.ttl)
+        self.check_interval = app.config.get('PLAN_CATALOG_CHECK_SECONDS', self.check_interval)
+        app.extensions['plan_catalog'] = self
+
+    def snapshot(self):
+        '''
+        Return the current snapshot, loading it on first use, once it is older
+        than the ttl, or when the shared catalog version moved on
+        '''
+        snapshot = self._snapshot
+        if snapshot is None or time.time() - snapshot.loaded_at > self.ttl:
+            return self.rebuild(stale=snapshot)
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if read_catalog_version() != snapshot.catalog_version:
+                return self.rebuild(stale=snapshot)
+        return snapshot
+
+    def rebuild(self, stale=None):
+        '''Load every plan and publish a new snapshot'''
+        # imported here to avoid a circular import (models -> core.extensions)
+        from models import Plan
+        from core.extensions import db
+        from core.schema.plan_schema import PlanSchema
+
+        with self._lock:
+            # Another thread already replaced the snapshot we found stale
+            if stale is not None and self._snapshot is not stale:
+                return self._snapshot
+
+            # read first, a write landing in between only causes one more reload
+            catalog_version = read_catalog_version()
+            rows = db.session.execute(
+                db.select(Plan.id, Plan.name, Plan.price, Plan.created_at, Plan.features).order_by(Plan.id)
+            ).all()
+            plans = [PlanRecord(*row[:4], features=tuple(sorted(set(row.features or ())))) for row in rows]
+            feature_bits, entitlements = compile_entitlements(plans)
+
+            planSchema = PlanSchema(many=True)
+            body = (json.dumps(planSchema.dump(plans)) + "\n").encode('utf-8')
+
+            self._version += 1
+            self._snapshot = PlanSnapshot(
+                version=self._version,
+                plans=MappingProxyType({plan.id: plan for plan in plans}),
+                body=body,
+                loaded_at=time.time(),
+                feature_bits=MappingProxyType(feature_bits),
+                entitlements=MappingProxyType(entitlements),
+                catalog_version=catalog_version,
+            )
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def get(self, plan_id):
+        '''
+        Return the `PlanRecord` for `plan_id` or None. A miss does not reload:
+        clients pick the plan id, and a plan created by another worker arrives
+        with the version check, at most `check_interval` seconds later.
+        '''
+        try:
+            plan_id = int(plan_id)
+        except (TypeError, ValueError):
+            return None
+
+        return self.snapshot().plans.get(plan_id)
+
+    def entitled(self, plan_id, feature):
+        '''
+        Whether `plan_id` grants `feature`: two dict reads and a bitwise AND on
+        the snapshot. An unknown plan grants nothing, misses do not reload (see `get`).
+        '''
+        snapshot = self.snapshot()
+        return bool(snapshot.entitlements.get(plan_id, 0) & snapshot.feature_bits.get(feature, 0))
+
+    def invalidate(self):
+        self._snapshot = None
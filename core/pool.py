@@ -0,0 +1,50 @@
+import time
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    '''QueuePool that records how long checkouts wait for a free connection'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_total += waited
+            if waited > self.wait_max:
+                self.wait_max = waited
+
+
+def pool_stats(engine):
+    '''Live statistics of an engine's connection pool'''
+    pool = engine.pool
+    stats = { 'pool': type(pool).__name__ }
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, TimedQueuePool):
+        stats.update(
+            checkouts=pool.wait_count,
+            wait_avg_ms=round(pool.wait_total / pool.wait_count * 1000, 3) if pool.wait_count else 0.0,
+            wait_max_ms=round(pool.wait_max * 1000, 3),
+            timeouts=pool.timeouts,
+        )
+    return stats
@@ -0,0 +1,106 @@
+import threading
+import time
+from flask import g, has_request_context, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from werkzeug.http import parse_cookie
+from core.pool import pool_stats
+
+# Cookie, and header for clients without a cookie jar, carrying the signed
+# (user_id, deadline) of the last write
+READ_YOUR_WRITES = 'Read-Your-Writes'
+
+
+class ReadRouter:
+    '''
+    Routes read queries to the `replica` bind (`SQLALCHEMY_BINDS`) when one is
+    configured.
+
+    Reads stay on the primary for `REPLICA_STICKY_SECONDS` after a user's own
+    write (read-your-writes), so replication lag never hides a subscription
+    the user just created, upgraded or cancelled. The deadline is kept in
+    process, and sent back to the client as a signed `Read-Your-Writes`
+    cookie and response header. The read path honours either one, so a read
+    served by another worker or host is routed the same way. Bulk
+    provisioning sticks many users, only the worker that wrote them knows.
+    '''
+
+    def __init__(self, app=None):
+        self.sticky_seconds = 5
+        self._sticky = {}  # user_id -> monotonic deadline
+        self._lock = threading.Lock()
+        self._signer = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', self.sticky_seconds)
+        secret = app.config.get('JWT_SECRET_KEY') or app.secret_key
+        self._signer = URLSafeSerializer(secret, salt='read-your-writes') if secret else None
+        app.after_request(self.after_request)
+        app.extensions['read_router'] = self
+
+    def stick(self, user_id):
+        '''Pin reads of `user_id` to the primary, call after committing a write'''
+        now = time.monotonic()
+        with self._lock:
+            self._sticky[user_id] = now + self.sticky_seconds
+            # Forget expired users once the map grows
+            if len(self._sticky) > 10000:
+                self._sticky = { key: deadline for key, deadline in self._sticky.items() if deadline > now }
+        if has_request_context():
+            g.setdefault('read_your_writes', set()).add(user_id)
+
+    def is_sticky(self, user_id, token=None):
+        '''Whether reads of `user_id` go to the primary, `token` is the client's `Read-Your-Writes` value'''
+        deadline = self._sticky.get(user_id)
+        if deadline is not None and deadline > time.monotonic():
+            return True
+        if token is None or self._signer is None:
+            return False
+        try:
+            signed_user_id, until = self._signer.loads(token)
+        except (BadSignature, TypeError, ValueError):
+            return False
+        return signed_user_id == user_id and until > time.time()
+
+    def token(self, headers=None):
+        '''`Read-Your-Writes` value of the current request, or of ASGI `headers`'''
+        if headers is None:
+            if not has_request_context():
+                return None
+            headers, cookies = request.headers, request.cookies
+        else:
+            cookies = parse_cookie(headers.get('Cookie', ''))
+        return headers.get(READ_YOUR_WRITES) or cookies.get(READ_YOUR_WRITES)
+
+    def after_request(self, response):
+        stuck = g.get('read_your_writes')
+        # one user is the writer's own subscription, bulk writes are not tied to the client
+        if stuck and len(stuck) == 1 and self._signer is not None:
+            user_id, = stuck
+            token = self._signer.dumps([user_id, int(time.time()) + self.sticky_seconds])
+            response.headers[READ_YOUR_WRITES] = token
+            response.set_cookie(READ_YOUR_WRITES, token, max_age=self.sticky_seconds, path='/api', httponly=True, samesite='Lax')
+        return response
+
+    def engine_for(self, user_id=None):
+        '''Engine to read `user_id` data from'''
+        from core.extensions import db
+
+        replica = db.engines.get('replica')
+        if replica is None or (user_id is not None and self.is_sticky(user_id, self.token())):
+            return db.engine
+        return replica
+
+    def bind_arguments(self, user_id=None):
+        '''`bind_arguments` for `db.session.execute` of a read query'''
+        return { 'bind': self.engine_for(user_id) }
+
+    def clear(self):
+        with self._lock:
+            self._sticky.clear()
+
+    def stats(self):
+        from core.extensions import db
+
+        return { key or 'primary': pool_stats(engine) for key, engine in db.engines.items() }
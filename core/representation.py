@@ -0,0 +1,106 @@
+import gzip
+import json
+import brotli
+from flask import current_app, request
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used without it
+    orjson = None
+
+# Response bodies worth compressing
+COMPRESSIBLE = ('application/json', 'text/csv', 'text/html', 'text/plain')
+
+# Content codings, in order of preference when the client accepts several equally
+COMPRESSORS = {
+    'br': lambda body, level: brotli.compress(body, quality=level),
+    'gzip': lambda body, level: gzip.compress(body, compresslevel=level, mtime=0),
+}
+
+
+def stdlib_dumps(data):
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def orjson_dumps(data):
+    # int keys become strings, as with the stdlib encoder
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_backend(name='auto'):
+    '''`dumps(data) -> bytes` of `name`: orjson, json (stdlib), or auto (orjson when installed)'''
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson':
+        if orjson is None:
+            raise ValueError("JSON_BACKEND is 'orjson' but orjson is not installed")
+        return orjson_dumps
+    if name == 'json':
+        return stdlib_dumps
+    raise ValueError(f"Unknown JSON_BACKEND '{name}'")
+
+
+class ResponseEncoder:
+    '''
+    Representation layer of the API responses.
+
+    * JSON - the `application/json` representation of the flask-restx `Api`
+      encodes with `JSON_BACKEND`. The default is orjson when it is installed,
+      several times faster than the stdlib encoder on history pages.
+    * Compression - bodies of at least `COMPRESS_MIN_SIZE` bytes are sent with
+      brotli or gzip, whichever `Accept-Encoding` prefers (brotli on a tie).
+      Brotli uses a low quality, made for per request compression. Streamed
+      responses and responses that are already encoded are left alone.
+      Compressed responses carry `Vary: Accept-Encoding`, and their ETag is
+      weakened; `not_modified` compares weakly, so revalidation still works.
+    '''
+
+    def __init__(self, app=None):
+        self.dumps = stdlib_dumps
+        self.min_size = 1024
+        self.levels = { 'br': 4, 'gzip': 6 }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from apis import api
+
+        self.dumps = json_backend(app.config.get('JSON_BACKEND', 'auto'))
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.levels = {
+            'br': app.config.get('COMPRESS_BROTLI_QUALITY', self.levels['br']),
+            'gzip': app.config.get('COMPRESS_GZIP_LEVEL', self.levels['gzip']),
+        }
+        api.representations['application/json'] = self.output_json
+        app.after_request(self.after_request)
+        app.extensions['response_encoder'] = self
+
+    def output_json(self, data, code, headers=None):
+        '''flask-restx representation: `data` encoded as a JSON response'''
+        return current_app.response_class(self.dumps(data) + b"\n", code, headers, mimetype='application/json')
+
+    def compress(self, response, accept_encodings):
+        '''Compress `response` in place for a client sending `accept_encodings` (a werkzeug `Accept`)'''
+        if (
+            response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE
+            or response.calculate_content_length() < self.min_size
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = accept_encodings.best_match(COMPRESSORS)
+        if encoding is None:
+            return response
+
+        response.set_data(COMPRESSORS[encoding](response.get_data(), self.levels[encoding]))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def after_request(self, response):
+        return self.compress(response, request.accept_encodings)
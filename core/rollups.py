@@ -0,0 +1,198 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from sqlalchemy import Numeric, create_engine, delete, func, insert, select, text
+from core.sqlite import apply_sqlite_pragmas
+from core.upsert import upsert
+
+COUNTERS = ('new_subscriptions', 'upgrades_in', 'upgrades_out', 'cancellations')
+METRICS = COUNTERS + ('mrr',)
+
+# Everything the classification needs, per user in creation order
+HISTORY_SQL = "SELECT user_id, plan_id, price, start_date, end_date, is_active, created_at, id FROM {table} WHERE user_id BETWEEN :first AND :last"
+HISTORY_ORDER = "ORDER BY user_id, created_at, id"
+
+
+def month_of(timestamp):
+    '''`YYYY-MM` of a unix timestamp, in UTC'''
+    # gmtime is several times faster than a datetime, the rebuild calls this per row
+    return "%04d-%02d" % time.gmtime(timestamp)[:2]
+
+
+def shift_month(month, months):
+    '''`YYYY-MM` month `months` months after (before, when negative) `month`'''
+    year, number = map(int, month.split('-'))
+    year, index = divmod(year * 12 + number - 1 + months, 12)
+    return f"{year:04d}-{index + 1:02d}"
+
+
+def month_range(first, last):
+    '''Every `YYYY-MM` month from `first` to `last`, both included'''
+    months = []
+    while first <= last:
+        months.append(first)
+        first = shift_month(first, 1)
+    return months
+
+
+def empty_rollup():
+    return { **dict.fromkeys(COUNTERS, 0), 'mrr': Decimal(0) }
+
+
+def add_event(rollups, plan_id, month, metrics):
+    '''Add `metrics` ({metric: amount}) to the `(plan_id, month)` entry of the `rollups` dict'''
+    values = rollups.get((plan_id, month))
+    if values is None:
+        values = rollups[(plan_id, month)] = empty_rollup()
+    for metric, amount in metrics.items():
+        values[metric] += amount
+
+
+def merge_rollups(rollups, other):
+    for (plan_id, month), values in other.items():
+        add_event(rollups, plan_id, month, values)
+    return rollups
+
+
+def rollup_rows(rollups):
+    '''Table rows of a `rollups` dict, in primary key order'''
+    return [{ 'plan_id': plan_id, 'month': month, **values } for (plan_id, month), values in sorted(rollups.items())]
+
+
+def record_events(events):
+    '''
+    Add `(plan_id, timestamp, {metric: amount})` events to the rollups of
+    their plan and month with one upsert, in the caller's transaction. Rows
+    are written in primary key order, so concurrent writers lock them in the
+    same order.
+    '''
+    from core.extensions import db
+    from models import PlanMonthlyRollup
+
+    rollups = {}
+    for plan_id, timestamp, metrics in events:
+        add_event(rollups, int(plan_id), month_of(timestamp), metrics)
+    if rollups:
+        stmt = upsert(PlanMonthlyRollup.__table__, ('plan_id', 'month'), (), db.session.get_bind().dialect.name, add_columns=METRICS)
+        db.session.execute(stmt, rollup_rows(rollups))
+
+
+def history_rollups(rows, period, rollups=None):
+    '''
+    Rollups of subscription `rows` ordered by (user_id, created_at, id), the
+    same events the write paths record:
+
+    * a subscription ended early (inactive, before `period` was over) and
+      followed, the same second, by one on another plan was upgraded: out of
+      its plan, into the next one, in the month of the switch
+    * any other subscription is new in the month it starts
+    * a subscription ended early and not upgraded was cancelled in the month
+      it ended
+
+    Expiry ends nothing early, so expired subscriptions count as neither.
+    '''
+    rollups = {} if rollups is None else rollups
+
+    def ended_early(row):
+        return not row.is_active and row.end_date < row.start_date + period
+
+    def close(row):
+        if ended_early(row):
+            add_event(rollups, row.plan_id, month_of(row.end_date), { 'cancellations': 1 })
+
+    previous = None
+    for row in rows:
+        if previous is not None and previous.user_id != row.user_id:
+            close(previous)
+            previous = None
+
+        if (
+            previous is not None and ended_early(previous)
+            and previous.end_date == row.start_date and previous.plan_id != row.plan_id
+        ):
+            month = month_of(row.start_date)
+            add_event(rollups, previous.plan_id, month, { 'upgrades_out': 1 })
+            add_event(rollups, row.plan_id, month, { 'upgrades_in': 1, 'mrr': row.price })
+        else:
+            if previous is not None:
+                close(previous)
+            add_event(rollups, row.plan_id, month_of(row.start_date), { 'new_subscriptions': 1, 'mrr': row.price })
+        previous = row
+
+    if previous is not None:
+        close(previous)
+    return rollups
+
+
+def rollup_users(engine, first, last):
+    '''Rollups of the users with ids `first` to `last`, over the hot and the archive table -> (rollups, subscriptions read)'''
+    from core.archive import union_all_tables
+    from core.subscriptions import SUBSCRIPTION_PERIOD
+
+    # prices as Decimal, like the ORM columns
+    sql = text(union_all_tables(HISTORY_SQL, HISTORY_ORDER, engine.dialect.name)).columns(price=Numeric(10, 2))
+    with engine.connect() as connection:
+        rows = connection.execute(sql, { 'first': first, 'last': last }).all()
+    return history_rollups(rows, SUBSCRIPTION_PERIOD), len(rows)
+
+
+_worker_engine = None
+
+
+def _init_worker(url, pragmas):
+    global _worker_engine
+    _worker_engine = create_engine(url, connect_args={ 'timeout': 60 } if url.startswith('sqlite') else {})
+    if pragmas and _worker_engine.dialect.name == 'sqlite':
+        apply_sqlite_pragmas(_worker_engine, pragmas)
+
+
+def _rollup_users(first, last):
+    return rollup_users(_worker_engine, first, last)
+
+
+def rebuild_rollups(engine, workers=0, chunk_size=10000, pragmas=None):
+    '''
+    Recompute `plan_monthly_rollups` from the subscription history: users are
+    classified in id ranges of `chunk_size` spread over `workers` processes
+    (0 runs inline), the partial rollups are merged and replace the table in
+    one transaction. Writes committed while it runs may be missed or counted
+    twice, run it while subscriptions are quiet.
+    Returns `{rows, subscriptions, seconds}`.
+    '''
+    from core.subscriptions import chunked
+    from models import User, PlanMonthlyRollup
+
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        first_user_id, last_user_id = connection.execute(select(func.min(User.id), func.max(User.id))).first()
+    ranges = [] if first_user_id is None else [
+        (first, min(first + chunk_size - 1, last_user_id)) for first in range(first_user_id, last_user_id + 1, chunk_size)
+    ]
+
+    # workers need a database they can open on their own
+    if engine.url.database in (None, '', ':memory:'):
+        workers = 0
+
+    rollups, subscriptions = {}, 0
+    if workers and len(ranges) > 1:
+        url = engine.url.render_as_string(hide_password=False)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(url, pragmas)) as executor:
+            for partial, count in executor.map(_rollup_users, *zip(*ranges)):
+                merge_rollups(rollups, partial)
+                subscriptions += count
+    else:
+        for first, last in ranges:
+            partial, count = rollup_users(engine, first, last)
+            merge_rollups(rollups, partial)
+            subscriptions += count
+
+    rows = rollup_rows(rollups)
+    table = PlanMonthlyRollup.__table__
+    with engine.begin() as connection:
+        connection.execute(delete(table))
+        for chunk in chunked(rows, chunk_size):
+            connection.execute(insert(table), chunk)
+
+    return { 'rows': len(rows), 'subscriptions': subscriptions, 'seconds': time.perf_counter() - started }
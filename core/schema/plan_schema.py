@@ -1,7 +1,7 @@
 from core.extensions import ma
 from models import Plan
-from marshmallow.fields import String, Float
-from marshmallow import ValidationError, validates_schema, validate
+from marshmallow.fields import String, Float, List
+from marshmallow import validate
 
 class PlanSchema(ma.Schema):
     class Meta:
@@ -11,6 +11,7 @@ class PlanSchema(ma.Schema):
     name = ma.Str()
     price = ma.Float()
     created_at = ma.Int()
+    features = ma.List(ma.Str())
 
 class PlanCreateSchema(ma.Schema):
     class Meta:
@@ -18,12 +19,8 @@ class PlanCreateSchema(ma.Schema):
 
     name = String(required=True, validate=[validate.Length(min=3)])
     price = Float(required=True)
+    features = List(String(validate=[validate.Length(min=1, max=50)]), load_default=list)
+    # name uniqueness is enforced by the plans.name unique constraint on insert
 
-    @validates_schema
-    def validate_name(self, data, **kwargs):
-        name = data.get("name")
-        print("validating name ...")
-        if Plan.query.filter_by(name=name).count():
-            raise ValidationError(f"Plan '{name}' already exists.")
-
-
+class PlanFeaturesSchema(ma.Schema):
+    features = List(String(validate=[validate.Length(min=1, max=50)]), required=True)
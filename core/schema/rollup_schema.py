@@ -0,0 +1,28 @@
+from core.extensions import ma
+from models import PlanMonthlyRollup
+from marshmallow.fields import String
+from marshmallow import validate
+
+MONTH = validate.Regexp(r'^\d{4}-(0[1-9]|1[0-2])$', error="Not a YYYY-MM month.")
+
+class PlanMonthlyRollupSchema(ma.Schema):
+    class Meta:
+        model = PlanMonthlyRollup
+
+    plan_id = ma.Str()
+    plan_name = ma.Str()
+    month = ma.Str()
+    new_subscriptions = ma.Int()
+    upgrades_in = ma.Int()
+    upgrades_out = ma.Int()
+    cancellations = ma.Int()
+    mrr = ma.Float()
+
+class RollupMonthSchema(ma.Schema):
+    # defaults to the current month (UTC)
+    month = String(load_default=None, validate=[MONTH])
+
+class RollupRangeSchema(ma.Schema):
+    # inclusive month range, `to` defaults to the current month (UTC) and `from` to 11 months before it
+    from_ = String(data_key='from', load_default=None, validate=[MONTH])
+    to = String(load_default=None, validate=[MONTH])
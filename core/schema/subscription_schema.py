@@ -1,7 +1,8 @@
 from core.extensions import ma
 from models import Subscription
-from marshmallow.fields import String
-from marshmallow import post_dump
+from marshmallow.fields import String, Integer, Boolean, List, Nested
+from marshmallow import post_dump, post_load, validate, validates_schema, ValidationError
+from core.schema.row_serializer import RowSerializer
 
 class SubscriptionSchema(ma.Schema):
     class Meta:
@@ -19,8 +20,39 @@ class SubscriptionSchema(ma.Schema):
 
     @post_dump
     def convert_active(self, data, **kwargs):
-        # Force conversion
-        data['is_active'] = bool(data.get('is_active', 0))
+        # Force conversion (is_active is absent from sparse fieldsets without it)
+        if 'is_active' in data:
+            data['is_active'] = bool(data['is_active'])
+        return data
+
+# Fast SubscriptionSchema dump for read paths, replays `convert_active`
+subscription_serializer = RowSerializer(SubscriptionSchema(), post={ 'is_active': bool })
+
+class SubscriptionHistorySchema(ma.Schema):
+    per_page = Integer(load_default=10, validate=[validate.Range(min=1)])
+    # opaque keyset cursor returned as `next_cursor`
+    cursor = String(load_default=None)
+    # deprecated, id of the last row seen, prefer `cursor`
+    last_seen_id = Integer(load_default=None)
+    # comma separated sparse fieldset, e.g. `id,name,price,created_at`
+    fields = String(load_default=None)
+
+    @validates_schema
+    def validate_fields(self, data, **kwargs):
+        fields = data.get("fields")
+        if fields is None:
+            return
+        unknown = [field for field in fields.split(",") if field not in SubscriptionSchema._declared_fields]
+        if unknown:
+            raise ValidationError(f"Unknown fields: {', '.join(unknown)}.", "fields")
+
+    @post_load
+    def normalize_fields(self, data, **kwargs):
+        # a list in schema order without repeats, so reordered or repeated
+        # fieldsets share one query shape and one compiled serializer
+        if data.get("fields") is not None:
+            requested = set(data["fields"].split(","))
+            data["fields"] = [field for field in SubscriptionSchema._declared_fields if field in requested]
         return data
 
 class SubscriptionCreateSchema(ma.Schema):
@@ -29,3 +61,24 @@ class SubscriptionCreateSchema(ma.Schema):
 
     plan_id = String(required=True)
 
+class SubscriptionBulkItemSchema(ma.Schema):
+    user_id = Integer(required=True)
+    plan_id = Integer(required=True)
+
+class SubscriptionBulkCreateSchema(ma.Schema):
+    items = List(Nested(SubscriptionBulkItemSchema), required=True, validate=[validate.Length(min=1)])
+
+class SubscriptionActiveBatchSchema(ma.Schema):
+    user_ids = List(Integer(), required=True, validate=[validate.Length(min=1)])
+
+class SubscriptionExportSchema(ma.Schema):
+    format = String(load_default='ndjson', validate=[validate.OneOf(['ndjson', 'csv'])])
+    # created_at range, unix timestamps [from, to)
+    from_ = Integer(data_key='from', load_default=None)
+    to = Integer(load_default=None)
+    all_users = Boolean(load_default=False)
+
+    @validates_schema
+    def validate_range(self, data, **kwargs):
+        if data.get("all_users") and (data.get("from_") is None or data.get("to") is None):
+            raise ValidationError("'from' and 'to' are required when exporting all users.")
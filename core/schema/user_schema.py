@@ -1,7 +1,7 @@
 from core.extensions import ma
 from models import User
 from marshmallow.fields import String
-from marshmallow import ValidationError, validates_schema, validate
+from marshmallow import validate
 
 class UserSchema(ma.Schema):
     class Meta:
@@ -20,13 +20,7 @@ class UserRegisterSchema(ma.Schema):
     password = String(required=True, validate=[validate.Length(min=6)])
     first_name = String(required=True, validate=[validate.Length(min=3)])
     last_name = String(required=True, validate=[validate.Length(min=3)])
-
-    @validates_schema
-    def validate_email(self, data, **kwargs):
-        email = data.get("email")
-        print("validating email ...")
-        if User.query.filter_by(email=email).count():
-            raise ValidationError(f"Email {email} already exists.")
+    # email uniqueness is enforced by the users.email unique constraint on insert
 
 
 class UserLoginSchema(ma.Schema):
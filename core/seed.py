@@ -0,0 +1,196 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import create_engine, func, insert, select, text
+from core.sqlite import apply_sqlite_pragmas
+
+MONTH = 30 * 24 * 3600
+# Users per unit of work. Each block draws from its own RNG, so the data only
+# depends on the seed, never on how many workers loaded it
+BLOCK_SIZE = 5000
+DEFAULT_PLANS = (("Free", 0), ("Basic", 50), ("Premium", 200))
+
+ANALYZE = {
+    'sqlite': "ANALYZE",
+    'mysql': "ANALYZE TABLE subscriptions",
+    'mariadb': "ANALYZE TABLE subscriptions",
+    'postgresql': "ANALYZE subscriptions",
+}
+
+
+def subscription_counts(users, subscriptions, skew, seed):
+    '''
+    Subscriptions per user, Zipf-like: every user has one, the rest is shared
+    out in proportion to `1 / rank ** skew`. Ranks are shuffled over the users,
+    so heavy users are spread across the id range.
+    '''
+    if users < 1 or subscriptions < users:
+        raise ValueError("Need at least one user and one subscription per user.")
+
+    weights = [rank ** -skew for rank in range(1, users + 1)]
+    total = sum(weights)
+    extra = subscriptions - users
+    counts = [1 + int(extra * weight / total) for weight in weights]
+    # hand out the rounding remainder from the top rank down
+    for rank in range(subscriptions - sum(counts)):
+        counts[rank % users] += 1
+
+    random.Random(seed).shuffle(counts)
+    return counts
+
+
+def generate_subscriptions(rng, first_user_id, counts, plans, options):
+    '''
+    Rows for consecutive users starting at `first_user_id`, oldest first. Every
+    subscription but the latest was superseded, the latest one is active for
+    `active_ratio` of the users and otherwise expired or cancelled.
+    '''
+    now, window, active_ratio = options['now'], options['history_days'] * 24 * 3600, options['active_ratio']
+    plan_weights = [1 / (i + 1) for i in range(len(plans))]  # cheaper plans are more popular
+
+    for offset, count in enumerate(counts):
+        user_id = first_user_id + offset
+        active = rng.random() < active_ratio
+
+        latest = now - rng.randrange(MONTH) if active else now - rng.randrange(window)
+        starts = sorted(latest - rng.randrange(1, window) for _ in range(count - 1))
+        starts.append(latest)
+        chosen = rng.choices(plans, plan_weights, k=count)
+
+        for i, (start, plan) in enumerate(zip(starts, chosen)):
+            if i < count - 1:
+                end = min(start + MONTH, starts[i + 1])
+            elif active:
+                end = start + MONTH
+            else:
+                # expired, or cancelled before the period ended
+                end = min(start + MONTH, start + rng.randrange(1, max(2, now - start)))
+            yield {
+                'user_id': user_id, 'plan_id': plan[0], 'name': plan[1], 'price': plan[2],
+                'start_date': start, 'end_date': end, 'created_at': start,
+                'is_active': i == count - 1 and active,
+            }
+
+
+def insert_block(engine, block, first_user_id, counts, plans, options):
+    '''Generate and insert one block of users' subscriptions in one transaction -> rows'''
+    from core.subscriptions import chunked
+    from models import Subscription
+
+    rng = random.Random(f"{options['seed']}:{block}")
+    rows = list(generate_subscriptions(rng, first_user_id, counts, plans, options))
+    statement = insert(Subscription.__table__)
+    with engine.begin() as conn:
+        for chunk in chunked(rows, options['chunk_size']):
+            conn.execute(statement, chunk)
+    return len(rows)
+
+
+_worker_engine = None
+
+
+def _init_worker(url, pragmas):
+    global _worker_engine
+    _worker_engine = create_engine(url, connect_args={ 'timeout': 60 } if url.startswith('sqlite') else {})
+    if pragmas and _worker_engine.dialect.name == 'sqlite':
+        apply_sqlite_pragmas(_worker_engine, pragmas)
+
+
+def _insert_block(*args):
+    return insert_block(_worker_engine, *args)
+
+
+def seed_database(engine, users, subscriptions, skew=1.0, active_ratio=0.6, history_days=730, seed=42,
+                  workers=0, chunk_size=10000, reset=False, now=None, pragmas=None, progress=None):
+    '''
+    Load `users` users and `subscriptions` subscriptions with chunked Core
+    inserts, generated in blocks of BLOCK_SIZE users spread over `workers`
+    processes (0 runs inline). With `reset` the tables are recreated and the
+    subscription indexes are built once after the load instead of row by row.
+    Current subscription pointers are backfilled and the plan monthly rollups
+    rebuilt at the end.
+    Returns `{users, subscriptions, seconds}`.
+    '''
+    from core.extensions import db, password_hasher
+    from core.plan_catalog import bump_catalog_version
+    from core.rollups import rebuild_rollups
+    from core.subscriptions import backfill_current_subscriptions
+    from models import Plan, User, Subscription
+
+    started = time.perf_counter()
+    now = int(now or time.time())
+    counts = subscription_counts(users, subscriptions, skew, seed)
+    options = {
+        'now': now, 'history_days': history_days, 'active_ratio': active_ratio,
+        'seed': seed, 'chunk_size': chunk_size,
+    }
+
+    indexes = []
+    if reset:
+        db.metadata.drop_all(engine)
+        db.metadata.create_all(engine)
+        # InnoDB needs an index on the foreign key columns, so MySQL keeps them
+        if engine.dialect.name not in ('mysql', 'mariadb'):
+            indexes = list(Subscription.__table__.indexes)
+        with engine.begin() as conn:
+            for index in indexes:
+                index.drop(conn)
+
+    with engine.begin() as conn:
+        if conn.execute(select(func.count()).select_from(Plan)).scalar() == 0:
+            conn.execute(insert(Plan), [{ 'name': name, 'price': price, 'created_at': now } for name, price in DEFAULT_PLANS])
+            bump_catalog_version(conn, engine.dialect.name)
+        plans = [tuple(plan) for plan in conn.execute(select(Plan.id, Plan.name, Plan.price).order_by(Plan.price))]
+
+        first_user_id = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+        # one hash for every generated user, bcrypt at full cost would dominate the load
+        password = password_hasher.generate_password_hash("password")
+        created_at = now - history_days * 24 * 3600 - MONTH
+        user_rows = ({
+            'id': user_id, 'first_name': "Seed", 'last_name': f"User {user_id}",
+            'email': f"seed-{user_id}@example.com", 'password_hash': password, 'created_at': created_at,
+        } for user_id in range(first_user_id, first_user_id + users))
+        batch = []
+        for row in user_rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                conn.execute(insert(User), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(User), batch)
+
+    blocks = [
+        (block, first_user_id + start, counts[start:start + BLOCK_SIZE], plans, options)
+        for block, start in enumerate(range(0, users, BLOCK_SIZE))
+    ]
+
+    # workers need a database they can open on their own
+    if engine.url.database in (None, '', ':memory:'):
+        workers = 0
+
+    loaded = 0
+    if workers:
+        url = engine.url.render_as_string(hide_password=False)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(url, pragmas)) as executor:
+            for future in as_completed([executor.submit(_insert_block, *block) for block in blocks]):
+                loaded += future.result()
+                if progress:
+                    progress(loaded, subscriptions)
+    else:
+        for block in blocks:
+            loaded += insert_block(engine, *block)
+            if progress:
+                progress(loaded, subscriptions)
+
+    with engine.begin() as conn:
+        for index in indexes:
+            index.create(conn)
+        backfill_current_subscriptions(conn)
+        statement = ANALYZE.get(conn.dialect.name)
+        if statement:
+            conn.execute(text(statement))
+    rebuild_rollups(engine, workers=workers, chunk_size=BLOCK_SIZE, pragmas=pragmas)
+
+    return { 'users': users, 'subscriptions': loaded, 'seconds': time.perf_counter() - started }
@@ -0,0 +1,79 @@
+import atexit
+import logging
+import os
+import re
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+_PRAGMA_VALUE = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    '''Run `PRAGMA key = value` for each pragma on every new connection of `engine`'''
+    statements = []
+    for key, value in pragmas.items():
+        if not _PRAGMA_VALUE.match(str(key)) or not _PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f"Invalid SQLite pragma {key}={value}")
+        statements.append(f"PRAGMA {key} = {value}")
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    return set_pragmas
+
+
+def optimize(engine):
+    '''`PRAGMA optimize`: let SQLite refresh the statistics the planner needs'''
+    try:
+        # runs at interpreter exit, when echo log handlers may already be closed
+        engine.echo = False
+        with engine.connect() as connection:
+            connection.execute(text("PRAGMA optimize"))
+    except Exception:
+        logger.exception("PRAGMA optimize failed")
+
+
+class SQLiteProfile:
+    '''
+    Performance profile for single-node SQLite deployments, applied through
+    connection event hooks to every SQLite engine of the app:
+
+    * `SQLITE_PRAGMAS` - WAL journal (readers no longer block on writers),
+      `synchronous`, `mmap_size`, `cache_size`, `busy_timeout`, `temp_store`
+    * `SQLITE_OPTIMIZE_ON_SHUTDOWN` - run `PRAGMA optimize` when the process exits
+
+    Engines of other dialects are left untouched. Call after `db.init_app`.
+    '''
+
+    def __init__(self, app=None):
+        self.engines = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from core.extensions import db
+
+        pragmas = app.config.get('SQLITE_PRAGMAS', {})
+        with app.app_context():
+            engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+
+        for engine in engines:
+            apply_sqlite_pragmas(engine, pragmas)
+        self.engines.extend(engines)
+
+        if engines and app.config.get('SQLITE_OPTIMIZE_ON_SHUTDOWN', True):
+            atexit.register(self.optimize, engines, os.getpid())
+        app.extensions['sqlite_profile'] = self
+
+    @staticmethod
+    def optimize(engines, pid=None):
+        # forked workers (gunicorn preload) inherit the exit hook, only the process that registered it runs it
+        if pid is not None and pid != os.getpid():
+            return
+        for engine in engines:
+            optimize(engine)
@@ -0,0 +1,364 @@
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import Integer, and_, bindparam, func, insert, literal, select, text, update
+from core.extensions import db, plan_catalog, subscription_cache, read_router
+from core.rollups import record_events
+from core.upsert import upsert
+from models import User, Plan, Subscription, CurrentSubscription
+
+# Immutable, slotted snapshot of a subscription row, serialized without touching the ORM
+SubscriptionRecord = namedtuple('SubscriptionRecord', [column.key for column in Subscription.__table__.columns])
+
+
+class SubscriptionWriteError(Exception):
+    '''A subscribe/upgrade statement changed nothing, `status` is the HTTP status to answer with'''
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def subscription_changed(user_id):
+    '''Call once a subscription write of `user_id` is committed'''
+    user_id = int(user_id)
+    subscription_cache.invalidate(user_id)
+    # read-your-writes: keep this user's reads on the primary for a while
+    read_router.stick(user_id)
+
+
+# Length of a subscription, in seconds. Fixed (no calendar or DST arithmetic),
+# so the rollup rebuild can tell a cancelled period from one that ran out
+SUBSCRIPTION_PERIOD = 30 * 24 * 3600
+
+
+def subscription_period(start_date=None):
+    '''Return (start_date, end_date) unix timestamps of a new 30-day subscription, starting now by default'''
+    start_date = int(datetime.now().timestamp()) if start_date is None else start_date
+    return start_date, start_date + SUBSCRIPTION_PERIOD
+
+
+subscriptions_table = Subscription.__table__
+
+# INSERT ... SELECT: name and price are copied from the plan row by the database
+# in the same statement, and an unknown plan inserts nothing
+subscribe_stmt = insert(subscriptions_table).from_select(
+    ['plan_id', 'name', 'price', 'is_active', 'user_id', 'start_date', 'end_date', 'created_at'],
+    select(
+        Plan.id, Plan.name, Plan.price, literal(True),
+        bindparam('subscriber_id', type_=Integer), bindparam('period_start', type_=Integer),
+        bindparam('period_end', type_=Integer), bindparam('period_start', type_=Integer),
+    ).where(Plan.id == bindparam('new_plan_id', type_=Integer))
+)
+
+current_table = CurrentSubscription.__table__
+
+# The user's current subscription id, through the pointer row (primary key read)
+current_subscription = (
+    select(current_table.c.subscription_id.label('id'), current_table.c.plan_id)
+    .where(
+        current_table.c.user_id == bindparam('subscriber_id', type_=Integer),
+        current_table.c.end_date > bindparam('now', type_=Integer),
+    )
+)
+
+# Ends the current subscription in one statement. `is_active` makes a concurrent
+# second writer of the same user match nothing instead of ending it twice
+end_current_stmt = (
+    update(subscriptions_table)
+    .where(
+        subscriptions_table.c.id == current_subscription.with_only_columns(current_table.c.subscription_id).scalar_subquery(),
+        subscriptions_table.c.is_active == True,
+    )
+    .values(is_active=False, end_date=bindparam('now', type_=Integer))
+)
+
+clear_current_stmt = (
+    update(current_table)
+    .where(current_table.c.user_id == bindparam('subscriber_id', type_=Integer))
+    .values(subscription_id=None, plan_id=None, end_date=None, version=current_table.c.version + 1)
+)
+
+# Validator of the user's subscription reads: primary key read of the pointer row
+subscription_version_stmt = select(current_table.c.version, current_table.c.end_date).where(
+    current_table.c.user_id == bindparam('subscriber_id', type_=Integer)
+)
+
+# Plan of the user's current subscription for entitlement checks: primary key read of the pointer row
+current_plan_stmt = select(current_table.c.plan_id, current_table.c.end_date).where(
+    current_table.c.user_id == bindparam('subscriber_id', type_=Integer)
+)
+
+
+def _dialect():
+    return db.session.get_bind().dialect
+
+
+def set_current_subscriptions(pointers):
+    '''Upsert `{ user_id, subscription_id, plan_id, end_date }` pointer rows, bumping their version'''
+    stmt = upsert(current_table, ('user_id',), ('subscription_id', 'plan_id', 'end_date'), _dialect().name, ('version',))
+    db.session.execute(stmt, pointers)
+
+
+def subscription_version(user_id):
+    '''
+    `(version, end_date)` of the user's pointer row, `(0, None)` before the
+    user's first subscription. Read before the data it validates: a write in
+    between makes the data newer than the ETag, never older.
+    '''
+    row = db.session.execute(
+        subscription_version_stmt, { 'subscriber_id': int(user_id) }, bind_arguments=read_router.bind_arguments(int(user_id))
+    ).first()
+    return (row.version, row.end_date) if row is not None else (0, None)
+
+
+def current_plan_id(user_id):
+    '''`plan_id` of the user's active subscription, None when there is none'''
+    row = db.session.execute(
+        current_plan_stmt, { 'subscriber_id': int(user_id) }, bind_arguments=read_router.bind_arguments(int(user_id))
+    ).first()
+    if row is None or row.end_date is None or row.end_date <= int(datetime.now().timestamp()):
+        return None
+    return row.plan_id
+
+
+def create_subscription(user_id, plan_id):
+    '''
+    Subscribe `user_id` to `plan_id` with one INSERT ... SELECT ... RETURNING
+    (plus a primary key lookup where RETURNING is not supported), point the
+    user's current subscription at it and count it in the plan's monthly rollup.
+    Returns a `SubscriptionRecord`, raises `SubscriptionWriteError` for an unknown
+    plan. The caller commits.
+    '''
+    subscription = _start_subscription(user_id, plan_id, int(datetime.now().timestamp()))
+    record_events([(subscription.plan_id, subscription.start_date, { 'new_subscriptions': 1, 'mrr': subscription.price })])
+    return subscription
+
+
+def _start_subscription(user_id, plan_id, now):
+    '''Insert the subscription of `user_id` to `plan_id` starting at `now` and point the user at it -> `SubscriptionRecord`'''
+    start_date, end_date = subscription_period(now)
+    # bind names differ from the column names, which are reserved in INSERT/UPDATE
+    params = { 'subscriber_id': int(user_id), 'new_plan_id': int(plan_id), 'period_start': start_date, 'period_end': end_date }
+
+    if _dialect().insert_returning:
+        row = db.session.execute(subscribe_stmt.returning(*subscriptions_table.c), params).first()
+    else:
+        result = db.session.execute(subscribe_stmt, params)
+        row = None
+        if result.rowcount:
+            row = db.session.execute(select(*subscriptions_table.c).where(subscriptions_table.c.id == result.lastrowid)).first()
+
+    if row is None:
+        raise SubscriptionWriteError(f"Plan with id '{plan_id}' does not exists.")
+    subscription = SubscriptionRecord(*row)
+    set_current_subscriptions([{
+        'user_id': subscription.user_id, 'subscription_id': subscription.id,
+        'plan_id': subscription.plan_id, 'end_date': subscription.end_date,
+    }])
+    return subscription
+
+
+def _end_current_subscription(user_id, now):
+    '''End the current subscription of `user_id` -> (id, plan_id) row, or None when there is none'''
+    params = { 'subscriber_id': int(user_id), 'now': now }
+
+    if _dialect().update_returning:
+        return db.session.execute(
+            end_current_stmt.returning(subscriptions_table.c.id, subscriptions_table.c.plan_id), params
+        ).first()
+
+    # MySQL can not return from UPDATE, lock the pointer row instead
+    ended = db.session.execute(current_subscription.with_for_update(), params).first()
+    if ended is not None:
+        result = db.session.execute(
+            update(subscriptions_table)
+            .where(subscriptions_table.c.id == ended.id, subscriptions_table.c.is_active == True)
+            .values(is_active=False, end_date=now)
+        )
+        if not result.rowcount:
+            return None
+    return ended
+
+
+def upgrade_subscription(user_id, plan_id):
+    '''
+    Move `user_id` from the current subscription to `plan_id`: one UPDATE ...
+    RETURNING ends the row the pointer designates, one INSERT ... SELECT ...
+    RETURNING starts the new one the same second, one upsert moves the
+    pointer and one more counts the upgrade in the rollups of both plans.
+    Returns the new `SubscriptionRecord`, raises `SubscriptionWriteError` when
+    there is no active subscription, it is already on `plan_id`, or the plan does
+    not exist. The caller commits, or rolls back on error.
+    '''
+    now = int(datetime.now().timestamp())
+    ended = _end_current_subscription(user_id, now)
+
+    if ended is None:
+        raise SubscriptionWriteError("No active subscription found.", 404)
+    if int(ended.plan_id) == int(plan_id):
+        raise SubscriptionWriteError("You're already on this subscription plan. Please select a different plan to upgrade.")
+
+    subscription = _start_subscription(user_id, plan_id, now)
+    record_events([
+        (ended.plan_id, now, { 'upgrades_out': 1 }),
+        (subscription.plan_id, now, { 'upgrades_in': 1, 'mrr': subscription.price }),
+    ])
+    return subscription
+
+
+def cancel_subscription(user_id):
+    '''End the current subscription of `user_id`, clear the pointer and count the cancellation -> False when there was none. The caller commits.'''
+    now = int(datetime.now().timestamp())
+    ended = _end_current_subscription(user_id, now)
+    if ended is None:
+        return False
+    db.session.execute(clear_current_stmt, { 'subscriber_id': int(user_id) })
+    record_events([(ended.plan_id, now, { 'cancellations': 1 })])
+    return True
+
+
+def backfill_current_subscriptions(connection):
+    '''
+    Rebuild `current_subscriptions` from `subscriptions`: every user gets a
+    row, pointing at their latest active subscription if they have one. Set
+    based, for migrations and bulk loads.
+    Every row gets a version above any version handed out before, so no ETag
+    issued before the rebuild can match one issued after it.
+    Returns the number of users with an active subscription.
+    '''
+    version = connection.execute(text("SELECT COALESCE(MAX(version), 0) + 1 FROM current_subscriptions")).scalar()
+    connection.execute(text("DELETE FROM current_subscriptions"))
+    connection.execute(text(BACKFILL_CURRENT_SUBSCRIPTIONS), { 'version': version })
+    return connection.execute(text("SELECT COUNT(*) FROM current_subscriptions WHERE subscription_id IS NOT NULL")).scalar()
+
+
+BACKFILL_CURRENT_SUBSCRIPTIONS = """
+    INSERT INTO current_subscriptions (user_id, subscription_id, plan_id, end_date, version)
+    SELECT users.id, ranked.id, ranked.plan_id, ranked.end_date, :version
+    FROM users
+    LEFT JOIN (
+        SELECT user_id, id, plan_id, end_date,
+               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS position
+        FROM subscriptions
+        WHERE is_active = TRUE
+    ) ranked ON ranked.user_id = users.id AND ranked.position = 1
+"""
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def bulk_create_subscriptions(items, chunk_size=500):
+    '''
+    Create one subscription per `{ user_id, plan_id }` item in a single transaction.
+
+    * plans are resolved from one snapshot of the in-memory catalog, reloaded
+      at most once when items name plans it does not have
+    * unknown users and users that already have an active subscription are
+      found with one set-based query over the current subscription pointers
+    * rows are written in multi-row INSERT statements of `chunk_size` rows
+    * the rollups get one upsert row per plan
+
+    Returns one result per item, in request order.
+    '''
+    start_date, end_date = subscription_period()
+    created_at = start_date
+
+    # One query: which users exist, and how many active subscriptions each has
+    user_ids = list({item['user_id'] for item in items})
+    active_count = {}
+    if user_ids:
+        users_stmt = (
+            select(User.id, func.count(CurrentSubscription.subscription_id))
+            .outerjoin(CurrentSubscription, and_(
+                CurrentSubscription.user_id == User.id,
+                CurrentSubscription.end_date > created_at
+            ))
+            .where(User.id.in_(user_ids))
+            .group_by(User.id)
+        )
+        active_count = dict(db.session.execute(users_stmt).all())
+
+    # One catalog snapshot for every item, plans missing from it reload it once
+    snapshot = plan_catalog.snapshot()
+    plans = snapshot.plans
+    if any(item['plan_id'] not in plans for item in items):
+        plans = plan_catalog.rebuild(stale=snapshot).plans
+
+    results = []
+    rows = []
+    seen = set()
+    for index, item in enumerate(items):
+        user_id = item['user_id']
+        plan_id = item['plan_id']
+        result = { 'index': index, 'user_id': user_id, 'plan_id': plan_id }
+        results.append(result)
+
+        plan = plans.get(plan_id)
+        if plan is None:
+            error = f"Plan with id '{plan_id}' does not exists."
+        elif user_id not in active_count:
+            error = f"User with id '{user_id}' does not exists."
+        elif active_count[user_id] or user_id in seen:
+            error = "User already has an active subscription."
+        else:
+            error = None
+
+        if error:
+            result.update(status='failed', error=error)
+            continue
+
+        seen.add(user_id)
+        result['status'] = 'created'
+        rows.append({
+            'plan_id': plan.id,
+            'name': plan.name,
+            'price': plan.price,
+            'is_active': True,
+            'user_id': user_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'created_at': created_at,
+        })
+
+    # user_id -> new subscription id
+    created_ids = {}
+    table = Subscription.__table__
+    returning = db.session.get_bind().dialect.insert_executemany_returning
+    # One cached statement, executed with a parameter list per chunk. SQLAlchemy
+    # ("insertmanyvalues") and PyMySQL both send it as multi-row INSERT ... VALUES batches
+    stmt = insert(table)
+    if returning:
+        stmt = stmt.returning(table.c.user_id, table.c.id)
+    for chunk in chunked(rows, chunk_size):
+        result = db.session.execute(stmt, chunk, execution_options={ 'insertmanyvalues_page_size': chunk_size })
+        if returning:
+            created_ids.update(result.all())
+
+    if rows and not returning:
+        # Users were unique in the batch and had no active subscription, so
+        # (user_id, created_at) identifies the rows we just inserted
+        for chunk in chunked([row['user_id'] for row in rows], chunk_size):
+            ids_stmt = select(Subscription.user_id, Subscription.id).where(
+                Subscription.user_id.in_(chunk),
+                Subscription.is_active == True,
+                Subscription.created_at == created_at
+            )
+            created_ids.update(db.session.execute(ids_stmt).all())
+
+    for chunk in chunked(rows, chunk_size):
+        set_current_subscriptions([
+            { 'user_id': row['user_id'], 'subscription_id': created_ids[row['user_id']], 'plan_id': row['plan_id'], 'end_date': row['end_date'] }
+            for row in chunk
+        ])
+
+    record_events([(row['plan_id'], start_date, { 'new_subscriptions': 1, 'mrr': row['price'] }) for row in rows])
+    db.session.commit()
+
+    for result in results:
+        if result['status'] == 'created':
+            result['subscription_id'] = created_ids.get(result['user_id'])
+
+    return results
@@ -0,0 +1,31 @@
+from functools import lru_cache
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+_INSERTS = { 'sqlite': sqlite.insert, 'postgresql': postgresql.insert, 'mysql': mysql.insert, 'mariadb': mysql.insert }
+
+
+@lru_cache(maxsize=None)
+def upsert(table, key_columns, update_columns, dialect_name, increment_columns=(), add_columns=()):
+    '''
+    `INSERT ... ON CONFLICT (key) DO UPDATE` (SQLite, PostgreSQL) or
+    `INSERT ... ON DUPLICATE KEY UPDATE` (MySQL) of `table`, setting
+    `update_columns` from the inserted row, adding one to `increment_columns`
+    and the inserted value to `add_columns`. Built once per table and dialect.
+    '''
+    if dialect_name not in _INSERTS:
+        raise NotImplementedError(f"No upsert for dialect {dialect_name}")
+
+    stmt = _INSERTS[dialect_name](table)
+    increments = { column: table.c[column] + 1 for column in increment_columns }
+    if dialect_name in ('mysql', 'mariadb'):
+        return stmt.on_duplicate_key_update({
+            **{ column: stmt.inserted[column] for column in update_columns }, **increments,
+            **{ column: table.c[column] + stmt.inserted[column] for column in add_columns },
+        })
+    return stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={
+            **{ column: stmt.excluded[column] for column in update_columns }, **increments,
+            **{ column: table.c[column] + stmt.excluded[column] for column in add_columns },
+        },
+    )
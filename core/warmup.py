@@ -0,0 +1,100 @@
+import logging
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def schema_classes():
+    '''Every marshmallow schema of the API'''
+    from marshmallow import Schema
+    import core.schema.plan_schema
+    import core.schema.rollup_schema
+    import core.schema.subscription_schema
+    import core.schema.user_schema
+
+    modules = (core.schema.plan_schema, core.schema.rollup_schema, core.schema.subscription_schema, core.schema.user_schema)
+    return [
+        value for module in modules for value in vars(module).values()
+        if isinstance(value, type) and issubclass(value, Schema) and value.__module__ == module.__name__
+    ]
+
+
+def hot_reads(connection):
+    '''
+    Run the statements of the hot read paths once on `connection`, for a user
+    that does not exist. Fills the engine's compiled statement cache, the
+    driver's statement cache of that connection and the row serializers.
+    '''
+    from apis.subscription_namespace import active_subscription_query, active_subscription_value
+    from core.history import history_statement, history_page
+    from core.subscriptions import subscription_version_stmt, current_plan_stmt
+
+    user_id, now = 0, int(datetime.now().timestamp())
+    connection.execute(subscription_version_stmt, { 'subscriber_id': user_id }).all()
+    connection.execute(current_plan_stmt, { 'subscriber_id': user_id }).all()
+    active_subscription_value(connection.execute(active_subscription_query, { 'user_id': user_id, 'now': now }), None)
+    # first page and following pages of the history
+    for cursor in (None, (now, 0)):
+        sql, params = history_statement(user_id, 10, None, cursor, connection.dialect.name)
+        result = connection.execute(sql, params)
+        history_page(result.all(), result.keys(), 10, None)
+
+
+def prepare(app):
+    '''
+    Process independent warm-up: Swagger spec, schemas, plan catalog, compiled
+    statements. Run it once before the workers fork, they inherit the result
+    and share its memory copy-on-write. Connections opened here are closed.
+    '''
+    from core.extensions import db, plan_catalog, openapi_document
+    from models import User
+
+    started = time.perf_counter()
+    with app.app_context():
+        # Swagger spec, generated and compressed once
+        openapi_document.bundle(app)
+        for schema in schema_classes():
+            schema()
+        plan_catalog.rebuild()
+        # login lookup, the one ORM read of the hot paths
+        User.query.filter_by(email="").first()
+        db.session.remove()
+        for engine in db.engines.values():
+            with engine.connect() as connection:
+                hot_reads(connection)
+            # nothing connected survives in the process that forks
+            engine.dispose()
+    logger.info("warm-up: prepared in %.1f ms", (time.perf_counter() - started) * 1000)
+
+
+def after_fork(app):
+    '''Call first thing in a forked worker: drop the pools inherited from the parent without closing its connections'''
+    from core.extensions import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def connect(app):
+    '''
+    Per process warm-up: open `pool_size` connections on every engine and run
+    the hot reads on each, before the worker accepts traffic.
+    '''
+    from core.extensions import db
+
+    started = time.perf_counter()
+    with app.app_context():
+        for engine in db.engines.values():
+            connections = [engine.connect() for _ in range(engine.pool.size())]
+            for connection in connections:
+                hot_reads(connection)
+                connection.close()  # back to the pool, still open
+    logger.info("warm-up: connected in %.1f ms", (time.perf_counter() - started) * 1000)
+
+
+def warm_up(app):
+    '''Both phases, for a process that serves requests itself (no fork)'''
+    prepare(app)
+    connect(app)
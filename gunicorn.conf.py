@@ -0,0 +1,41 @@
+'''
+Production WSGI serving:
+
+    gunicorn -c gunicorn.conf.py
+
+The app is built and warmed up once in the master (`preload_app`), before the
+workers fork: imports, Swagger spec, schemas, plan catalog and compiled
+statements are shared copy-on-write. Each worker then drops the inherited
+pools, opens its own connections and runs the hot reads before it accepts
+traffic.
+'''
+import gc
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+preload_app = True
+
+
+def when_ready(server):
+    '''Master, app loaded, before the first fork'''
+    from core.warmup import prepare
+
+    prepare(server.app.wsgi())
+    # keep the objects built so far out of the collector: a collection would
+    # write to their pages in every worker and unshare them
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from core.warmup import after_fork
+
+    after_fork(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    '''Worker, before it accepts connections'''
+    from core.warmup import connect
+
+    connect(worker.wsgi)
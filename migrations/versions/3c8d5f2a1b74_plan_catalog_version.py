@@ -0,0 +1,29 @@
+"""shared version of the plan catalog, bumped by every plan write
+
+Revision ID: 3c8d5f2a1b74
+Revises: 9b4e1c7a2f60
+Create Date: 2026-10-20 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8d5f2a1b74'
+down_revision = '9b4e1c7a2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table('plan_catalog_version',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(table, [{ 'id': 1, 'version': 0 }])
+
+
+def downgrade():
+    op.drop_table('plan_catalog_version')
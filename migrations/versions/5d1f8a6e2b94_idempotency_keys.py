@@ -0,0 +1,35 @@
+"""idempotency keys of subscription writes
+
+Revision ID: 5d1f8a6e2b94
+Revises: e4b27d9c0a13
+Create Date: 2026-10-18 21:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1f8a6e2b94'
+down_revision = 'e4b27d9c0a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('idempotency_keys',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('status_code', sa.SmallInteger(), nullable=True),
+    sa.Column('response', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'key')
+    )
+    op.create_index('idx_idempotency_keys_expires_at', 'idempotency_keys', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_idempotency_keys_expires_at', table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
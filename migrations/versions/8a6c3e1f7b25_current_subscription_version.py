@@ -0,0 +1,26 @@
+"""version of the current subscription pointer, the ETag validator
+
+Revision ID: 8a6c3e1f7b25
+Revises: 5d1f8a6e2b94
+Create Date: 2026-10-18 22:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a6c3e1f7b25'
+down_revision = '5d1f8a6e2b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('current_subscriptions') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('current_subscriptions') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,51 @@
+"""subscriptions ids are never reused on SQLite
+
+Revision ID: 9b4e1c7a2f60
+Revises: f1a9c4e7d305
+Create Date: 2026-10-20 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e1c7a2f60'
+down_revision = 'f1a9c4e7d305'
+branch_labels = None
+depends_on = None
+
+
+def _autoincrement():
+    sql = op.get_bind().execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'subscriptions'")).scalar()
+    return 'AUTOINCREMENT' in (sql or '').upper()
+
+
+def _rebuild(autoincrement):
+    # copies rows and indexes, reflection drops the DESC of the keyset indexes
+    with op.batch_alter_table('subscriptions', recreate='always', table_kwargs={ 'sqlite_autoincrement': autoincrement }):
+        pass
+    op.drop_index('idx_user_id_is_active_end_date_created_at', table_name='subscriptions')
+    op.create_index('idx_user_id_is_active_end_date_created_at', 'subscriptions', ['user_id', 'is_active', 'end_date', sa.text('created_at DESC')], unique=False)
+    op.drop_index('idx_user_id_created_at_id_desc_name_price', table_name='subscriptions')
+    op.create_index('idx_user_id_created_at_id_desc_name_price', 'subscriptions', ['user_id', sa.text('created_at DESC'), sa.text('id DESC'), 'name', 'price'], unique=False)
+
+
+def upgrade():
+    # PostgreSQL and MySQL sequences never go back, only SQLite reuses MAX(id) + 1
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    if not _autoincrement():
+        _rebuild(True)
+    # ids already archived are taken too
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'subscriptions'")
+    op.execute(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'subscriptions', MAX("
+        "(SELECT COALESCE(MAX(id), 0) FROM subscriptions), (SELECT COALESCE(MAX(id), 0) FROM subscriptions_archive))"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite' or not _autoincrement():
+        return
+    _rebuild(False)
@@ -0,0 +1,47 @@
+"""current subscription pointer per user
+
+Revision ID: a3c91f2e6d47
+Revises: 
+Create Date: 2026-10-18 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91f2e6d47'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # users, plans and subscriptions predate the migration history (db.create_all)
+    op.create_table('current_subscriptions',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('subscription_id', sa.Integer(), nullable=True),
+    sa.Column('plan_id', sa.Integer(), nullable=True),
+    sa.Column('end_date', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ),
+    sa.ForeignKeyConstraint(['subscription_id'], ['subscriptions.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # backfill: each user points at their latest active subscription
+    op.execute("""
+        INSERT INTO current_subscriptions (user_id, subscription_id, plan_id, end_date)
+        SELECT user_id, id, plan_id, end_date
+        FROM (
+            SELECT user_id, id, plan_id, end_date,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS position
+            FROM subscriptions
+            WHERE is_active = TRUE
+        ) ranked
+        WHERE position = 1
+    """)
+
+
+def downgrade():
+    op.drop_table('current_subscriptions')
@@ -0,0 +1,26 @@
+"""feature set of a plan, compiled into the entitlement bitsets of the plan catalog
+
+Revision ID: b7e2d4f91c06
+Revises: 8a6c3e1f7b25
+Create Date: 2026-10-19 09:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4f91c06'
+down_revision = '8a6c3e1f7b25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.add_column(sa.Column('features', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_column('features')
@@ -0,0 +1,23 @@
+"""index for the expiry sweep
+
+Revision ID: c58e0b7a91d2
+Revises: a3c91f2e6d47
+Create Date: 2026-10-18 18:05:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58e0b7a91d2'
+down_revision = 'a3c91f2e6d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_is_active_end_date', 'subscriptions', ['is_active', 'end_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_is_active_end_date', table_name='subscriptions')
@@ -0,0 +1,37 @@
+"""per plan monthly rollups of subscription activity
+
+Revision ID: d2f83a5c19e7
+Revises: b7e2d4f91c06
+Create Date: 2026-10-19 14:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f83a5c19e7'
+down_revision = 'b7e2d4f91c06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # filled from the history by `flask rebuild-rollups`
+    op.create_table('plan_monthly_rollups',
+    sa.Column('plan_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('new_subscriptions', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('upgrades_in', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('upgrades_out', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('cancellations', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('mrr', sa.Numeric(precision=12, scale=2), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ),
+    sa.PrimaryKeyConstraint('plan_id', 'month')
+    )
+    op.create_index('idx_plan_monthly_rollups_month', 'plan_monthly_rollups', ['month'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_plan_monthly_rollups_month', table_name='plan_monthly_rollups')
+    op.drop_table('plan_monthly_rollups')
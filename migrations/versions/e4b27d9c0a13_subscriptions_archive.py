@@ -0,0 +1,43 @@
+"""archive table for ended subscriptions
+
+Revision ID: e4b27d9c0a13
+Revises: c58e0b7a91d2
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b27d9c0a13'
+down_revision = 'c58e0b7a91d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('subscriptions_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('start_date', sa.Integer(), nullable=False),
+    sa.Column('end_date', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_archive_user_id_created_at_id_desc_name_price', 'subscriptions_archive', ['user_id', sa.text('created_at DESC'), sa.text('id DESC'), 'name', 'price'], unique=False)
+    op.create_index('idx_archive_created_at', 'subscriptions_archive', ['created_at'], unique=False)
+    op.create_index('idx_current_subscriptions_subscription_id', 'current_subscriptions', ['subscription_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_current_subscriptions_subscription_id', table_name='current_subscriptions')
+    op.drop_index('idx_archive_created_at', table_name='subscriptions_archive')
+    op.drop_index('idx_archive_user_id_created_at_id_desc_name_price', table_name='subscriptions_archive')
+    op.drop_table('subscriptions_archive')
@@ -0,0 +1,38 @@
+"""covering index of the history keyset, created_at index of the export
+
+Revision ID: f1a9c4e7d305
+Revises: d2f83a5c19e7
+Create Date: 2026-10-19 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a9c4e7d305'
+down_revision = 'd2f83a5c19e7'
+branch_labels = None
+depends_on = None
+
+
+def _indexes():
+    return { index['name'] for index in sa.inspect(op.get_bind()).get_indexes('subscriptions') }
+
+
+def upgrade():
+    # databases created by db.create_all after the model change already have them
+    existing = _indexes()
+    if 'idx_user_id_created_at_id_desc_name_price' not in existing:
+        op.create_index('idx_user_id_created_at_id_desc_name_price', 'subscriptions', ['user_id', sa.text('created_at DESC'), sa.text('id DESC'), 'name', 'price'], unique=False)
+    if 'idx_created_at' not in existing:
+        op.create_index('idx_created_at', 'subscriptions', ['created_at'], unique=False)
+    # superseded by the covering index, same leading columns
+    if 'idx_user_id_created_at_desc' in existing:
+        op.drop_index('idx_user_id_created_at_desc', table_name='subscriptions')
+
+
+def downgrade():
+    op.create_index('idx_user_id_created_at_desc', 'subscriptions', ['user_id', sa.text('created_at DESC')], unique=False)
+    op.drop_index('idx_created_at', table_name='subscriptions')
+    op.drop_index('idx_user_id_created_at_id_desc_name_price', table_name='subscriptions')
@@ -1,4 +1,4 @@
-from core.extensions import db, flask_bcrypt
+from core.extensions import db, password_hasher
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -16,10 +16,14 @@ class User(db.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = flask_bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.generate_password_hash(password)
 
     def check_password(self, password):
-        return flask_bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check_password_hash(self.password_hash, password)
+
+    def needs_rehash(self):
+        # Stored hash uses an outdated cost factor
+        return password_hasher.needs_rehash(self.password_hash)
     
 
 class Plan(db.Model):
@@ -28,8 +32,19 @@ class Plan(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)  # Free, Basic, Pro
     price = db.Column(db.Numeric(10, 2), nullable=False)
     created_at = db.Column(db.Integer, nullable=False)
+    features = db.Column(db.JSON, nullable=True)  # feature names the plan grants, NULL -> none
     subscriptions = db.relationship('Subscription', backref='plans', lazy=True)
 
+class PlanCatalogVersion(db.Model):
+    '''
+    One row, `version` goes up in the transaction of every plan create and
+    feature change. Workers compare it with the version their plan catalog
+    snapshot was loaded at, to pick up plan writes made by other workers.
+    '''
+    __tablename__ = 'plan_catalog_version'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
     id = db.Column(db.Integer, primary_key=True)
@@ -45,6 +60,99 @@ class Subscription(db.Model):
     # indexes for Subscription model
     __table_args__ = (
         db.Index("idx_user_id_is_active_end_date_created_at", "user_id", "is_active", "end_date", db.desc("created_at")),
-        db.Index("idx_user_id_created_at_desc", "user_id", db.desc("created_at")),
+        # history keyset (created_at, id), name/price make `id,name,price,created_at` pages index-only
+        db.Index("idx_user_id_created_at_id_desc_name_price", "user_id", db.desc("created_at"), db.desc("id"), "name", "price"),
+        db.Index("idx_created_at", "created_at"),
+        # expiry sweep keyset (end_date, id), only still-active rows are read
+        db.Index("idx_is_active_end_date", "is_active", "end_date"),
+        # SQLite hands out MAX(id) + 1 without it, the id of a row the archiver just moved
+        { 'sqlite_autoincrement': True },
+    )
+
+
+class SubscriptionArchive(db.Model):
+    '''
+    Ended subscriptions moved out of `subscriptions` by the archiver once they
+    are older than the archive horizon, ids are kept. Same columns in the same
+    order, so the two tables can be read with one UNION ALL.
+    '''
+    __tablename__ = 'subscriptions_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    start_date = db.Column(db.Integer, nullable=False)
+    end_date = db.Column(db.Integer, nullable=False)
+    is_active = db.Column(db.Boolean, nullable=False, default=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    plan_id = db.Column(db.Integer, db.ForeignKey('plans.id'), nullable=False)
+    created_at = db.Column(db.Integer, nullable=False)
+
+    # the history and export indexes of `subscriptions`, nothing else reads the archive
+    __table_args__ = (
+        db.Index("idx_archive_user_id_created_at_id_desc_name_price", "user_id", db.desc("created_at"), db.desc("id"), "name", "price"),
+        db.Index("idx_archive_created_at", "created_at"),
     )
 
+
+class CurrentSubscription(db.Model):
+    '''
+    One row per user pointing at the active subscription, so the active lookup
+    is a primary key read. Written in the same transaction as every subscribe,
+    upgrade and cancel, the columns are NULL after a cancel.
+    `version` goes up with every change of the user's subscriptions, it is the
+    ETag validator of the active subscription and history reads.
+    '''
+    __tablename__ = 'current_subscriptions'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscriptions.id'), nullable=True)
+    plan_id = db.Column(db.Integer, db.ForeignKey('plans.id'), nullable=True)
+    end_date = db.Column(db.Integer, nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # reverse lookup for the expiry sweep and the archiver, and the foreign key check on DELETE FROM subscriptions
+    __table_args__ = (
+        db.Index("idx_current_subscriptions_subscription_id", "subscription_id"),
+    )
+
+
+class IdempotencyKey(db.Model):
+    '''
+    `Idempotency-Key` of a subscription write, scoped to the user. Claimed
+    (`status_code` NULL) before the handler runs, then completed with the
+    serialized response that retries replay. Rows are purged after `expires_at`.
+    '''
+    __tablename__ = 'idempotency_keys'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of method, path and body
+    status_code = db.Column(db.SmallInteger, nullable=True)
+    response = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.Integer, nullable=False)  # claim time, an in-flight claim is abandoned after IDEMPOTENCY_LOCK_SECONDS
+    expires_at = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index("idx_idempotency_keys_expires_at", "expires_at"),
+    )
+
+
+class PlanMonthlyRollup(db.Model):
+    '''
+    Subscription activity of a plan in a calendar month (UTC), updated in the
+    transaction of every subscribe, upgrade and cancel and rebuilt from the
+    history by `flask rebuild-rollups`, so analytics never scan subscriptions.
+    `mrr` adds up the prices of the periods started in the month, by new
+    subscriptions and upgrades.
+    '''
+    __tablename__ = 'plan_monthly_rollups'
+    plan_id = db.Column(db.Integer, db.ForeignKey('plans.id'), primary_key=True, autoincrement=False)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    new_subscriptions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    upgrades_in = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # upgrades to this plan
+    upgrades_out = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # upgrades away from it
+    cancellations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    mrr = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0')
+
+    # every plan of one month
+    __table_args__ = (
+        db.Index("idx_plan_monthly_rollups_month", "month"),
+    )
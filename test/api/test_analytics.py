@@ -0,0 +1,136 @@
+import time
+import flask_unittest
+from app import app as flask_app
+from core.extensions import db, subscription_cache, plan_catalog
+from core.rollups import month_of, shift_month
+from config import config_by_env
+
+headers= { "Content-Type": "application/json"}
+
+class AnalyticsTest(flask_unittest.ClientTestCase):
+
+    app = flask_app
+    app.config.from_object(config_by_env['test'])
+
+    def setUp(self, client):
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self, client):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        subscription_cache.clear()
+        plan_catalog.invalidate()
+
+    def create_plan(self, client, name="Free", price="200"):
+        response = client.post("/api/plans", json={
+            "name": name,
+            "price": price
+        }, headers=headers)
+
+    def login_user(self, client, email="samuel-@example.com"):
+
+        # Register user
+        response = client.post("/api/auth/register-user", json={
+            "email": email,
+            "first_name": "Samuel",
+            "last_name": "Esh....",
+            "password": "password"
+        }, headers=headers)
+
+        # Authenticate the user
+        response = client.post("/api/auth/login", json={
+            "email": email,
+            "password": "password"
+        }, headers=headers)
+
+        json = response.json
+        return json.get('token')
+
+    def test_rollups_require_admin(self, client):
+
+        token = self.login_user(client)
+
+        for url in ("/api/analytics/rollups", "/api/analytics/plans/1/rollups"):
+            response = client.get(url, headers={
+                **headers,
+                "authorization": "Bearer "+ token
+            })
+            assert response.status_code == 403
+            assert response.json.get("error") == "Admin privileges required."
+
+    def test_rollups_follow_subscription_writes(self, client):
+
+        upgrading_token = self.login_user(client) # user 1
+        cancelling_token = self.login_user(client, email="second@example.com") # user 2
+        admin_token = self.login_user(client, email="admin@example.com") # user 3
+        self.create_plan(client)
+        self.create_plan(client, name="Basic", price="560")
+        admin_headers = { **headers, "authorization": "Bearer "+ admin_token }
+
+        # user 1 subscribes to Free then upgrades to Basic, user 2 subscribes to Free then cancels
+        for token in (upgrading_token, cancelling_token):
+            client.post("/api/subscriptions", json={ "plan_id": "1" }, headers={ **headers, "authorization": "Bearer "+ token })
+        response = client.put("/api/subscriptions/upgrade", json={ "plan_id": "2" }, headers={ **headers, "authorization": "Bearer "+ upgrading_token })
+        assert response.status_code == 200
+        response = client.patch("/api/subscriptions/cancel", json={}, headers={ **headers, "authorization": "Bearer "+ cancelling_token })
+        assert response.status_code == 200
+        # user 3 is provisioned on Basic
+        response = client.post("/api/subscriptions/bulk", json={ "items": [{ "user_id": 3, "plan_id": 2 }] }, headers=admin_headers)
+        assert response.json.get("created") == 1
+
+        response = client.get("/api/analytics/rollups", headers=admin_headers)
+        assert response.status_code == 200
+        json = response.json
+        month = month_of(int(time.time()))
+        assert json.get("month") == month
+        free, basic = json.get("data")
+        assert free == {
+            "plan_id": "1", "plan_name": "Free", "month": month,
+            "new_subscriptions": 2, "upgrades_in": 0, "upgrades_out": 1, "cancellations": 1, "mrr": 400.0,
+        }
+        assert basic == {
+            "plan_id": "2", "plan_name": "Basic", "month": month,
+            "new_subscriptions": 1, "upgrades_in": 1, "upgrades_out": 0, "cancellations": 0, "mrr": 1120.0,
+        }
+        assert json.get("totals") == {
+            "new_subscriptions": 3, "upgrades_in": 1, "upgrades_out": 1, "cancellations": 1, "mrr": 1520.0,
+        }
+
+        # a month without activity lists every plan with zeros
+        response = client.get("/api/analytics/rollups?month=2001-01", headers=admin_headers)
+        assert [row.get("new_subscriptions") for row in response.json.get("data")] == [0, 0]
+
+        # one plan over the last 12 months, oldest first
+        response = client.get("/api/analytics/plans/1/rollups", headers=admin_headers)
+        assert response.status_code == 200
+        data = response.json.get("data")
+        assert response.json.get("plan_name") == "Free"
+        assert [row.get("month") for row in data] == [shift_month(month, offset) for offset in range(-11, 1)]
+        assert data[-1].get("cancellations") == 1
+        assert all(row.get("new_subscriptions") == 0 for row in data[:-1])
+
+        # rebuilding from the history gives what the write paths recorded
+        before = client.get("/api/analytics/rollups", headers=admin_headers).json
+        result = self.app.test_cli_runner().invoke(args=["rebuild-rollups", "--workers", "0"])
+        assert result.exit_code == 0, result.output
+        assert client.get("/api/analytics/rollups", headers=admin_headers).json == before
+
+    def test_plan_rollups_range(self, client):
+
+        admin_token = self.login_user(client, email="admin@example.com")
+        self.create_plan(client)
+        admin_headers = { **headers, "authorization": "Bearer "+ admin_token }
+
+        response = client.get("/api/analytics/plans/1/rollups?from=2024-11&to=2025-02", headers=admin_headers)
+        assert response.status_code == 200
+        assert [row.get("month") for row in response.json.get("data")] == ["2024-11", "2024-12", "2025-01", "2025-02"]
+
+        response = client.get("/api/analytics/plans/99/rollups", headers=admin_headers)
+        assert response.status_code == 404
+
+        for query, field in (("from=2024-13", "from"), ("to=24-01", "to"), ("from=2025-02&to=2024-11", "from"), ("from=2000-01&to=2025-01", "from")):
+            response = client.get("/api/analytics/plans/1/rollups?" + query, headers=admin_headers)
+            assert response.status_code == 422, query
+            assert field in response.json.get("errors"), query
@@ -1,6 +1,8 @@
 import flask_unittest
 from app import app as flask_app
 from core.extensions import db
+from core.hashing import PasswordHasher, HasherBusy, hash_rounds
+from models import User
 from config import config_by_env
 
 headers= { "Content-Type": "application/json"}
@@ -55,6 +57,25 @@ class AuthTest(flask_unittest.ClientTestCase):
         assert "password" not in json # make sure password is not return
         assert "created_at" in json
 
+    def test_register_user_duplicate_email(self, client):
+
+        user = {
+            "email": "samuel-@example.com",
+            "first_name": "Samuel",
+            "last_name": "Esh....",
+            "password": "password"
+        }
+        response = client.post("/api/auth/register-user", json=user, headers=headers)
+        assert response.status_code == 200
+
+        # rejected by the users.email unique constraint
+        response = client.post("/api/auth/register-user", json=user, headers=headers)
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 422
+        assert json.get("errors") == { "_schema": ["Email samuel-@example.com already exists."] }
+
 
     def test_login_user_wrong_cred(self, client):
 
@@ -94,3 +115,51 @@ class AuthTest(flask_unittest.ClientTestCase):
         # asset token is present
         assert "token" in json
 
+    def test_login_user_rehash_outdated_cost(self, client):
+
+        # Register user with the test cost factor
+        response = client.post("/api/auth/register-user", json={
+            "email": "samuel-@example.com",
+            "first_name": "Samuel",
+            "last_name": "Esh....",
+            "password": "password"
+        }, headers=headers)
+
+        rounds = self.app.config['BCRYPT_LOG_ROUNDS']
+        self.app.config['BCRYPT_LOG_ROUNDS'] = rounds + 1
+        try:
+            response = client.post("/api/auth/login", json={
+                "email": "samuel-@example.com",
+                "password": "password"
+            }, headers=headers)
+        finally:
+            self.app.config['BCRYPT_LOG_ROUNDS'] = rounds
+
+        assert response.status_code == 200
+
+        # hash was upgraded to the configured cost factor
+        with self.app.app_context():
+            user = User.query.filter_by(email="samuel-@example.com").first()
+            assert hash_rounds(user.password_hash) == rounds + 1
+            assert user.check_password("password")
+
+    def test_password_hasher_rejects_when_saturated(self, client):
+
+        hasher = PasswordHasher()
+        config = { 'BCRYPT_POOL_SIZE': 1, 'BCRYPT_QUEUE_DEPTH': 0 }
+        with self.app.app_context():
+            previous = { key: self.app.config.get(key) for key in config }
+            self.app.config.update(config)
+            try:
+                # single slot taken by an in-flight hash
+                executor, slots = hasher._pool()
+                slots.acquire()
+                with self.assertRaises(HasherBusy):
+                    hasher.generate_password_hash("password")
+                slots.release()
+
+                password_hash = hasher.generate_password_hash("password")
+                assert hasher.check_password_hash(password_hash, "password")
+            finally:
+                self.app.config.update(previous)
+                hasher.shutdown()
@@ -0,0 +1,63 @@
+import gzip
+import json
+import os
+import tempfile
+import brotli
+import flask_unittest
+from app import app as flask_app
+from apis import api
+from config import config_by_env
+
+
+class DocsTest(flask_unittest.ClientTestCase):
+
+    app = flask_app
+    app.config.from_object(config_by_env['test'])
+
+    def test_swagger_json_served_from_memory(self, client):
+
+        response = client.get("/api/swagger.json")
+        assert response.status_code == 200
+        assert response.mimetype == "application/json"
+        assert response.headers.get("Vary") == "Accept-Encoding"
+        assert "Content-Encoding" not in response.headers
+        spec = json.loads(response.data)
+        assert spec == api.__schema__
+        assert "/subscriptions/active" in spec["paths"]
+
+        # precompressed representations of the same document, each with its own ETag
+        tags = { response.headers["ETag"] }
+        for encoding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+            compressed = client.get("/api/swagger.json", headers={ "Accept-Encoding": f"{encoding}, identity;q=0.5" })
+            assert compressed.headers["Content-Encoding"] == encoding
+            assert json.loads(decompress(compressed.data)) == spec
+            tags.add(compressed.headers["ETag"])
+        assert len(tags) == 3
+
+        # brotli preferred when both are accepted
+        response = client.get("/api/swagger.json", headers={ "Accept-Encoding": "gzip, deflate, br" })
+        assert response.headers["Content-Encoding"] == "br"
+
+        # conditional GET
+        response = client.get("/api/swagger.json", headers={ "Accept-Encoding": "br", "If-None-Match": response.headers["ETag"] })
+        assert response.status_code == 304
+        assert response.data == b''
+
+        # the Swagger UI still points at it
+        response = client.get("/api-docs")
+        assert response.status_code == 200
+        assert b"/api/swagger.json" in response.data
+
+    def test_export_openapi(self, client):
+
+        directory = tempfile.mkdtemp()
+        result = self.app.test_cli_runner().invoke(args=["export-openapi", directory])
+        assert result.exit_code == 0, result.output
+
+        with open(os.path.join(directory, "swagger.json"), "rb") as file:
+            body = file.read()
+        assert json.loads(body) == api.__schema__
+        with open(os.path.join(directory, "swagger.json.gz"), "rb") as file:
+            assert gzip.decompress(file.read()) == body
+        with open(os.path.join(directory, "swagger.json.br"), "rb") as file:
+            assert brotli.decompress(file.read()) == body
@@ -0,0 +1,178 @@
+import json
+import flask_unittest
+from app import app as flask_app
+from core.extensions import db, subscription_cache, query_instrumentation
+from config import config_by_env
+
+headers= { "Content-Type": "application/json"}
+
+class MetricsTest(flask_unittest.ClientTestCase):
+
+    app = flask_app
+    app.config.from_object(config_by_env['test'])
+
+    def setUp(self, client):
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self, client):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        subscription_cache.clear()
+
+    def login_user(self, client, email="samuel-@example.com"):
+
+        # Register user
+        response = client.post("/api/auth/register-user", json={
+            "email": email,
+            "first_name": "Samuel",
+            "last_name": "Esh....",
+            "password": "password"
+        }, headers=headers)
+
+        # Authenticate the user
+        response = client.post("/api/auth/login", json={
+            "email": email,
+            "password": "password"
+        }, headers=headers)
+
+        json = response.json
+        return json.get('token')
+
+    def admin_headers(self, client):
+        return {
+            **headers,
+            "authorization": "Bearer "+ self.login_user(client, email="admin@example.com")
+        }
+
+    def test_metrics_require_admin(self, client):
+
+        token = self.login_user(client)
+
+        for name in ("cache", "pool", "expiry", "archive", "idempotency"):
+            response = client.get(f"/api/metrics/{name}", headers=headers)
+            assert response.status_code == 401
+            response = client.get(f"/api/metrics/{name}", headers={
+                **headers,
+                "authorization": "Bearer "+ token
+            })
+            assert response.status_code == 403
+            assert response.json.get("error") == "Admin privileges required."
+
+    def test_active_subscription_cache_metrics(self, client):
+
+        token = self.login_user(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        client.post("/api/plans", json={ "name": "Free", "price": "0" }, headers=headers)
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        # First lookup misses, second is served from the cache
+        client.get("/api/subscriptions/active", headers=auth_headers)
+        client.get("/api/subscriptions/active", headers=auth_headers)
+
+        response = client.get("/api/metrics/cache", headers=self.admin_headers(client))
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 200
+        stats = json.get("active_subscription")
+        assert stats.get("misses") == 1
+        assert stats.get("hits") == 1
+        assert stats.get("size") == 1
+        assert "evictions" in stats
+        assert "hit_ratio" in stats
+
+    def test_pool_metrics(self, client):
+
+        response = client.get("/api/metrics/pool", headers=self.admin_headers(client))
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 200
+        primary = json.get("primary")
+        assert primary.get("pool") == "TimedQueuePool"
+        assert "checked_out" in primary
+        assert "overflow" in primary
+        assert "wait_avg_ms" in primary
+        assert "wait_max_ms" in primary
+
+    def test_expiry_metrics(self, client):
+
+        response = client.get("/api/metrics/expiry", headers=self.admin_headers(client))
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 200
+        assert json.get("running") is False
+        assert json.get("batch_size") == 1000
+        assert "last_run" in json
+        assert "rows" in json
+
+    def test_archive_metrics(self, client):
+
+        response = client.get("/api/metrics/archive", headers=self.admin_headers(client))
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 200
+        assert json.get("running") is False
+        assert json.get("after_days") == 180
+        assert "last_run" in json
+
+    def test_idempotency_metrics(self, client):
+
+        response = client.get("/api/metrics/idempotency", headers=self.admin_headers(client))
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 200
+        assert "executed" in json
+        assert "replayed" in json
+        assert "waited" in json
+        assert json.get("ttl") == 86400
+
+    def test_server_timing_header(self, client):
+
+        token = self.login_user(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        response = client.get("/api/subscriptions", headers=auth_headers)
+
+        # assert status code
+        assert response.status_code == 200
+        server_timing = response.headers.get("Server-Timing")
+        assert server_timing.startswith("db;dur=")
+        # ETag version and history page
+        assert 'desc="2 queries"' in server_timing
+        assert "app;dur=" in server_timing
+
+    def test_slow_query_log_captures_plan(self, client):
+
+        token = self.login_user(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        threshold = query_instrumentation.slow_query_threshold_ms
+        query_instrumentation.slow_query_threshold_ms = 0
+        try:
+            with self.assertLogs('slow_query', level='WARNING') as logs:
+                client.get("/api/subscriptions", headers=auth_headers)
+        finally:
+            query_instrumentation.slow_query_threshold_ms = threshold
+
+        records = [json.loads(output.split(":", 2)[2]) for output in logs.output]
+        history = next(record for record in records if "ORDER BY created_at DESC, id DESC" in record["statement"])
+        assert history["endpoint"] == "GET /api/subscriptions"
+        assert history["dialect"] == "sqlite"
+        # the keyset query is served by the covering index
+        assert any("idx_user_id_created_at_id_desc_name_price" in row for row in history["plan"])
@@ -1,6 +1,9 @@
 import flask_unittest
 from app import app as flask_app
-from core.extensions import db
+from core.extensions import db, plan_catalog
+from core.plan_catalog import bump_catalog_version, read_catalog_version
+from models import Plan
+from sqlalchemy import update
 from config import config_by_env
 
 headers= { "Content-Type": "application/json"}
@@ -18,6 +21,7 @@ class PlanTest(flask_unittest.ClientTestCase):
         with self.app.app_context():
             db.session.remove()
             db.drop_all()
+        plan_catalog.invalidate()
 
     def test_create_plan_required_field(self, client):
 
@@ -46,6 +50,19 @@ class PlanTest(flask_unittest.ClientTestCase):
         assert "price" in json
         assert "created_at" in json
 
+    def test_create_plan_duplicate_name(self, client):
+
+        response = client.post("/api/plans", json={ "name": "Free", "price": "0" }, headers=headers)
+        assert response.status_code == 200
+
+        # rejected by the plans.name unique constraint
+        response = client.post("/api/plans", json={ "name": "Free", "price": "10" }, headers=headers)
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 422
+        assert json.get("errors") == { "_schema": ["Plan 'Free' already exists."] }
+
 
     def test_list_plans(self, client):
 
@@ -66,4 +83,74 @@ class PlanTest(flask_unittest.ClientTestCase):
         assert "price" in json[0]
         assert "created_at" in json[0]
 
+    def test_list_plans_after_create(self, client):
+
+        # Load the catalog before any plan exists
+        response = client.get("/api/plans", headers=headers)
+        assert response.status_code == 200
+        assert response.json == []
+
+        response = client.post("/api/plans", json={
+            "name": "Basic",
+            "price": "560"
+        }, headers=headers)
+
+        # Creating a plan must publish a new catalog snapshot
+        response = client.get("/api/plans", headers=headers)
 
+        json = response.json
+        assert response.status_code == 200
+        assert len(json) == 1
+        assert json[0].get("name") == "Basic"
+        assert json[0].get("price") == 560.0
+
+    def test_create_plan_with_features(self, client):
+
+        response = client.post("/api/plans", json={
+            "name": "Pro",
+            "price": "90",
+            "features": ["reports", "api", "reports"]
+        }, headers=headers)
+
+        # assert status code
+        assert response.status_code == 200
+        assert response.json.get("features") == ["api", "reports"]
+
+        response = client.post("/api/plans", json={ "name": "Free", "price": "0" }, headers=headers)
+        assert response.json.get("features") == []
+
+        response = client.get("/api/plans", headers=headers)
+        assert [plan.get("features") for plan in response.json] == [["api", "reports"], []]
+
+        with self.app.app_context():
+            snapshot = plan_catalog.snapshot()
+            # one bit per feature name, one bitset per plan
+            assert dict(snapshot.feature_bits) == { "api": 1, "reports": 2 }
+            assert dict(snapshot.entitlements) == { 1: 3, 2: 0 }
+
+    def test_catalog_follows_other_workers(self, client):
+
+        client.post("/api/plans", json={ "name": "Pro", "price": "90", "features": ["api"] }, headers=headers)
+
+        check_interval = plan_catalog.check_interval
+        try:
+            with self.app.app_context():
+                # the create bumped the shared version in its transaction
+                assert read_catalog_version() == 1
+                plan_catalog.check_interval = 3600
+                assert plan_catalog.entitled(1, "api")
+
+                # another worker replaces the features, this one still serves its snapshot
+                db.session.execute(update(Plan).where(Plan.id == 1).values(features=["reports"]))
+                bump_catalog_version(db.session, db.session.get_bind().dialect.name)
+                db.session.commit()
+                assert plan_catalog.entitled(1, "api")
+
+                # the next version check reloads it
+                plan_catalog.check_interval = 0
+                assert not plan_catalog.entitled(1, "api")
+                assert plan_catalog.entitled(1, "reports")
+                assert plan_catalog.snapshot().catalog_version == 2
+                db.session.remove()
+        finally:
+            plan_catalog.check_interval = check_interval
@@ -1,6 +1,17 @@
+import gzip
+import importlib
+import json
+import threading
+import time
+import brotli
 import flask_unittest
 from app import app as flask_app
-from core.extensions import db
+from core.extensions import db, subscription_cache, plan_catalog, idempotency_keys, expiry_sweeper
+from core.idempotency import request_fingerprint
+from core.representation import json_backend
+from core.schema.subscription_schema import subscription_serializer
+from sqlalchemy import text
+from models import CurrentSubscription, Subscription
 from config import config_by_env
 
 headers= { "Content-Type": "application/json"}
@@ -18,6 +29,8 @@ class SubscriptionTest(flask_unittest.ClientTestCase):
         with self.app.app_context():
             db.session.remove()
             db.drop_all()
+        subscription_cache.clear()
+        plan_catalog.invalidate()
 
     def create_plan(self, client, name="Free", price="200"):
         response = client.post("/api/plans", json={
@@ -25,11 +38,11 @@ class SubscriptionTest(flask_unittest.ClientTestCase):
             "price": price
         }, headers=headers)
 
-    def login_user(self, client):
+    def login_user(self, client, email="samuel-@example.com"):
 
         # Register user
         response = client.post("/api/auth/register-user", json={
-            "email": "samuel-@example.com",
+            "email": email,
             "first_name": "Samuel",
             "last_name": "Esh....",
             "password": "password"
@@ -37,7 +50,7 @@ class SubscriptionTest(flask_unittest.ClientTestCase):
 
         # Authenticate the user
         response = client.post("/api/auth/login", json={
-            "email": "samuel-@example.com",
+            "email": email,
             "password": "password"
         }, headers=headers)
 
@@ -100,6 +113,271 @@ class SubscriptionTest(flask_unittest.ClientTestCase):
         assert json.get("plan_id") == str(plan_id)
 
 
+    def test_create_subscription_unknown_plan(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+
+        response = client.post("/api/subscriptions", json={
+            "plan_id": "99"
+        }, headers={
+            **headers,
+            "authorization": "Bearer "+ token
+        })
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 400
+        assert json.get("error") == "Plan with id '99' does not exists."
+
+
+    def test_upgrade_subscription_copies_plan_and_ends_previous(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client, name="Free", price="0")
+        self.create_plan(client, name="Premium", price="200")
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        response = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        previous = response.json
+
+        response = client.put("/api/subscriptions/upgrade", json={ "plan_id": "2" }, headers=auth_headers)
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 200
+        assert json.get("plan_id") == "2"
+        # name and price come from the plan row
+        assert json.get("name") == "Premium"
+        assert json.get("price") == 200.0
+        assert json.get("is_active") == True
+
+        response = client.get("/api/subscriptions", headers=auth_headers)
+        history = { row["id"]: row for row in response.json.get("data") }
+        assert history[previous["id"]]["is_active"] == False
+        assert history[json["id"]]["is_active"] == True
+
+        response = client.get("/api/subscriptions/active", headers=auth_headers)
+        assert response.json.get("id") == json.get("id")
+
+    def test_current_subscription_pointer(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client, name="Free", price="0")
+        self.create_plan(client, name="Premium", price="200")
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        def pointer():
+            with self.app.app_context():
+                current = db.session.get(CurrentSubscription, 1)
+                db.session.remove()
+                return current and (current.subscription_id, current.plan_id, current.end_date)
+
+        assert pointer() is None
+
+        subscription = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers).json
+        assert pointer() == (int(subscription["id"]), 1, int(subscription["end_date"]))
+
+        subscription = client.put("/api/subscriptions/upgrade", json={ "plan_id": "2" }, headers=auth_headers).json
+        assert pointer() == (int(subscription["id"]), 2, int(subscription["end_date"]))
+
+        client.patch("/api/subscriptions/cancel", headers=auth_headers)
+        assert pointer() == (None, None, None)
+
+    def test_create_subscription_idempotency_key(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client, name="Free", price="0")
+        self.create_plan(client, name="Premium", price="200")
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token,
+            "Idempotency-Key": "create-1"
+        }
+
+        first = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        retry = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        # the retry replays the stored response, no second subscription
+        assert first.status_code == 200
+        assert retry.status_code == 200
+        assert retry.json == first.json
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        assert "Idempotent-Replayed" not in first.headers
+        with self.app.app_context():
+            assert db.session.query(Subscription).count() == 1
+            db.session.remove()
+
+        # same key, different request
+        response = client.post("/api/subscriptions", json={ "plan_id": "2" }, headers=auth_headers)
+        assert response.status_code == 422
+        assert "Idempotency-Key" in response.json.get("errors")
+
+        # replayed upgrade, not "already on this plan"
+        auth_headers["Idempotency-Key"] = "upgrade-1"
+        first = client.put("/api/subscriptions/upgrade", json={ "plan_id": "2" }, headers=auth_headers)
+        retry = client.put("/api/subscriptions/upgrade", json={ "plan_id": "2" }, headers=auth_headers)
+        assert first.status_code == 200
+        assert retry.status_code == 200
+        assert retry.json == first.json
+
+        # expired keys are purged
+        with self.app.app_context():
+            db.session.execute(text("UPDATE idempotency_keys SET expires_at = 0"))
+            db.session.commit()
+        result = self.app.test_cli_runner().invoke(args=['purge-idempotency-keys'])
+        assert "Purged 2 idempotency keys" in result.output
+
+    def test_idempotency_key_waits_for_in_flight_request(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token,
+            "Idempotency-Key": "in-flight"
+        }
+        with self.app.test_request_context("/api/subscriptions", method="POST", json={ "plan_id": "1" }):
+            fingerprint = request_fingerprint()
+        params = { 'owner_id': 1, 'idempotency_key': "in-flight", 'request_fingerprint': fingerprint }
+
+        # another worker claimed the key and finishes 200 ms later
+        with self.app.app_context():
+            assert idempotency_keys._claim(params)
+
+        def finish():
+            time.sleep(0.2)
+            with self.app.app_context():
+                idempotency_keys._execute('complete', { **params, 'response_status': 200, 'response_body': '{"id":"42"}' })
+
+        worker = threading.Thread(target=finish)
+        worker.start()
+        response = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        worker.join()
+
+        assert response.status_code == 200
+        assert response.json == { "id": "42" }
+        with self.app.app_context():
+            assert db.session.query(Subscription).count() == 0
+            db.session.remove()
+
+    def test_idempotency_key_survives_crash_after_commit(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token,
+            "Idempotency-Key": "crash"
+        }
+
+        # the worker dies between the handler's commit and returning the response
+        def crash(user_id):
+            raise RuntimeError("worker died")
+
+        # the module, `apis` exports the namespace under the same name
+        subscription_namespace = importlib.import_module("apis.subscription_namespace")
+        changed, subscription_namespace.subscription_changed = subscription_namespace.subscription_changed, crash
+        try:
+            with self.assertRaises(RuntimeError):
+                client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        finally:
+            subscription_namespace.subscription_changed = changed
+
+        # the response was stored with the subscription, the retry replays it
+        retry = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        assert retry.status_code == 200
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        with self.app.app_context():
+            assert db.session.query(Subscription).count() == 1
+            assert retry.json.get("id") == str(db.session.query(Subscription.id).scalar())
+            db.session.remove()
+
+    def test_idempotency_key_in_progress_conflict(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token,
+            "Idempotency-Key": "stuck"
+        }
+        with self.app.test_request_context("/api/subscriptions", method="POST", json={ "plan_id": "1" }):
+            fingerprint = request_fingerprint()
+        with self.app.app_context():
+            idempotency_keys._claim({ 'owner_id': 1, 'idempotency_key': "stuck", 'request_fingerprint': fingerprint })
+
+        wait, idempotency_keys.wait = idempotency_keys.wait, 0.1
+        try:
+            response = client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        finally:
+            idempotency_keys.wait = wait
+
+        assert response.status_code == 409
+        assert response.headers.get("Retry-After") == "1"
+
+    def test_unknown_plan_does_not_reload_catalog(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        # outside of the version check, a miss is answered from the snapshot
+        check_interval, plan_catalog.check_interval = plan_catalog.check_interval, 3600
+        try:
+            for _ in range(20):
+                response = client.post("/api/subscriptions", json={ "plan_id": "99" }, headers=auth_headers)
+                assert response.status_code == 400
+                assert 'desc="0 queries"' in response.headers.get("Server-Timing")
+                response = client.put("/api/subscriptions/upgrade", json={ "plan_id": "99" }, headers=auth_headers)
+                assert response.status_code == 400
+                assert 'desc="0 queries"' in response.headers.get("Server-Timing")
+        finally:
+            plan_catalog.check_interval = check_interval
+
+    def test_upgrade_subscription_same_plan(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        response = client.put("/api/subscriptions/upgrade", json={ "plan_id": "1" }, headers=auth_headers)
+
+        # assert status code
+        assert response.status_code == 400
+        assert response.json.get("error") == "You're already on this subscription plan. Please select a different plan to upgrade."
+
+        # the current subscription was left active
+        response = client.get("/api/subscriptions/active", headers=auth_headers)
+        assert response.status_code == 200
+
+    def test_upgrade_subscription_without_active(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+
+        response = client.put("/api/subscriptions/upgrade", json={ "plan_id": "1" }, headers={
+            **headers,
+            "authorization": "Bearer "+ token
+        })
+
+        # assert status code
+        assert response.status_code == 404
+        assert response.json.get("error") == "No active subscription found."
+
     def test_list_subscription(self, client):
 
         token = self.login_user(client)
@@ -137,6 +415,306 @@ class SubscriptionTest(flask_unittest.ClientTestCase):
         assert "created_at" in data[0]
 
 
+    def test_list_subscription_pagination(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        # created within the same second -> identical created_at, ordered by id
+        for _ in range(3):
+            client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        response = client.get("/api/subscriptions?per_page=2", headers=auth_headers)
+
+        json = response.json
+        assert response.status_code == 200
+        first_page = [row.get("id") for row in json.get("data")]
+        assert first_page == ["3", "2"]
+        assert json.get("next_cursor") is not None
+
+        response = client.get("/api/subscriptions?per_page=2&cursor=" + json.get("next_cursor"), headers=auth_headers)
+
+        json = response.json
+        assert response.status_code == 200
+        assert [row.get("id") for row in json.get("data")] == ["1"]
+        # last page
+        assert json.get("next_cursor") is None
+
+        # legacy last_seen_id cursor
+        response = client.get("/api/subscriptions?per_page=2&last_seen_id=2", headers=auth_headers)
+        assert [row.get("id") for row in response.json.get("data")] == ["1"]
+
+
+    def test_list_subscription_invalid_cursor(self, client):
+
+        token = self.login_user(client)
+
+        response = client.get("/api/subscriptions?cursor=tampered", headers={
+            **headers,
+            "authorization": "Bearer "+ token
+        })
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 422
+        assert "cursor" in json.get("errors")
+
+
+    def test_list_subscription_per_page_ceiling(self, client):
+
+        token = self.login_user(client)
+
+        response = client.get("/api/subscriptions?per_page=100000", headers={
+            **headers,
+            "authorization": "Bearer "+ token
+        })
+
+        # assert status code
+        assert response.status_code == 200
+        assert response.json.get("per_page") == 100
+
+
+    def test_list_subscription_sparse_fields(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        response = client.get("/api/subscriptions?fields=id,name,price,created_at", headers=auth_headers)
+
+        json = response.json
+        assert response.status_code == 200
+        assert sorted(json.get("data")[0].keys()) == ["created_at", "id", "name", "price"]
+
+        # reordered and repeated fieldsets are one shape, in schema order
+        shapes = len(subscription_serializer._compiled)
+        for fields in ("price,created_at,name,id", "name,name,id,price,created_at,price"):
+            response = client.get("/api/subscriptions?fields=" + fields, headers=auth_headers)
+            assert list(response.json.get("data")[0].keys()) == ["id", "name", "price", "created_at"]
+        assert len(subscription_serializer._compiled) == shapes
+
+        response = client.get("/api/subscriptions?fields=id,password_hash", headers=auth_headers)
+        assert response.status_code == 422
+        assert "fields" in response.json.get("errors")
+
+
+    def test_list_subscription_compressed(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        self.create_plan(client, name="Basic", price="560")
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        for plan_id in ("2", "1") * 5:
+            client.put("/api/subscriptions/upgrade", json={ "plan_id": plan_id }, headers=auth_headers)
+
+        plain = client.get("/api/subscriptions?per_page=20", headers=auth_headers)
+        assert "Content-Encoding" not in plain.headers
+        assert len(plain.data) > self.app.config['COMPRESS_MIN_SIZE']
+        assert "Accept-Encoding" in plain.headers.get("Vary")
+
+        for encoding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+            response = client.get("/api/subscriptions?per_page=20", headers={ **auth_headers, "Accept-Encoding": f"{encoding}, identity" })
+            assert response.status_code == 200
+            assert response.headers.get("Content-Encoding") == encoding
+            assert json.loads(decompress(response.data)) == plain.json
+            assert len(response.data) < len(plain.data)
+
+            # same validator, weakened, still answered with a 304
+            assert response.headers.get("ETag") == "W/" + plain.headers.get("ETag")
+            response = client.get("/api/subscriptions?per_page=20", headers={ **auth_headers, "Accept-Encoding": encoding, "If-None-Match": response.headers.get("ETag") })
+            assert response.status_code == 304
+
+        # small bodies are sent as they are
+        response = client.get("/api/subscriptions/active", headers={ **auth_headers, "Accept-Encoding": "br, gzip" })
+        assert "Content-Encoding" not in response.headers
+
+        # both JSON backends encode the same document
+        for backend in ("json", "orjson"):
+            assert json.loads(json_backend(backend)(plain.json)) == plain.json
+
+
+    def test_conditional_get_active_and_history(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        self.create_plan(client, name="Basic", price="560")
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        for path, plan_id in (("/api/subscriptions/active", "2"), ("/api/subscriptions", "1")):
+            response = client.get(path, headers=auth_headers)
+            etag = response.headers.get("ETag")
+            assert response.status_code == 200
+            assert etag.startswith('"') and not etag.startswith('W/')
+            assert response.headers.get("Vary") == "Authorization"
+
+            # revalidated with the version read only
+            response = client.get(path, headers={ **auth_headers, "If-None-Match": etag })
+            assert response.status_code == 304
+            assert response.headers.get("ETag") == etag
+            assert 'desc="1 queries"' in response.headers.get("Server-Timing")
+
+            # a write changes the version
+            client.put("/api/subscriptions/upgrade", json={ "plan_id": plan_id }, headers=auth_headers)
+            response = client.get(path, headers={ **auth_headers, "If-None-Match": etag })
+            assert response.status_code == 200
+            assert response.headers.get("ETag") != etag
+
+        # a rebuild of the pointers never reissues an earlier version
+        etag = client.get("/api/subscriptions", headers=auth_headers).headers.get("ETag")
+        self.app.test_cli_runner().invoke(args=['backfill-current-subscriptions'])
+        response = client.get("/api/subscriptions", headers={ **auth_headers, "If-None-Match": etag })
+        assert response.status_code == 200
+
+        client.patch("/api/subscriptions/cancel", headers=auth_headers)
+        response = client.get("/api/subscriptions/active", headers=auth_headers)
+        assert response.status_code == 404
+        assert 'desc="1 queries"' in response.headers.get("Server-Timing")
+
+    def test_history_etag_changes_when_the_sweep_expires_any_row(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        # a second active row the pointer does not reference, lapsing tomorrow
+        now = int(time.time())
+        with self.app.app_context():
+            db.session.execute(text(
+                "INSERT INTO subscriptions (price, name, start_date, end_date, is_active, user_id, plan_id, created_at) "
+                "VALUES (200, 'Free', :start, :end, TRUE, 1, 1, :start)"
+            ), { 'start': now - 29 * 24 * 3600, 'end': now + 24 * 3600 })
+            db.session.commit()
+
+        etag = client.get("/api/subscriptions", headers=auth_headers).headers.get("ETag")
+        with self.app.app_context():
+            assert expiry_sweeper.sweep(now=now + 2 * 24 * 3600, throttle=0)['rows'] == 1
+
+        # the pointer row is untouched, the history body is not
+        response = client.get("/api/subscriptions", headers={ **auth_headers, "If-None-Match": etag })
+        assert response.status_code == 200
+        assert response.headers.get("ETag") != etag
+        assert [row.get("is_active") for row in response.json.get("data")] == [True, False]
+        assert client.get("/api/subscriptions/active", headers=auth_headers).status_code == 200
+
+    def test_export_subscription_ndjson(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        self.create_plan(client, name="Basic", price="560")
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+        client.put("/api/subscriptions/upgrade", json={ "plan_id": "2" }, headers=auth_headers)
+
+        response = client.get("/api/subscriptions/export", headers=auth_headers)
+
+        # assert status code
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 2
+        rows = [json.loads(line) for line in lines]
+        assert sorted(row.get("plan_id") for row in rows) == ["1", "2"]
+        assert "is_active" in rows[0]
+        assert "created_at" in rows[0]
+
+
+    def test_export_subscription_csv(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth_headers)
+
+        response = client.get("/api/subscriptions/export?format=csv", headers=auth_headers)
+
+        # assert status code
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+        lines = response.get_data(as_text=True).splitlines()
+        assert lines[0] == "id,name,price,start_date,end_date,is_active,user_id,plan_id,created_at"
+        assert len(lines) == 2
+
+
+    def test_export_all_users_requires_admin(self, client):
+
+        token = self.login_user(client)
+
+        response = client.get("/api/subscriptions/export?all_users=true&from=0&to=9999999999", headers={
+            **headers,
+            "authorization": "Bearer "+ token
+        })
+
+        # assert status code
+        assert response.status_code == 403
+
+
+    def test_export_all_users(self, client):
+
+        token = self.login_user(client)
+        admin_token = self.login_user(client, email="admin@example.com")
+        self.create_plan(client)
+
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers={
+            **headers,
+            "authorization": "Bearer "+ token
+        })
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers={
+            **headers,
+            "authorization": "Bearer "+ admin_token
+        })
+        admin_headers = {
+            **headers,
+            "authorization": "Bearer "+ admin_token
+        }
+
+        # range is required across all users
+        response = client.get("/api/subscriptions/export?all_users=true", headers=admin_headers)
+        assert response.status_code == 422
+
+        response = client.get("/api/subscriptions/export?all_users=true&from=0&to=9999999999", headers=admin_headers)
+
+        # assert status code
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert sorted(row.get("user_id") for row in rows) == ["1", "2"]
+
+        # empty range
+        response = client.get("/api/subscriptions/export?all_users=true&from=0&to=1", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.get_data(as_text=True) == ""
+
+
     def test_active_subscription(self, client):
 
         token = self.login_user(client)
@@ -194,6 +772,225 @@ class SubscriptionTest(flask_unittest.ClientTestCase):
         assert json.get("success") == "ok"
 
 
+    def test_active_subscription_after_cancel(self, client):
+
+        token = self.login_user(client)
+        self.create_plan(client)
+        plan_id = 1
+        auth_headers = {
+            **headers,
+            "authorization": "Bearer "+ token
+        }
+
+        response = client.post("/api/subscriptions", json={
+            "plan_id": str(plan_id)
+        }, headers=auth_headers)
+
+        # Warm the cache
+        response = client.get("/api/subscriptions/active", headers=auth_headers)
+        assert response.status_code == 200
+
+        response = client.patch("/api/subscriptions/cancel", json={}, headers=auth_headers)
+
+        # Cancel must invalidate the cached subscription
+        response = client.get("/api/subscriptions/active", headers=auth_headers)
+
+        json = response.json
+        assert response.status_code == 404
+        assert json.get("error") == "No active subscription found."
+
+
+    def test_bulk_create_subscription_requires_admin(self, client):
+
+        token = self.login_user(client)
+
+        response = client.post("/api/subscriptions/bulk", json={
+            "items": [{ "user_id": 1, "plan_id": 1 }]
+        }, headers={
+            **headers,
+            "authorization": "Bearer "+ token
+        })
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 403
+        assert json.get("error") == "Admin privileges required."
+
+
+    def test_bulk_create_subscription(self, client):
+
+        subscribed_token = self.login_user(client) # user 1
+        self.login_user(client, email="second@example.com") # user 2
+        admin_token = self.login_user(client, email="admin@example.com") # user 3
+        self.create_plan(client)
+
+        # user 1 already has an active subscription
+        client.post("/api/subscriptions", json={
+            "plan_id": "1"
+        }, headers={
+            **headers,
+            "authorization": "Bearer "+ subscribed_token
+        })
+
+        response = client.post("/api/subscriptions/bulk", json={
+            "items": [
+                { "user_id": 2, "plan_id": 1 },
+                { "user_id": 3, "plan_id": 1 },
+                { "user_id": 1, "plan_id": 1 },
+                { "user_id": 2, "plan_id": 1 },
+                { "user_id": 99, "plan_id": 1 },
+                { "user_id": 3, "plan_id": 99 },
+            ]
+        }, headers={
+            **headers,
+            "authorization": "Bearer "+ admin_token
+        })
+
+        json = response.json
+        # assert status code
+        assert response.status_code == 200
+        assert json.get("created") == 2
+        assert json.get("failed") == 4
+        data = json.get("data")
+        assert [item.get("status") for item in data] == ["created", "created", "failed", "failed", "failed", "failed"]
+        assert data[0].get("subscription_id") is not None
+        assert data[2].get("error") == "User already has an active subscription."
+        assert data[3].get("error") == "User already has an active subscription."
+        assert data[4].get("error") == "User with id '99' does not exists."
+        assert data[5].get("error") == "Plan with id '99' does not exists."
+
+        # the admin (user 3) now has an active subscription
+        response = client.get("/api/subscriptions/active", headers={
+            **headers,
+            "authorization": "Bearer "+ admin_token
+        })
+        assert response.status_code == 200
+        assert response.json.get("id") == str(data[1].get("subscription_id"))
+
+    def test_bulk_create_unknown_plans_reload_catalog_once(self, client):
+
+        admin_token = self.login_user(client, email="admin@example.com")
+        self.create_plan(client)
+
+        check_interval, plan_catalog.check_interval = plan_catalog.check_interval, 3600
+        try:
+            response = client.post("/api/subscriptions/bulk", json={
+                "items": [{ "user_id": 1, "plan_id": plan_id } for plan_id in range(99, 149)]
+            }, headers={
+                **headers,
+                "authorization": "Bearer "+ admin_token
+            })
+        finally:
+            plan_catalog.check_interval = check_interval
+
+        assert response.status_code == 200
+        assert response.json.get("failed") == 50
+        # the users query, then one reload (version, plans) for the whole batch
+        assert 'desc="3 queries"' in response.headers.get("Server-Timing")
+
+    def test_entitlement_check(self, client):
+
+        token = self.login_user(client) # user 1
+        admin_token = self.login_user(client, email="admin@example.com") # user 2
+        client.post("/api/plans", json={ "name": "Basic", "price": "50", "features": ["reports"] }, headers=headers)
+        client.post("/api/plans", json={ "name": "Premium", "price": "200", "features": ["reports", "api"] }, headers=headers)
+        auth = { **headers, "authorization": "Bearer "+ token }
+
+        def entitled(feature):
+            response = client.get(f"/api/subscriptions/entitlements/{feature}", headers=auth)
+            assert response.status_code == 200
+            return response.json.get("entitled")
+
+        # no subscription, nothing granted
+        assert entitled("reports") is False
+
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth)
+        assert entitled("reports") is True
+        assert entitled("api") is False
+        assert entitled("unknown") is False
+
+        client.put("/api/subscriptions/upgrade", json={ "plan_id": "2" }, headers=auth)
+        assert entitled("api") is True
+
+        # admin only
+        response = client.put("/api/plans/2/features", json={ "features": ["reports"] }, headers=auth)
+        assert response.status_code == 403
+
+        # changing the plan recompiles the entitlements
+        response = client.put("/api/plans/2/features", json={ "features": ["reports", "exports"] }, headers={
+            **headers,
+            "authorization": "Bearer "+ admin_token
+        })
+        assert response.status_code == 200
+        assert response.json.get("features") == ["exports", "reports"]
+        assert entitled("api") is False
+        assert entitled("exports") is True
+
+        response = client.put("/api/plans/99/features", json={ "features": [] }, headers={
+            **headers,
+            "authorization": "Bearer "+ admin_token
+        })
+        assert response.status_code == 404
+
+        client.patch("/api/subscriptions/cancel", headers=auth)
+        assert entitled("reports") is False
+
+    def test_active_subscription_batch(self, client):
+
+        subscribed_token = self.login_user(client) # user 1
+        self.login_user(client, email="second@example.com") # user 2
+        admin_token = self.login_user(client, email="admin@example.com") # user 3
+        self.create_plan(client)
+
+        client.post("/api/subscriptions", json={
+            "plan_id": "1"
+        }, headers={
+            **headers,
+            "authorization": "Bearer "+ subscribed_token
+        })
+        active = client.get("/api/subscriptions/active", headers={
+            **headers,
+            "authorization": "Bearer "+ subscribed_token
+        }).json
+
+        # admin only
+        response = client.post("/api/subscriptions/active/batch", json={
+            "user_ids": [1]
+        }, headers={
+            **headers,
+            "authorization": "Bearer "+ subscribed_token
+        })
+        assert response.status_code == 403
+
+        flask_app.config['ACTIVE_BATCH_CHUNK_SIZE'] = 2
+        try:
+            response = client.post("/api/subscriptions/active/batch", json={
+                "user_ids": [2, 1, 99, 1, 3]
+            }, headers={
+                **headers,
+                "authorization": "Bearer "+ admin_token
+            })
+        finally:
+            flask_app.config['ACTIVE_BATCH_CHUNK_SIZE'] = config_by_env['test'].ACTIVE_BATCH_CHUNK_SIZE
+
+        # assert status code
+        assert response.status_code == 200
+        data = response.json.get("data")
+        # one entry per distinct user, in request order, same body as the single lookup
+        assert list(data) == ["2", "1", "99", "3"]
+        assert data["1"] == active
+        assert data["2"] is None and data["99"] is None and data["3"] is None
+
+        response = client.post("/api/subscriptions/active/batch", json={
+            "user_ids": []
+        }, headers={
+            **headers,
+            "authorization": "Bearer "+ admin_token
+        })
+        assert response.status_code == 422
+        assert "user_ids" in response.json.get("errors")
+
+
     def test_upgrade_subscription_to_existing_plan(self, client):
 
         token = self.login_user(client)
@@ -0,0 +1,105 @@
+import time
+import unittest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from app import app
+from core.extensions import db, expiry_sweeper, subscription_archiver
+
+SEEDED_AT = 1700000000
+AFTER_DAYS = 90
+
+class SubscriptionArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        result = app.test_cli_runner().invoke(args=[
+            'seed', '--subscriptions', '500', '--users', '20', '--now', str(SEEDED_AT), '--workers', '0', '--reset',
+        ])
+        assert result.exit_code == 0, result.output
+        with app.app_context():
+            # the user with the longest history
+            self.user_id = db.session.execute(text("SELECT user_id FROM subscriptions GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1")).scalar()
+            self.headers = { "authorization": "Bearer " + create_access_token(identity=str(self.user_id)) }
+            db.session.remove()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def count(self, sql):
+        with app.app_context():
+            value = db.session.execute(text(sql), { 'before': SEEDED_AT - AFTER_DAYS * 24 * 3600 }).scalar()
+            db.session.remove()
+        return value
+
+    def history(self):
+        '''Every page of the user's history, following next_cursor'''
+        client = app.test_client()
+        pages = []
+        url = "/api/subscriptions?per_page=7"
+        while url:
+            response = client.get(url, headers=self.headers)
+            assert response.status_code == 200, response.json
+            pages.append(response.json["data"])
+            cursor = response.json["next_cursor"]
+            url = cursor and f"/api/subscriptions?per_page=7&cursor={cursor}"
+        return pages
+
+    def test_archive_keeps_history_and_export(self):
+        archived = self.count("SELECT COUNT(*) FROM subscriptions WHERE is_active = FALSE AND end_date < :before")
+        active = self.count("SELECT COUNT(*) FROM subscriptions WHERE is_active = TRUE")
+        assert archived > 0
+
+        pages = self.history()
+        assert len(pages) > 2
+        export = app.test_client().get("/api/subscriptions/export", headers=self.headers).data
+
+        result = app.test_cli_runner().invoke(args=['archive-subscriptions', '--after-days', str(AFTER_DAYS), '--batch-size', '50', '--throttle-ms', '0', '--now', str(SEEDED_AT)])
+        assert result.exit_code == 0, result.output
+        assert f"Archived {archived} subscriptions" in result.output
+
+        # only long ended rows moved, active rows and their pointers stay
+        assert self.count("SELECT COUNT(*) FROM subscriptions_archive") == archived
+        assert self.count("SELECT COUNT(*) FROM subscriptions WHERE is_active = FALSE AND end_date < :before") == 0
+        assert self.count("SELECT COUNT(*) FROM subscriptions WHERE is_active = TRUE") == active
+        assert self.count("SELECT COUNT(*) FROM subscriptions") + archived == 500
+        assert self.count("SELECT COUNT(*) FROM current_subscriptions WHERE subscription_id NOT IN (SELECT id FROM subscriptions)") == 0
+
+        # the same pages with the same cursors, across both tables
+        assert self.history() == pages
+        assert app.test_client().get("/api/subscriptions/export", headers=self.headers).data == export
+
+        # legacy cursor pointing at an archived row
+        last_seen_id = pages[-1][0]["id"]
+        response = app.test_client().get(f"/api/subscriptions?per_page=7&last_seen_id={last_seen_id}", headers=self.headers)
+        assert response.status_code == 200
+        assert response.json["data"] == pages[-1][1:]
+
+        # nothing left to move
+        with app.app_context():
+            assert subscription_archiver.archive(now=SEEDED_AT, after_days=AFTER_DAYS, throttle=0)['rows'] == 0
+
+    def test_archived_ids_are_not_reused(self):
+        with app.app_context():
+            last_id, user_id, plan_id = db.session.execute(text("SELECT id, user_id, plan_id FROM subscriptions ORDER BY id DESC LIMIT 1")).first()
+            headers = { "authorization": "Bearer " + create_access_token(identity=str(user_id)) }
+            db.session.remove()
+        client = app.test_client()
+
+        # the newest (seeded, long expired) subscription is archived, leaving a lower MAX(id) behind
+        with app.app_context():
+            expiry_sweeper.sweep(throttle=0)
+            subscription_archiver.archive(now=time.time() + (AFTER_DAYS + 1) * 24 * 3600, after_days=AFTER_DAYS, throttle=0)
+        assert self.count(f"SELECT COUNT(*) FROM subscriptions_archive WHERE id = {last_id}") == 1
+        assert self.count("SELECT COALESCE(MAX(id), 0) FROM subscriptions") < last_id
+
+        response = client.post("/api/subscriptions", json={ "plan_id": str(plan_id) }, headers=headers)
+        assert response.status_code == 200, response.json
+        new_id = response.json["id"]
+        assert int(new_id) > last_id
+
+        # and it can be archived in turn
+        assert client.patch("/api/subscriptions/cancel", json={}, headers=headers).status_code == 200
+        with app.app_context():
+            subscription_archiver.archive(now=time.time() + (AFTER_DAYS + 2) * 24 * 3600, after_days=AFTER_DAYS, throttle=0)
+        assert self.count(f"SELECT COUNT(*) FROM subscriptions_archive WHERE id = {new_id}") == 1
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import flask_unittest
+from app import app as flask_app
+from asgi import app as asgi_app
+from core.extensions import db, async_db, subscription_cache, plan_catalog
+from config import config_by_env
+
+headers = { "Content-Type": "application/json" }
+
+
+async def call(method, path, query="", headers=None, body=None):
+    '''One request through the ASGI app -> (status, headers, body)'''
+    payload = json.dumps(body).encode() if body is not None else b''
+    headers = { **(headers or {}), 'Content-Length': str(len(payload)) }
+    scope = {
+        'type': 'http', 'http_version': '1.1', 'scheme': 'http', 'root_path': '',
+        'method': method, 'path': path, 'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+    }
+    messages = []
+
+    async def receive():
+        return { 'type': 'http.request', 'body': payload, 'more_body': False }
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    response_headers = { name.decode(): value.decode() for name, value in messages[0]['headers'] }
+    return messages[0]['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def run(scenario):
+    async def main():
+        try:
+            await scenario()
+        finally:
+            await async_db.dispose()
+    asyncio.run(main())
+
+
+class AsgiTest(flask_unittest.ClientTestCase):
+
+    app = flask_app
+    app.config.from_object(config_by_env['test'])
+
+    def setUp(self, client):
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self, client):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        subscription_cache.clear()
+        plan_catalog.invalidate()
+
+    def login_user(self, client, email="asgi@example.com"):
+        client.post("/api/auth/register-user", json={
+            "email": email, "first_name": "Samuel", "last_name": "Esh....", "password": "password"
+        }, headers=headers)
+        response = client.post("/api/auth/login", json={ "email": email, "password": "password" }, headers=headers)
+        return { **headers, "authorization": "Bearer " + response.json.get('token') }
+
+    def test_reads_served_by_coroutines(self, client):
+
+        auth = self.login_user(client)
+        client.post("/api/plans", json={ "name": "Basic", "price": "50" }, headers=headers)
+        client.post("/api/plans", json={ "name": "Premium", "price": "200" }, headers=headers)
+        client.post("/api/subscriptions", json={ "plan_id": "1" }, headers=auth)
+        for plan_id in ("2", "1", "2"):
+            client.put("/api/subscriptions/upgrade", json={ "plan_id": plan_id }, headers=auth)
+
+        # what the Flask routes answer
+        active = client.get("/api/subscriptions/active", headers=auth)
+        pages = []
+        for query in ("per_page=3", "per_page=3&fields=name,price"):
+            while query:
+                expected = client.get("/api/subscriptions?" + query, headers=auth)
+                pages.append((query, expected))
+                next_cursor = expected.json.get("next_cursor")
+                query = f"per_page=3&cursor={next_cursor}" if next_cursor else None
+        assert len(pages) == 4
+
+        async def scenario():
+            # same body and ETag, without the Server-Timing header of the Flask app
+            for _ in range(2):  # cache miss, then hit
+                status, response_headers, body = await call("GET", "/api/subscriptions/active", headers=auth)
+                assert status == 200
+                assert json.loads(body) == active.json
+                assert response_headers['etag'] == active.headers['ETag']
+                assert 'server-timing' not in response_headers
+
+            status, response_headers, body = await call("GET", "/api/subscriptions/active", headers={ **auth, "If-None-Match": active.headers['ETag'] })
+            assert status == 304 and body == b''
+
+            # history pages, following cursors, with and without a sparse fieldset
+            for query, expected in pages:
+                status, response_headers, body = await call("GET", "/api/subscriptions", query, headers=auth)
+                assert status == 200
+                assert json.loads(body) == expected.json
+                assert response_headers['etag'] == expected.headers['ETag']
+                assert 'server-timing' not in response_headers
+
+        run(scenario)
+
+    def test_other_requests_served_by_flask(self, client):
+
+        auth = self.login_user(client)
+        client.post("/api/plans", json={ "name": "Basic", "price": "50" }, headers=headers)
+
+        async def scenario():
+            # no token: answered by the Flask route
+            status, response_headers, body = await call("GET", "/api/subscriptions/active")
+            assert status == 401
+            assert 'server-timing' in response_headers
+
+            # invalid query: the Flask route answers the validation error
+            status, response_headers, body = await call("GET", "/api/subscriptions", "per_page=0", headers=auth)
+            assert status == 422
+            assert "per_page" in json.loads(body).get("errors")
+
+            # writes go through Flask, the coroutine reads see them
+            status, response_headers, body = await call("POST", "/api/subscriptions", headers=auth, body={ "plan_id": "1" })
+            assert status == 200
+            subscription_id = json.loads(body).get("id")
+            status, response_headers, body = await call("GET", "/api/subscriptions/active", headers=auth)
+            assert status == 200 and json.loads(body).get("id") == subscription_id
+
+            status, response_headers, body = await call("PATCH", "/api/subscriptions/cancel", headers=auth)
+            assert status == 200
+            status, response_headers, body = await call("GET", "/api/subscriptions/active", headers=auth)
+            assert status == 404
+            assert json.loads(body) == { "error": "No active subscription found." }
+            assert 'server-timing' not in response_headers
+
+        run(scenario)
@@ -0,0 +1,45 @@
+import threading
+import time
+import unittest
+from core.cache import ActiveSubscriptionCache
+
+
+class ActiveSubscriptionCacheTest(unittest.TestCase):
+
+    def test_miss_after_invalidate_does_not_join_the_stale_load(self):
+        cache = ActiveSubscriptionCache()
+        started, release = threading.Event(), threading.Event()
+        results = {}
+
+        def stale_loader():
+            started.set()
+            release.wait()
+            return "before write", None
+
+        def load(name, loader):
+            results[name] = cache.get_or_load(1, loader)
+
+        # a load reading the pre-write row is in flight, another miss joins it
+        leader = threading.Thread(target=load, args=("leader", stale_loader))
+        leader.start()
+        started.wait()
+        waiter = threading.Thread(target=load, args=("waiter", lambda: ("unused", None)))
+        waiter.start()
+        while cache.stats()['coalesced'] == 0:
+            time.sleep(0.001)
+
+        # the write commits, a miss after it loads again instead of waiting for the stale load
+        cache.invalidate(1)
+        after = threading.Thread(target=load, args=("after", lambda: ("after write", None)))
+        after.start()
+        after.join(5)
+        release.set()
+        after.join()
+        assert results.pop("after") == "after write"
+
+        leader.join()
+        waiter.join()
+        # only the callers already waiting see the stale value, and it is not stored
+        assert results == { "leader": "before write", "waiter": "before write" }
+        assert cache.get_or_load(1, lambda: ("reloaded", None)) == "after write"
+        assert cache.stats()['misses'] == 2
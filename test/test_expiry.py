@@ -0,0 +1,59 @@
+import unittest
+from sqlalchemy import text
+from app import app
+from core.extensions import db, expiry_sweeper
+
+SEEDED_AT = 1700000000
+SWEPT_AT = SEEDED_AT + 15 * 24 * 3600  # about half of the active subscriptions have lapsed
+
+class ExpirySweepTest(unittest.TestCase):
+
+    def setUp(self):
+        result = app.test_cli_runner().invoke(args=[
+            'seed', '--subscriptions', '400', '--users', '100', '--active-ratio', '0.8',
+            '--now', str(SEEDED_AT), '--workers', '0', '--reset',
+        ])
+        assert result.exit_code == 0, result.output
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def active(self):
+        with app.app_context():
+            rows = dict(db.session.execute(text("SELECT id, end_date FROM subscriptions WHERE is_active = TRUE")).all())
+            pointers = db.session.execute(text("SELECT subscription_id FROM current_subscriptions WHERE subscription_id IS NOT NULL")).scalars().all()
+            db.session.remove()
+        return rows, set(pointers)
+
+    def versions(self):
+        with app.app_context():
+            versions = dict(db.session.execute(text("SELECT user_id, version FROM current_subscriptions")).all())
+            db.session.remove()
+        return versions
+
+    def test_expire_lapsed_subscriptions_in_batches(self):
+        before, _ = self.active()
+        lapsed = { id for id, end_date in before.items() if end_date <= SWEPT_AT }
+        assert lapsed and len(lapsed) < len(before)
+        versions = self.versions()
+        with app.app_context():
+            lapsed_users = set(db.session.execute(text("SELECT user_id FROM subscriptions WHERE is_active = TRUE AND end_date <= :now"), { 'now': SWEPT_AT }).scalars())
+            db.session.remove()
+
+        result = app.test_cli_runner().invoke(args=['expire-subscriptions', '--batch-size', '7', '--throttle-ms', '0', '--now', str(SWEPT_AT)])
+        assert result.exit_code == 0, result.output
+        assert f"Expired {len(lapsed)} subscriptions in {-(-len(lapsed) // 7)} batches" in result.output
+
+        after, pointers = self.active()
+        # only lapsed subscriptions were deactivated, and nothing points at them any more
+        assert set(after) == set(before) - lapsed
+        assert pointers == set(after)
+        # users with any lapsed subscription get a new version (ETag), pointed at or not
+        changed = { user_id for user_id, version in self.versions().items() if version != versions[user_id] }
+        assert changed == lapsed_users
+
+        # a second sweep finds nothing
+        with app.app_context():
+            assert expiry_sweeper.sweep(now=SWEPT_AT, throttle=0)['rows'] == 0
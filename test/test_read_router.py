@@ -0,0 +1,90 @@
+import os
+import tempfile
+import time
+import unittest
+from flask import Flask
+from core.replica import READ_YOUR_WRITES
+from sqlalchemy import text
+from app import app  # initialise extensions
+from core.extensions import db
+from core.replica import ReadRouter
+
+
+class ReadRouterTest(unittest.TestCase):
+    '''Primary and replica stand-ins are two SQLite files'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary_path = os.path.join(self.directory.name, 'primary.db')
+        self.replica_path = os.path.join(self.directory.name, 'replica.db')
+
+        self.app = Flask(__name__)
+        self.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + self.primary_path,
+            SQLALCHEMY_BINDS={ 'replica': 'sqlite:///' + self.replica_path },
+            REPLICA_STICKY_SECONDS=60,
+            JWT_SECRET_KEY='secret',
+        )
+        db.init_app(self.app)
+        self.router = ReadRouter(self.app)
+
+        with self.app.app_context():
+            for engine in db.engines.values():
+                with engine.begin() as connection:
+                    connection.execute(text("CREATE TABLE source (name TEXT)"))
+                    connection.execute(text("INSERT INTO source VALUES (:name)"), { "name": engine.url.database })
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        # init_app registered a metadata for the bind on the shared db, later drop_all() calls would look for its engine
+        if 'replica' not in app.config.get('SQLALCHEMY_BINDS', {}):
+            db.metadatas.pop('replica', None)
+        self.directory.cleanup()
+
+    def read_source(self, user_id):
+        sql = text("SELECT name FROM source")
+        return db.session.execute(sql, bind_arguments=self.router.bind_arguments(user_id)).scalar()
+
+    def test_reads_go_to_replica(self):
+        with self.app.app_context():
+            assert self.read_source(1) == self.replica_path
+
+    def test_reads_stick_to_primary_after_write(self):
+        with self.app.app_context():
+            self.router.stick(1)
+            assert self.read_source(1) == self.primary_path
+            # other users still read from the replica
+            assert self.read_source(2) == self.replica_path
+
+    def test_reads_stick_to_primary_on_every_worker(self):
+        # the write is served by one worker ...
+        with self.app.test_request_context("/api/subscriptions", method="POST"):
+            self.router.stick(1)
+            response = self.router.after_request(self.app.response_class())
+        token = response.headers[READ_YOUR_WRITES]
+        assert READ_YOUR_WRITES in response.headers["Set-Cookie"]
+
+        # ... the next read by another, which has not seen it
+        other_worker = ReadRouter()
+        other_worker.init_app(self.app)
+        with self.app.test_request_context("/api/subscriptions", headers={ "Cookie": f"{READ_YOUR_WRITES}={token}" }):
+            assert other_worker.is_sticky(1, other_worker.token())
+            assert other_worker.engine_for(1) is db.engine
+            # the token only names its own user
+            assert not other_worker.is_sticky(2, other_worker.token())
+        with self.app.test_request_context("/api/subscriptions", headers={ READ_YOUR_WRITES: token }):
+            assert other_worker.engine_for(1) is db.engine
+        # tampered or expired tokens are ignored
+        assert not other_worker.is_sticky(1, token[:-2] + "xx")
+        expired = other_worker._signer.dumps([1, int(time.time()) - 1])
+        assert not other_worker.is_sticky(1, expired)
+        with self.app.app_context():
+            assert other_worker.engine_for(1) is db.engines['replica']
+
+    def test_pool_stats_per_bind(self):
+        with self.app.app_context():
+            stats = self.router.stats()
+            assert set(stats) == { "primary", "replica" }
@@ -0,0 +1,49 @@
+import unittest
+from sqlalchemy import text
+from app import app
+from core.archive import archive_subscriptions
+from core.extensions import db
+
+SEED_ARGS = ['seed', '--subscriptions', '600', '--users', '50', '--active-ratio', '0.5', '--seed', '7', '--now', '1700000000', '--workers', '0', '--reset']
+
+class RebuildRollupsTest(unittest.TestCase):
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def rollups(self):
+        with app.app_context():
+            rows = db.session.execute(text("""
+                SELECT plan_id, month, new_subscriptions, upgrades_in, upgrades_out, cancellations, mrr
+                FROM plan_monthly_rollups
+                ORDER BY plan_id, month
+            """)).all()
+            db.session.remove()
+        return rows
+
+    def test_rebuild_from_history(self):
+        result = app.test_cli_runner().invoke(args=SEED_ARGS)
+        assert result.exit_code == 0, result.output
+
+        # the seed rolls its history up
+        rows = self.rollups()
+        assert rows
+        # every subscription is new or an upgrade, every upgrade leaves a plan
+        assert sum(row.new_subscriptions + row.upgrades_in for row in rows) == 600
+        assert sum(row.upgrades_in for row in rows) == sum(row.upgrades_out for row in rows) > 0
+        assert sum(row.cancellations for row in rows) > 0
+        with app.app_context():
+            revenue = db.session.execute(text("SELECT SUM(price) FROM subscriptions")).scalar()
+            db.session.remove()
+        assert sum(row.mrr for row in rows) == revenue
+
+        # archived rows still count, whatever the number of worker processes and chunks
+        with app.app_context():
+            archived = archive_subscriptions(db.engine, before=1700000000 - 180 * 24 * 3600)
+        assert archived['rows'] > 0
+        result = app.test_cli_runner().invoke(args=['rebuild-rollups', '--workers', '2', '--chunk-size', '10'])
+        assert result.exit_code == 0, result.output
+        assert "into %d plan months" % len(rows) in result.output
+        assert self.rollups() == rows
@@ -0,0 +1,44 @@
+import itertools
+import json
+import unittest
+from decimal import Decimal
+from app import app  # noqa: F401, initialise extensions before importing schemas
+from core.schema.row_serializer import RowSerializer
+from core.schema.subscription_schema import SubscriptionSchema, subscription_serializer
+from core.subscriptions import SubscriptionRecord
+
+keys = SubscriptionRecord._fields
+rows = [
+    (1, Decimal('200.00'), 'Free', 1700000000, 1702592000, 1, 3, 4, 1700000000),
+    (2, Decimal('0'), 'Basic', 1700000000, 1702592000, 0, 3, 4, 1700000000),
+    (3, None, None, None, None, None, None, None, None),
+]
+
+class RowSerializerTest(unittest.TestCase):
+
+    def test_dump_many_matches_schema(self):
+        expected = json.dumps(SubscriptionSchema(many=True).dump([SubscriptionRecord(*row) for row in rows]))
+        assert json.dumps(subscription_serializer.dump_many(rows, keys)) == expected
+
+    def test_dump_sparse_fields_matches_schema(self):
+        only = ['price', 'id', 'created_at']
+        expected = json.dumps(SubscriptionSchema(many=True, only=only).dump([SubscriptionRecord(*row) for row in rows]))
+        assert json.dumps(subscription_serializer.dump_many(rows, keys, only=only)) == expected
+
+    def test_dump_skips_missing_columns(self):
+        narrow_keys = ('id', 'name')
+        assert subscription_serializer.dump((1, 'Free'), narrow_keys) == { 'id': '1', 'name': 'Free' }
+
+    def test_dump_object_matches_schema(self):
+        record = SubscriptionRecord(*rows[0])
+        assert json.dumps(subscription_serializer.dump_object(record)) == json.dumps(SubscriptionSchema().dump(record))
+
+    def test_compiled_shapes_are_bounded(self):
+        serializer = RowSerializer(SubscriptionSchema(), max_compiled=4)
+        shapes = [list(only) for only in itertools.permutations(['id', 'name', 'price'])]
+        for only in shapes:
+            serializer.dump_many(rows, keys, only=only)
+        assert len(serializer._compiled) == 4
+        # least recently used shapes go first
+        assert list(serializer._compiled) == [(keys, tuple(only)) for only in shapes[-4:]]
+        assert serializer.dump(rows[0], keys, only=shapes[0]) == { 'id': '1', 'name': 'Free', 'price': 200.0 }
@@ -0,0 +1,53 @@
+import unittest
+from sqlalchemy import text
+from app import app
+from core.extensions import db
+
+SEED_ARGS = ['seed', '--subscriptions', '600', '--users', '50', '--active-ratio', '0.5', '--seed', '7', '--now', '1700000000', '--reset']
+
+class SeedCommandTest(unittest.TestCase):
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def seed(self, workers):
+        result = app.test_cli_runner().invoke(args=[*SEED_ARGS, '--workers', str(workers)])
+        assert result.exit_code == 0, result.output
+        with app.app_context():
+            rows = db.session.execute(text("""
+                SELECT user_id, plan_id, start_date, end_date, is_active
+                FROM subscriptions
+                ORDER BY user_id, created_at, id
+            """)).all()
+            db.session.remove()
+        return rows
+
+    def test_skewed_deterministic_dataset(self):
+        rows = self.seed(workers=0)
+
+        assert len(rows) == 600
+        per_user = {}
+        for row in rows:
+            per_user.setdefault(row.user_id, []).append(row)
+        assert len(per_user) == 50
+        # Zipf-like: every user has history, a few users hold most of it
+        counts = sorted((len(subscriptions) for subscriptions in per_user.values()), reverse=True)
+        assert counts[-1] >= 1
+        assert sum(counts[:5]) > 600 / 3
+        # only the latest subscription of a user can be active, and it has not ended
+        for subscriptions in per_user.values():
+            assert not any(row.is_active for row in subscriptions[:-1])
+            if subscriptions[-1].is_active:
+                assert subscriptions[-1].end_date > 1700000000
+
+        # every user with an active subscription points at it
+        with app.app_context():
+            pointers = dict(db.session.execute(text("SELECT user_id, subscription_id FROM current_subscriptions WHERE subscription_id IS NOT NULL")).all())
+            active = dict(db.session.execute(text("SELECT user_id, id FROM subscriptions WHERE is_active = TRUE")).all())
+            db.session.remove()
+        assert pointers == active
+
+        # same seed -> same data, whatever the number of worker processes
+        assert self.seed(workers=2) == rows
@@ -0,0 +1,17 @@
+import unittest
+from sqlalchemy import text
+from app import app
+from core.extensions import db
+
+
+class SQLiteProfileTest(unittest.TestCase):
+
+    def test_pragmas_applied_on_connect(self):
+        pragmas = app.config['SQLITE_PRAGMAS']
+        with app.app_context():
+            if db.engine.dialect.name != 'sqlite':
+                self.skipTest("not running on SQLite")
+            assert db.session.execute(text("PRAGMA journal_mode")).scalar() == pragmas['journal_mode'].lower()
+            assert db.session.execute(text("PRAGMA busy_timeout")).scalar() == pragmas['busy_timeout']
+            assert db.session.execute(text("PRAGMA cache_size")).scalar() == pragmas['cache_size']
+            db.session.remove()
@@ -0,0 +1,41 @@
+import unittest
+from app import app, create_app
+from core.extensions import db
+from core.schema.subscription_schema import subscription_serializer
+from core.warmup import warm_up, after_fork
+
+
+class WarmUpTest(unittest.TestCase):
+
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_warm_up_fills_pools_and_caches(self):
+        with app.app_context():
+            engine = db.engine
+            engine.dispose()
+            subscription_serializer._compiled.clear()
+
+            warm_up(app)
+
+            # pool_size connections open and idle, hot statements compiled
+            assert engine.pool.checkedin() == engine.pool.size()
+            assert engine.pool.checkedout() == 0
+            assert len(engine._compiled_cache) > 0
+            assert len(subscription_serializer._compiled) > 0
+
+            # a forked worker starts from an empty pool
+            after_fork(app)
+            assert db.engine.pool.checkedin() == 0
+
+    def test_create_app(self):
+        other = create_app('test')
+        assert other is not app
+        assert other.config['TESTING']
+        assert other.url_map.bind('localhost').match('/api/subscriptions/active', 'GET')